@@ -8,7 +8,6 @@
 
 import sys
 import os
-import tempfile
 import threading
 import logging
 log = logging.getLogger(__name__)
@@ -24,7 +23,7 @@ except addonHandler.AddonError:
 import wx
 import globalVars
 import gui
-from gui import guiHelper
+from gui import guiHelper, nvdaControls
 from gui.settingsDialogs import SettingsPanel
 import tones
 import ui
@@ -35,13 +34,18 @@ from globalPluginHandler import GlobalPlugin
 module_path = os.path.abspath(os.path.dirname(__file__))
 sys.path.append(module_path)
 import config_handler as ch
+import cache
 import description_service
+import image_processing
+import transport
+import streaming
 import model_configuration
 from multimodal_input import launch_conversation_dialog, offer_image_attachment
 from computer_use import ComputerUseSession, get_active_session
 from computer_use_dialogs import show_computer_use_approval
 import dependency_checker
 import ui_viewer
+import prefetch
 
 third_party_path = dependency_checker.expand_path()
 # stdlib additions to import markdown
@@ -53,7 +57,7 @@ import markdown
 from markdown.extensions import fenced_code, nl2br, tables, sane_lists
 html.__path__.pop()
 xml.__path__.pop()
-from PIL import ImageGrab
+from PIL import Image, ImageGrab
 
 
 # ugly hack: since OpenCV takes time to initialize on some machines, do it in a thread as to prevent intermittent lag elsewhere
@@ -90,6 +94,71 @@ def set_model_from_config():
 		service = description_service.get_model_by_name(last_used)
 
 
+def configure_rate_limits():
+	limits = ch.config["rate_limits"]
+	transport.configure_limits({
+		family: (limits[f"{family}_per_minute"], limits[f"{family}_concurrent"])
+		for family in transport.RATE_LIMIT_FAMILIES
+	})
+
+
+def prewarm_connection():
+	"""Starts connecting to the current model's API, so the next request skips the handshakes."""
+	if service is None or not ch.config["global"]["prewarm_connections"] or not service.is_available:
+		return
+	try:
+		url = service.get_prewarm_url()
+	except Exception:
+		log.debug("Couldn't work out where to prewarm a connection", exc_info=True)
+		return
+	if url:
+		transport.prewarm(url, timeout=service.timeout)
+
+
+CACHE_BACKENDS = (
+	# Translators: A choice for where cached descriptions are stored in the settings dialog
+	("json", _("One file per model")),
+	# Translators: A choice for where cached descriptions are stored in the settings dialog
+	("sqlite", _("A single database (faster with large caches)")),
+)
+
+
+def cache_statistics_report():
+	stats = cache.get_stats()
+	lines = (
+		# Translators: A line of the cache statistics report
+		_("Hit rate: {percent:.0%}").format(percent=stats["hit_rate"]),
+		# Translators: A line of the cache statistics report
+		_("API calls avoided: {count}").format(count=stats["api_calls_avoided"]),
+		# Translators: A line of the cache statistics report
+		_("Exact matches: {count}, of which {shared} came from shared caches").format(count=stats["hits"], shared=stats["shared_hits"]),
+		# Translators: A line of the cache statistics report
+		_("Near-duplicate matches: {count}").format(count=stats["near_hits"]),
+		# Translators: A line of the cache statistics report
+		_("Misses: {count}").format(count=stats["misses"]),
+		# Translators: A line of the cache statistics report, counting requests that waited for an identical one already in progress
+		_("Requests that shared an identical request in progress: {count}").format(count=stats["coalesced"]),
+		# Translators: A line of the cache statistics report
+		_("Descriptions stored: {count} ({size:.1f} KB)").format(count=stats["entries_stored"], size=stats["bytes_stored"] / 1024),
+		# Translators: A line of the cache statistics report
+		_("Descriptions evicted: {count}").format(count=stats["evicted"]),
+		# Translators: A line of the cache statistics report
+		_("Time spent loading caches: {seconds:.2f} seconds").format(seconds=stats["load_seconds"]),
+		# Translators: A line of the cache statistics report
+		_("Time spent writing caches: {seconds:.2f} seconds").format(seconds=stats["flush_seconds"]),
+	)
+	image_stats = image_processing.get_stats()
+	lines += (
+		# Translators: A line of the cache statistics report, about images of user interfaces or documents optimized for size
+		_("Screenshots with few colours optimized: {count}, {size:.1f} KB saved").format(count=image_stats["graphic_images"], size=image_stats["graphic_bytes_saved"] / 1024),
+		# Translators: A line of the cache statistics report, about images containing text optimized for size
+		_("Images with text optimized: {count}, {size:.1f} KB saved").format(count=image_stats["text_images"], size=image_stats["text_bytes_saved"] / 1024),
+		# Translators: A line of the cache statistics report, about photos and camera pictures optimized for size
+		_("Photos optimized: {count}, {size:.1f} KB saved").format(count=image_stats["photo_images"], size=image_stats["photo_bytes_saved"] / 1024),
+	)
+	return "\n".join(lines)
+
+
 class AIDescriberSettingsPanel(SettingsPanel):
 	# Translators: The label for the category in NVDA settings
 	title = _("AI Content Describer")
@@ -104,13 +173,36 @@ class AIDescriberSettingsPanel(SettingsPanel):
 		self.open_in_dialog = sHelper.addItem(wx.CheckBox(self, label=_("Open each result in a browsable dialog; Markdown will be rendered if possible")))
 		# Translators: The label for the checkbox to cache images and their descriptions in the settings dialog
 		self.cache_descriptions = sHelper.addItem(wx.CheckBox(self, label=_("Remember/cache descriptions of each item to save API quota")))
+		# Translators: The label for the choice of where cached descriptions are stored in the settings dialog
+		self.cache_backend = sHelper.addLabeledControl(_("Store cached descriptions in:"), wx.Choice, choices=[label for name, label in CACHE_BACKENDS])
+		# Translators: The button in the settings dialog that shows how well the description cache is working
+		self.cache_statistics_button = sHelper.addItem(wx.Button(self, label=_("Cache &statistics...")))
+		# Translators: The label for the field listing read-only caches shared with other machines in the settings dialog
+		self.shared_cache_paths = sHelper.addLabeledControl(_("Shared read-only caches (folders or database files, separated by semicolons):"), wx.TextCtrl)
+		# Translators: The label for the checkbox to reuse cached descriptions of nearly identical images in the settings dialog
+		self.near_duplicate_matching = sHelper.addItem(wx.CheckBox(self, label=_("Reuse cached descriptions for nearly identical images (for example, the same button when highlighted)")))
+		# Translators: The label for the checkbox to describe unlabeled graphics in the background as they gain focus in the settings dialog
+		self.prefetch_focus = sHelper.addItem(wx.CheckBox(self, label=_("Describe unlabeled graphics in the background when they gain focus, so descriptions are ready sooner (uses more API quota)")))
+		# Translators: The label for the maximum number of background descriptions per minute in the settings dialog
+		self.prefetch_max_per_minute = sHelper.addLabeledControl(_("Maximum background descriptions per minute:"), nvdaControls.SelectOnFocusSpinCtrl, min=1, max=60)
+		# Translators: The label for the checkbox to speak replies as they arrive in the settings dialog
+		self.stream_responses = sHelper.addItem(wx.CheckBox(self, label=_("Speak descriptions as they arrive, starting with the first sentence (supported models only)")))
+		# Translators: The label for the checkbox to send each image to a second model and use whichever answers first, in the settings dialog
+		self.hedge_requests = sHelper.addItem(wx.CheckBox(self, label=_("Fastest answer: also send each image to a second model and use whichever responds first (uses more API quota)")))
+		# Translators: The label for the choice of second model used for "fastest answer" mode in the settings dialog
+		self.hedge_secondary_model = sHelper.addLabeledControl(_("Second model for fastest answer:"), wx.Choice)
 		# Translators: The label for the checkbox that controls whether to optimize image uploads for size in the settings dialog
 		self.optimize_for_size = sHelper.addItem(wx.CheckBox(self, label=_("Optimize images for size, may speed up detection in some situations (experimental)")))
+		# Translators: The label for the checkbox to crop blank margins from pictures of objects in the settings dialog
+		self.trim_borders = sHelper.addItem(wx.CheckBox(self, label=_("Crop blank margins and solid backgrounds from around objects before describing them")))
+		# Translators: The label for the checkbox to connect to the model's service before a request is made, in the settings dialog
+		self.prewarm_connections = sHelper.addItem(wx.CheckBox(self, label=_("Connect to the model's service as soon as the describe menu opens, so descriptions start sooner")))
 		self.bind_events()
 		self.populate_values()
 
 	def bind_events(self):
 		self.Bind(wx.EVT_BUTTON, self.on_models_dialog, self.models_dialog_button)
+		self.Bind(wx.EVT_BUTTON, self.on_cache_statistics, self.cache_statistics_button)
 
 	def populate_values(self):
 		available = description_service.list_available_model_names()
@@ -124,14 +216,32 @@ class AIDescriberSettingsPanel(SettingsPanel):
 				self.available_models.SetSelection(0)
 		else:
 			self.available_models.Clear()
+		self.hedge_secondary_model.Set(available)
+		secondary = ch.config["global"]["hedge_secondary_model"]
+		if secondary in available:
+			self.hedge_secondary_model.SetSelection(available.index(secondary))
+		self.hedge_requests.SetValue(ch.config["global"]["hedge_requests"])
 		if service is not None:
 			self.cache_descriptions.SetValue(ch.config[service.name]["cache_descriptions"])
 		self.open_in_dialog.SetValue(ch.config["global"]["open_in_dialog"])
+		self.stream_responses.SetValue(ch.config["global"]["stream_responses"])
 		self.optimize_for_size.SetValue(ch.config["global"]["optimize_for_size"])
+		self.trim_borders.SetValue(ch.config["global"]["trim_borders"])
+		backends = [name for name, label in CACHE_BACKENDS]
+		self.cache_backend.SetSelection(backends.index(ch.config["global"]["cache_backend"]))
+		self.shared_cache_paths.SetValue("; ".join(ch.config["global"]["shared_cache_paths"]))
+		self.near_duplicate_matching.SetValue(ch.config["global"]["near_duplicate_matching"])
+		self.prefetch_focus.SetValue(ch.config["global"]["prefetch_focus"])
+		self.prefetch_max_per_minute.SetValue(ch.config["global"]["prefetch_max_per_minute"])
+		self.prewarm_connections.SetValue(ch.config["global"]["prewarm_connections"])
 
 	def on_models_dialog(self, event):
 		launch_models_dialog(self)
 
+	def on_cache_statistics(self, event):
+		# Translators: The title of the cache statistics report
+		ui.browseableMessage(cache_statistics_report(), _("Cache statistics for this session"))
+
 	def onSave(self):
 		available = description_service.list_available_model_names()
 		selection = self.available_models.GetSelection()
@@ -141,8 +251,28 @@ class AIDescriberSettingsPanel(SettingsPanel):
 				set_model_from_config()
 		if service is not None:
 			ch.config[service.name]["cache_descriptions"] = self.cache_descriptions.GetValue()
+		ch.config["global"]["hedge_requests"] = self.hedge_requests.GetValue()
+		secondary = self.hedge_secondary_model.GetSelection()
+		if 0 <= secondary < len(available):
+			ch.config["global"]["hedge_secondary_model"] = available[secondary]
 		ch.config["global"]["optimize_for_size"] = self.optimize_for_size.GetValue()
+		ch.config["global"]["trim_borders"] = self.trim_borders.GetValue()
 		ch.config["global"]["open_in_dialog"] = self.open_in_dialog.GetValue()
+		ch.config["global"]["stream_responses"] = self.stream_responses.GetValue()
+		ch.config["global"]["near_duplicate_matching"] = self.near_duplicate_matching.GetValue()
+		ch.config["global"]["prefetch_focus"] = self.prefetch_focus.GetValue()
+		ch.config["global"]["prefetch_max_per_minute"] = self.prefetch_max_per_minute.GetValue()
+		ch.config["global"]["prewarm_connections"] = self.prewarm_connections.GetValue()
+		if not self.prefetch_focus.GetValue():
+			prefetch.cancel()
+		transport.close_idle_connections()
+		backend = CACHE_BACKENDS[self.cache_backend.GetSelection()][0]
+		shared_cache_paths = [path.strip() for path in self.shared_cache_paths.GetValue().split(";") if path.strip()]
+		if backend != ch.config["global"]["cache_backend"] or shared_cache_paths != list(ch.config["global"]["shared_cache_paths"]):
+			ch.config["global"]["cache_backend"] = backend
+			ch.config["global"]["shared_cache_paths"] = shared_cache_paths
+			# reopened with the new settings on the next lookup
+			cache.reset()
 		ch.config.write()
 
 
@@ -212,6 +342,7 @@ class AreaMenu(wx.Menu):
 		ch.config["global"]["last_used_model"] = item.GetItemLabelText()
 		ch.config.write()
 		set_model_from_config()
+		prewarm_connection()
 
 
 class GlobalPlugin(GlobalPlugin):
@@ -226,6 +357,10 @@ class GlobalPlugin(GlobalPlugin):
 		if ch.migrate_config_if_needed():
 			ch.config.write()
 		set_model_from_config()
+		configure_rate_limits()
+		transport.set_idle_timeout(ch.config["global"]["connection_idle_timeout"])
+		if ch.config["global"]["prewarm_on_startup"]:
+			prewarm_connection()
 
 		# cache the previous focus and navigator objects globally, as popping up a menu seems to alter them
 		self.prev_focus = None
@@ -235,6 +370,17 @@ class GlobalPlugin(GlobalPlugin):
 		super().terminate()
 		if not globalVars.appArgs.secure:
 			gui.settingsDialogs.NVDASettingsDialog.categoryClasses.remove(AIDescriberSettingsPanel)
+		prefetch.cancel()
+		transport.close()
+		# descriptions are written to disk in batches, so make sure nothing is left behind
+		cache.terminate()
+		image_stats = image_processing.get_stats()
+		if any(image_stats[f"{kind}_images"] for kind in image_processing.CONTENT_KINDS):
+			log.info(f"Image optimization statistics for this session: {cache.format_stats(image_stats)}")
+
+	def event_gainFocus(self, obj, nextHandler):
+		nextHandler()
+		prefetch.on_focus(self, service, obj)
 
 	def describe_navigator_object(self):
 		return self.describe_object(focus=False)
@@ -273,9 +419,8 @@ class GlobalPlugin(GlobalPlugin):
 			# Translators: Message spoken when the attempt to take a picture of an object fails
 			ui.message(_("Could not snap an image of the requested object"))
 			return
-		file = tempfile.mktemp(suffix=".png")
-		snap.save(file)
-		return threading.Thread(target=self.describe_image, kwargs={"file":file, "delete":True}).start()
+		image = image_processing.ImageAsset.from_capture(snap, trim=ch.config["global"]["trim_borders"])
+		return transport.run_in_background(self.describe_image, file=image)
 
 	def describe_face(self):
 		if not hasattr(self, "detection_interface"):
@@ -302,9 +447,7 @@ class GlobalPlugin(GlobalPlugin):
 			# translators: message spoken when grabbing the content of the current window is not possible
 			ui.message(_("Could not get window content"))
 			return
-		file = tempfile.mktemp(suffix=".png")
-		snap.save(file)
-		return threading.Thread(target=self.describe_image, kwargs={"file":file, "delete":True}).start()
+		return transport.run_in_background(self.describe_image, file=image_processing.ImageAsset.from_image(snap))
 
 	def describe_camera(self):
 		if not hasattr(self, "detection_interface"):
@@ -326,12 +469,9 @@ class GlobalPlugin(GlobalPlugin):
 			# translators: message spoken when the picture could not be taken due to an unknown error
 				ui.message(_("The picture could not be taken. Please ensure that your camera is not in use by another application and try again."))
 				return
-			file = tempfile.mktemp(suffix=".png")
-			if not cv2.imwrite(file, frame):
-				# Translators: the message spoken when the picture is taken but the file could not be written.
-				ui.message(_("The picture could not be saved."))
-				return
-			return threading.Thread(target=self.describe_image, kwargs={"file":file, "delete":True}).start()
+			# OpenCV frames are BGR
+			picture = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+			return transport.run_in_background(self.describe_image, file=image_processing.ImageAsset.from_image(picture))
 		else:
 			# translators: message spoken when the picture could not be taken due to an unknown error
 			ui.message(_("The picture could not be taken. Please ensure that your camera is not in use by another application and try again."))
@@ -350,16 +490,15 @@ class GlobalPlugin(GlobalPlugin):
 				unsupported_format_msg = _("Unsupported image format. Please copy another file to the clipboard that is {formats}").format(formats=', '.join(service.supported_formats))
 				ui.message(unsupported_format_msg)
 				return
-			return threading.Thread(target=self.describe_image, kwargs={"file":file, "delete":False}).start()
+			return transport.run_in_background(self.describe_image, file=file, delete=False)
 		elif not snap:
 			# Translators: Message spoken when the item copied to the clipboard is not an image
 			ui.message(_("The item on the clipboard is not an image."))
 			return
-		file = tempfile.mktemp(suffix=".png")
-		snap.save(file, optimize=True, )
-		return threading.Thread(target=self.describe_image, kwargs={"file":file, "delete":True}).start()
+		return transport.run_in_background(self.describe_image, file=image_processing.ImageAsset.from_image(snap))
 
 	def describe_image(self, file, delete=False):
+		"""Describes an image file, or an image_processing.ImageAsset. With delete, the file is removed afterwards."""
 		# Few sanity checks before we go ahead with the API request
 		if not service.is_available:
 			# Translators: Message spoken when the user attempts to describe something but they haven't yet provided an API key or base URL
@@ -377,8 +516,33 @@ class GlobalPlugin(GlobalPlugin):
 		tones.beep(300, 200)
 		# Translators: Message spoken after the beep - when we have started fetching the description
 		wx.CallAfter(ui.message, _("Retrieving description using {name}...").format(name=service.name))
-		message = service.process(file, **ch.config[service.name])
-		if ch.config["global"]["open_in_dialog"]:
+		kwargs = dict(ch.config[service.name])
+		speaker = None
+		secondary = self.get_secondary_service()
+		if secondary is not None:
+			# "fastest answer" mode: the image is only deleted once both requests are done with it
+			cleanup = self.make_image_cleanup(file) if delete else None
+			delete = False
+			try:
+				winner, message = description_service.race([(service, kwargs), (secondary, dict(ch.config[secondary.name]))], file, on_all_done=cleanup)
+			except Exception as e:
+				log.debug("Every hedged request failed", exc_info=True)
+				tones.beep(150, 200)
+				# Translators: Message spoken when neither model answered in "fastest answer" mode
+				wx.CallAfter(ui.message, _("error: {error}").format(error=e))
+				return
+			if not message:
+				return
+			log.debug(f"Using the description from {winner.name}")
+		else:
+			if ch.config["global"]["stream_responses"] and service.supports_streaming:
+				# Speak the reply as it arrives. When it will be shown in a dialog, the first sentence is enough to get going
+				speaker = streaming.SentenceSpeaker(lambda text: wx.CallAfter(ui.message, text), first_only=ch.config["global"]["open_in_dialog"])
+				kwargs["stream_callback"] = speaker.feed
+			message = service.process(file, **kwargs)
+		if speaker is not None and speaker.started and not ch.config["global"]["open_in_dialog"]:
+			speaker.finish()
+		elif ch.config["global"]["open_in_dialog"]:
 			# Translators: Title of the browseable message
 			messageTitle = _("Image description")
 			try:
@@ -393,12 +557,30 @@ class GlobalPlugin(GlobalPlugin):
 			log.debug("Cleaning up image: "+file)
 			os.unlink(file)
 
+	def get_secondary_service(self):
+		"""Returns the model raced against the current one in "fastest answer" mode, or None."""
+		if not ch.config["global"]["hedge_requests"] or not ch.config["global"]["hedge_secondary_model"]:
+			return None
+		secondary = description_service.get_model_by_name(ch.config["global"]["hedge_secondary_model"])
+		if secondary is None or secondary is service or not secondary.is_available:
+			return None
+		return secondary
+
+	@staticmethod
+	def make_image_cleanup(file):
+		def cleanup():
+			log.debug("Cleaning up image: "+file)
+			os.unlink(file)
+		return cleanup
+
 	def show_area_menu(self):
 		# Cache foreground HWND before prePopup steals focus
 		import winUser
 		foreground_hwnd = winUser.getForegroundWindow()
 		self.prev_navigator = api.getNavigatorObject()
 		self.prev_focus = api.getFocusObject()
+		# nearly every choice in the menu ends in a request, so start connecting while it's open
+		prewarm_connection()
 		gui.mainFrame.prePopup()
 		menu = AreaMenu()
 		gui.mainFrame.PopupMenu(menu)
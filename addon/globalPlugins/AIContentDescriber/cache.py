@@ -1,38 +1,911 @@
-# Simple JSON-based cache for the AI Content Describer NVDA add-on
+# Description cache for the AI Content Describer NVDA add-on
 # Copyright (C) 2023 - 2026, Carter Temm
 # This add-on is free software, licensed under the terms of the GNU General Public License (version 2).
 # For more details see: https://www.gnu.org/licenses/gpl-2.0.html
 
 
 import os
+import glob
 import json
+import time
+import base64
+import binascii
+import contextlib
+import hashlib
+import tempfile
+import threading
+import urllib.parse
+import zlib
+from collections import namedtuple
+from io import BytesIO
 import globalVars
+import logHandler
 
-cache = {}
+log = logHandler.log
 
-def _get_cache_path(cache_name):
-	return os.path.abspath(os.path.join(globalVars.appArgs.configPath, cache_name + ".cache"))
+import config_handler as ch
+import dependency_checker
 
-def create_cache(cache_name):
-	global cache
-	cache[cache_name] = {}
-	write_cache(cache_name)  # create the file
+dependency_checker.expand_path()
+from PIL import Image, ImageChops, ImageFilter, ImageOps
 
 
-def read_cache(cache_name):
-	global cache
-	cache_path = _get_cache_path(cache_name)
-	if not os.path.isfile(cache_path):
-		create_cache(cache_name)
-		return
+# Bump this whenever the layout of a cache file changes, so older files are migrated on load.
+# Version 1 (unversioned) files mapped the full base64-encoded image to its description.
+CACHE_VERSION = 2
+# Changes are held in memory and written out in batches, at most this many seconds after the first one.
+FLUSH_DELAY_SECONDS = 15
+SQLITE_FILE_NAME = "AIContentDescriber_cache.sqlite"
+# The fields stored for each description, in the order of the database columns.
+ENTRY_FIELDS = ("description", "created", "width", "height", "last_used", "size", "phash", "edge_map")
+# Perceptual hashes compare a (HASH_SIZE + 1) x HASH_SIZE grayscale thumbnail, giving HASH_SIZE ** 2 bits.
+HASH_SIZE = 16
+# Edge maps are kept at full resolution up to this many pixels on the longer side, and scaled down beyond it
+EDGE_MAP_SIZE = 256
+# Edge strength (0-255, after stretching the contrast) of a weak and a strong edge in an edge map.
+# Antialiasing and gamma move an edge between weak and strong, or weak and none, but rarely further.
+WEAK_EDGE_THRESHOLD = 32
+STRONG_EDGE_THRESHOLD = 192
+# The fraction of strong edges near-duplicates may have where the other image has none. A changed
+# character (or a caret) takes more than this in a typical control, antialiasing a lot less.
+EDGE_TOLERANCE = 0.004
+
+# Limits applied to each model's cache. A limit of 0 (or None) means unlimited; max_age is in
+# seconds since an entry was last used.
+CacheLimits = namedtuple("CacheLimits", ("max_entries", "max_bytes", "max_age"))
+NO_LIMITS = CacheLimits(0, 0, 0)
+# Storing a description only evicts once a cache has grown this fraction past its entry limit, or
+# after this many descriptions have been stored since it last did, so eviction runs in batches
+EVICTION_HEADROOM = 0.1
+EVICTION_INTERVAL = 50
+# Counters kept for the current session, reported from the settings panel and logged at shutdown.
+# hits includes shared_hits; coalesced counts requests that shared an identical request already in flight.
+STAT_NAMES = (
+	"hits",
+	"near_hits",
+	"shared_hits",
+	"misses",
+	"coalesced",
+	"entries_stored",
+	"bytes_stored",
+	"evicted",
+	"load_seconds",
+	"flush_seconds",
+)
+# What the cache knows about an image: an exact digest of its pixels and its size. For near-duplicate
+# matching, also a perceptual hash (hex) and an edge_map; these are None unless asked for.
+Fingerprint = namedtuple("Fingerprint", ("digest", "width", "height", "phash", "edge_map"))
+
+
+def perceptual_hash(img):
+	"""Returns the difference hash (dHash) of a PIL image as a hex string.
+
+	Each bit records whether a pixel of a small grayscale thumbnail is brighter than its right
+	neighbour, so small changes like a blinking caret or hover highlight flip only a few bits.
+	"""
+	thumbnail = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+	pixels = thumbnail.tobytes()
+	value = 0
+	for row in range(HASH_SIZE):
+		offset = row * (HASH_SIZE + 1)
+		for col in range(HASH_SIZE):
+			value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+	return f"{value:0{HASH_SIZE * HASH_SIZE // 4}x}"
+
+
+def edge_map(img):
+	"""Returns where a PIL image's edges are, as a compressed string for edges_match.
+
+	The perceptual hash is too coarse to notice a changed word or digit, or a shape that moved a
+	little, so near-duplicates must also have nearly the same edges. Each pixel is 0 (no edge),
+	1 (weak) or 2 (strong), after stretching the contrast, so a recoloured control keeps its map.
+	"""
+	edges = ImageOps.autocontrast(img.convert("L")).filter(ImageFilter.FIND_EDGES)
+	scale = min(1.0, EDGE_MAP_SIZE / max(img.width, img.height))
+	if scale < 1:
+		edges = edges.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.BOX)
+	levels = edges.point(lambda value: 2 if value >= STRONG_EDGE_THRESHOLD else 1 if value >= WEAK_EDGE_THRESHOLD else 0)
+	header = f"{levels.width}x{levels.height}:".encode("ascii")
+	return base64.b64encode(zlib.compress(header + levels.tobytes(), 9)).decode("ascii")
+
+
+def _decode_edge_map(value):
+	data = zlib.decompress(base64.b64decode(value))
+	header, _sep, pixels = data.partition(b":")
+	width, height = map(int, header.split(b"x"))
+	return Image.frombytes("L", (width, height), pixels)
+
+
+def edges_match(a, b):
+	"""Whether two edge maps differ by no more than EDGE_TOLERANCE of their strong edges.
+
+	Only a strong edge where the other image has none counts, so changes in antialiasing don't.
+	"""
+	a, b = _decode_edge_map(a), _decode_edge_map(b)
+	if a.size != b.size:
+		return False
+	strong_a, strong_b = (levels.point(lambda value: 255 if value == 2 else 0) for levels in (a, b))
+	none_a, none_b = (levels.point(lambda value: 255 if value == 0 else 0) for levels in (a, b))
+	differing = ImageChops.multiply(strong_a, none_b).histogram()[255] + ImageChops.multiply(strong_b, none_a).histogram()[255]
+	strong = strong_a.histogram()[255] + strong_b.histogram()[255]
+	return differing <= strong * EDGE_TOLERANCE
+
+
+def fingerprint_image(image_bytes, similarity=False):
+	"""Returns the Fingerprint of an encoded image.
+
+	The digest covers the decoded pixels rather than the file, so the same picture re-encoded
+	or saved with different metadata maps to the same entry. Anything PIL can't decode
+	falls back to a digest of the raw bytes, with unknown dimensions and no perceptual hash.
+	With similarity, the hashes for near-duplicate matching are included.
+	"""
 	try:
-		with open(cache_path, "r") as f:
-			cache[cache_name] = json.load(f)
-	except json.decoder.JSONDecodeError:  #  todo: try to fix corrupt files before trashing them
-		create_cache(cache_name)
+		with Image.open(BytesIO(image_bytes)) as img:
+			img.load()
+			return fingerprint_decoded(img, similarity)
+	except Exception:
+		log.debugWarning("Could not decode image for the cache key, hashing the raw bytes", exc_info=True)
+		return Fingerprint(hashlib.sha256(image_bytes).hexdigest(), None, None, None, None)
+
+
+def fingerprint_decoded(img, similarity=False):
+	"""Returns the Fingerprint of a PIL image, such as a screenshot that was never encoded.
+
+	With similarity, the hashes for near-duplicate matching are included, which take longer."""
+	digest = hashlib.sha256(f"{img.mode}:{img.width}x{img.height}:".encode("ascii"))
+	digest.update(img.tobytes())
+	fingerprint = Fingerprint(digest.hexdigest(), img.width, img.height, None, None)
+	return with_similarity(fingerprint, img) if similarity else fingerprint
+
+
+def with_similarity(fingerprint, img):
+	"""Returns a Fingerprint of a PIL image with the hashes for near-duplicate matching filled in."""
+	return fingerprint._replace(phash=perceptual_hash(img), edge_map=edge_map(img))
+
+
+def request_digest(prompt, max_tokens, model):
+	"""Returns a digest of everything besides the image that shapes a description.
+
+	Stored alongside the image digest, so answers to different prompts, token limits or models
+	(such as the UI viewer's HTML reconstruction) never collide with each other.
+	"""
+	return hashlib.sha256(json.dumps([prompt, max_tokens, model]).encode("utf-8")).hexdigest()
+
+
+def make_entry(description, fingerprint=None):
+	now = time.time()
+	return {
+		"description": description,
+		"created": now,
+		"width": fingerprint.width if fingerprint else None,
+		"height": fingerprint.height if fingerprint else None,
+		"last_used": now,
+		"size": len(description.encode("utf-8")),
+		"phash": fingerprint.phash if fingerprint else None,
+		"edge_map": fingerprint.edge_map if fingerprint else None,
+	}
+
+
+def hamming_distance(a, b):
+	return bin(a ^ b).count("1")
+
+
+class BKTree:
+	"""A Burkhard-Keller tree of perceptual hashes under Hamming distance.
+
+	Finding every hash within a small distance of a query only visits the branches that could
+	contain one (by the triangle inequality), instead of comparing against every cached image.
+	Nodes are [hash, keys, {distance: child}].
+	"""
+
+	def __init__(self):
+		self._root = None
+		self.size = 0
+		# entries removed from the cache since the tree was built, which may still be in it
+		self.stale = 0
+
+	def add(self, value, key):
+		self.size += 1
+		if self._root is None:
+			self._root = [value, [key], {}]
+			return
+		node = self._root
+		while True:
+			distance = hamming_distance(value, node[0])
+			if distance == 0:
+				node[1].append(key)
+				return
+			child = node[2].get(distance)
+			if child is None:
+				node[2][distance] = [value, [key], {}]
+				return
+			node = child
+
+	def search(self, value, max_distance):
+		"""Returns [(distance, key)] for every hash within max_distance of value, nearest first."""
+		if self._root is None:
+			return []
+		found = []
+		pending = [self._root]
+		while pending:
+			node = pending.pop()
+			distance = hamming_distance(value, node[0])
+			if distance <= max_distance:
+				found.extend((distance, key) for key in node[1])
+			for child_distance, child in node[2].items():
+				if distance - max_distance <= child_distance <= distance + max_distance:
+					pending.append(child)
+		found.sort(key=lambda item: item[0])
+		return found
+
+
+def limits_for(model_name):
+	"""Reads the eviction limits configured for a model."""
+	section = ch.config[model_name]
+	return CacheLimits(
+		section.get("cache_max_entries", 0),
+		section.get("cache_max_megabytes", 0) * 1024 * 1024,
+		section.get("cache_max_age_days", 0) * 24 * 60 * 60,
+	)
+
+
+def _migrate_legacy_cache(cache_name, legacy):
+	"""Re-keys a version 1 cache ({base64 image: description}) by image digest."""
+	start = time.time()
+	entries = {}
+	for base64_image, description in legacy.items():
+		if not isinstance(description, str) or not description:
+			continue
+		try:
+			image_bytes = base64.b64decode(base64_image)
+		except (binascii.Error, ValueError):
+			continue
+		fingerprint = fingerprint_image(image_bytes)
+		entries[fingerprint.digest] = make_entry(description, fingerprint)
+	log.info(
+		f"Migrated {len(entries)} of {len(legacy)} cached descriptions in {cache_name} "
+		f"to digest keys in {time.time() - start:.1f} seconds"
+	)
+	return entries
+
+
+class JSONCacheStore:
+	"""One JSON file per model, named <model>.cache.
+
+	Each file is parsed the first time it is used and kept in memory. Changes are written back in
+	batches by a timer, and when the store is flushed or closed.
+	"""
+
+	def __init__(self, directory, read_only=False):
+		self.directory = directory
+		# shared caches are only ever read, and nothing is written back to them
+		self.read_only = read_only
+		# cache name: {key: entry}
+		self.cache = {}
+		# names of caches with changes that haven't been written to disk yet
+		self._dirty = set()
+		self._lock = threading.RLock()
+		self._flush_timer = None
+
+	@staticmethod
+	def make_key(prompt_digest, image_digest):
+		if not prompt_digest:
+			return image_digest
+		return f"{prompt_digest}:{image_digest}"
+
+	def _get_cache_path(self, cache_name):
+		return os.path.abspath(os.path.join(self.directory, cache_name + ".cache"))
+
+	def read_cache(self, cache_name):
+		"""Loads a cache from disk the first time it is requested, then returns the in-memory copy."""
+		with self._lock:
+			if cache_name in self.cache:
+				return self.cache[cache_name]
+			cache_path = self._get_cache_path(cache_name)
+			if not os.path.isfile(cache_path):
+				self.cache[cache_name] = {}
+				return self.cache[cache_name]
+			try:
+				with _timed("load_seconds"), open(cache_path, "r") as f:
+					data = json.load(f)
+			except json.decoder.JSONDecodeError:  #  todo: try to fix corrupt files before trashing them
+				log.warning(f"The {cache_name} cache is corrupt and will be replaced")
+				self.cache[cache_name] = {}
+				return self.cache[cache_name]
+			if isinstance(data, dict) and data.get("version") == CACHE_VERSION:
+				self.cache[cache_name] = data.get("entries", {})
+				return self.cache[cache_name]
+			# one-time migration from the unversioned layout, written back immediately so it only happens once
+			self.cache[cache_name] = _migrate_legacy_cache(cache_name, data if isinstance(data, dict) else {})
+			if not self.read_only:
+				self.write_cache(cache_name)
+			return self.cache[cache_name]
+
+	def write_cache(self, cache_name):
+		"""Writes one cache to disk atomically.
+
+		The file is written to a temporary file in the same directory, then renamed over the original,
+		so a crash mid-write leaves the previous version intact.
+		"""
+		cache_path = self._get_cache_path(cache_name)
+		# held for the whole write so that two flushes can't rename an older snapshot over a newer one
+		with self._lock, _timed("flush_seconds"):
+			data = json.dumps(
+				{"version": CACHE_VERSION, "entries": self.cache[cache_name]}, separators=(",", ":")
+			)
+			fd, temp_path = tempfile.mkstemp(
+				prefix=cache_name + ".", suffix=".tmp", dir=os.path.dirname(cache_path)
+			)
+			try:
+				with os.fdopen(fd, "w") as f:
+					f.write(data)
+					f.flush()
+					os.fsync(f.fileno())
+				os.replace(temp_path, cache_path)
+			except Exception:
+				if os.path.exists(temp_path):
+					os.remove(temp_path)
+				raise
+			self._dirty.discard(cache_name)
+
+	def mark_dirty(self, cache_name):
+		"""Records that a cache has changed, scheduling a flush if one isn't already pending."""
+		if self.read_only:
+			return
+		with self._lock:
+			self._dirty.add(cache_name)
+			if self._flush_timer is None:
+				self._flush_timer = threading.Timer(FLUSH_DELAY_SECONDS, self.flush)
+				self._flush_timer.daemon = True
+				self._flush_timer.start()
+
+	def get(self, cache_name, prompt_digest, image_digest):
+		key = self.make_key(prompt_digest, image_digest)
+		with self._lock:
+			entries = self.read_cache(cache_name)
+			if self.read_only:
+				entry = entries.get(key)
+				return dict(entry) if entry is not None else None
+			entry = entries.pop(key, None)
+			if entry is None:
+				return None
+			# entries are kept (and saved) in least recently used order, so a hit moves to the end
+			entry["last_used"] = time.time()
+			entries[key] = entry
+		self.mark_dirty(cache_name)
+		return entry
+
+	def put(self, cache_name, prompt_digest, image_digest, entry):
+		key = self.make_key(prompt_digest, image_digest)
+		with self._lock:
+			entries = self.read_cache(cache_name)
+			entries.pop(key, None)
+			entries[key] = entry
+		self.mark_dirty(cache_name)
+
+	def count(self, cache_name):
+		with self._lock:
+			return len(self.read_cache(cache_name))
+
+	def evict(self, cache_name, limits):
+		"""Drops entries unused for longer than max_age, then the least recently used ones until the
+		cache fits its limits.
+
+		Returns the number of entries removed."""
+		with self._lock:
+			entries = self.read_cache(cache_name)
+			before = len(entries)
+			if limits.max_age:
+				cutoff = time.time() - limits.max_age
+				for key in [key for key, entry in entries.items() if _last_used(entry) < cutoff]:
+					del entries[key]
+			if limits.max_entries:
+				while len(entries) > limits.max_entries:
+					del entries[next(iter(entries))]
+			if limits.max_bytes:
+				total = sum(_entry_size(entry) for entry in entries.values())
+				while entries and total > limits.max_bytes:
+					total -= _entry_size(entries.pop(next(iter(entries))))
+			removed = before - len(entries)
+		if removed:
+			self.mark_dirty(cache_name)
+		return removed
+
+	def iter_phashes(self, cache_name, prompt_digest):
+		"""Yields (image_digest, phash, width, height) for entries stored under a prompt digest."""
+		with self._lock:
+			entries = list(self.read_cache(cache_name).items())
+		for key, entry in entries:
+			entry_prompt_digest, _sep, digest = key.rpartition(":")
+			if entry_prompt_digest == prompt_digest and entry.get("phash"):
+				yield digest, entry["phash"], entry.get("width"), entry.get("height")
+
+	def iter_entries(self):
+		"""Yields (cache_name, prompt_digest, image_digest, entry) for every cache file in the directory."""
+		for path in glob.glob(os.path.join(self.directory, "*.cache")):
+			cache_name = os.path.splitext(os.path.basename(path))[0]
+			with self._lock:
+				entries = list(self.read_cache(cache_name).items())
+			for key, entry in entries:
+				prompt_digest, _sep, digest = key.rpartition(":")
+				yield cache_name, prompt_digest, digest, entry
+
+	def flush(self):
+		"""Writes every cache with pending changes to disk."""
+		with self._lock:
+			if self._flush_timer is not None:
+				self._flush_timer.cancel()
+				self._flush_timer = None
+			pending = list(self._dirty)
+		for cache_name in pending:
+			try:
+				self.write_cache(cache_name)
+			except Exception:
+				log.exception(f"Could not write the {cache_name} cache")
+
+	def close(self):
+		self.flush()
+
+
+class SQLiteCacheStore:
+	"""Every model's descriptions in a single SQLite database.
+
+	The database runs in WAL mode, so describe threads can read while another writes. Each row is
+	written with a single statement, so two threads finishing at once can't lose each other's
+	update the way rewriting a whole JSON file could. Each thread gets its own connection.
+	"""
+
+	SCHEMA = """
+		CREATE TABLE IF NOT EXISTS descriptions (
+			model TEXT NOT NULL,
+			prompt_digest TEXT NOT NULL DEFAULT '',
+			image_digest TEXT NOT NULL,
+			description TEXT NOT NULL,
+			created REAL NOT NULL,
+			width INTEGER,
+			height INTEGER,
+			last_used REAL,
+			size INTEGER,
+			phash TEXT,
+			edge_map TEXT,
+			PRIMARY KEY (model, prompt_digest, image_digest)
+		)
+	"""
+	# Stored in PRAGMA user_version, so databases created by older versions can be upgraded in place.
+	SCHEMA_VERSION = 4
+
+	def __init__(self, path, read_only=False):
+		# imported here so a Python build without sqlite3 can still use the JSON store
+		import sqlite3
+
+		self._sqlite3 = sqlite3
+		self.path = path
+		# shared databases are opened read-only, and never upgraded or touched on a hit
+		self.read_only = read_only
+		self._local = threading.local()
+		self._connections = []
+		self._lock = threading.Lock()
+		with _timed("load_seconds"):
+			if read_only:
+				self._connect()
+				return
+			is_new = not os.path.isfile(path)
+			self._upgrade_schema(self._connect())
+			if is_new:
+				self._import_json_caches()
+
+	def _connect(self):
+		conn = getattr(self._local, "conn", None)
+		if conn is None:
+			if self.read_only:
+				conn = self._connect_read_only()
+			else:
+				conn = self._sqlite3.connect(
+					self.path, timeout=10, isolation_level=None, check_same_thread=False
+				)
+				conn.execute("PRAGMA journal_mode=WAL")
+				conn.execute("PRAGMA synchronous=NORMAL")
+			self._local.conn = conn
+			with self._lock:
+				self._connections.append(conn)
+		return conn
+
+	def _connect_read_only(self):
+		path = os.path.abspath(self.path).replace(os.sep, "/")
+		if not path.startswith("/"):
+			path = "/" + path  # a drive letter
+		uri = "file://" + urllib.parse.quote(path, safe="/:")
+		try:
+			conn = self._sqlite3.connect(
+				uri + "?mode=ro", uri=True, timeout=10, isolation_level=None, check_same_thread=False
+			)
+			conn.execute("SELECT count(*) FROM descriptions").fetchone()
+			return conn
+		except self._sqlite3.OperationalError:
+			# a WAL database on a share we can't write to can't create its shared-memory file,
+			# so read it as a snapshot instead
+			log.debugWarning(f"Opening {self.path} as an immutable snapshot", exc_info=True)
+			return self._sqlite3.connect(
+				uri + "?immutable=1", uri=True, timeout=10, isolation_level=None, check_same_thread=False
+			)
+
+	def _upgrade_schema(self, conn):
+		conn.execute(self.SCHEMA)
+		version = conn.execute("PRAGMA user_version").fetchone()[0]
+		if version < 2:
+			columns = {row[1] for row in conn.execute("PRAGMA table_info(descriptions)")}
+			if "last_used" not in columns:
+				conn.execute("ALTER TABLE descriptions ADD COLUMN last_used REAL")
+				conn.execute("ALTER TABLE descriptions ADD COLUMN size INTEGER")
+				conn.execute("UPDATE descriptions SET last_used = created, size = length(CAST(description AS BLOB))")
+		if version < 3:
+			columns = {row[1] for row in conn.execute("PRAGMA table_info(descriptions)")}
+			if "phash" not in columns:
+				conn.execute("ALTER TABLE descriptions ADD COLUMN phash TEXT")
+		if version < 4:
+			columns = {row[1] for row in conn.execute("PRAGMA table_info(descriptions)")}
+			if "edge_map" not in columns:
+				conn.execute("ALTER TABLE descriptions ADD COLUMN edge_map TEXT")
+		conn.execute(
+			"CREATE INDEX IF NOT EXISTS descriptions_lru ON descriptions (model, last_used)"
+		)
+		conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+	def _import_json_caches(self):
+		"""Copies descriptions from existing JSON caches into a newly created database."""
+		json_store = JSONCacheStore(os.path.dirname(self.path))
+		count = 0
+		conn = self._connect()
+		conn.execute("BEGIN")
+		try:
+			for cache_name, prompt_digest, digest, entry in json_store.iter_entries():
+				self._insert(conn, cache_name, prompt_digest, digest, entry)
+				count += 1
+			conn.execute("COMMIT")
+		except Exception:
+			conn.execute("ROLLBACK")
+			log.exception("Could not import the existing JSON caches")
+			return
+		log.info(f"Imported {count} cached descriptions into {self.path}")
+
+	@staticmethod
+	def _insert(conn, cache_name, prompt_digest, image_digest, entry):
+		conn.execute(
+			"INSERT OR REPLACE INTO descriptions (model, prompt_digest, image_digest, description, created, width, height, last_used, size, phash, edge_map) "
+			"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+			(
+				cache_name,
+				prompt_digest,
+				image_digest,
+				entry["description"],
+				entry["created"],
+				entry.get("width"),
+				entry.get("height"),
+				entry.get("last_used") or entry["created"],
+				_entry_size(entry),
+				entry.get("phash"),
+				entry.get("edge_map"),
+			),
+		)
+
+	def get(self, cache_name, prompt_digest, image_digest):
+		conn = self._connect()
+		key = (cache_name, prompt_digest, image_digest)
+		cursor = conn.execute(
+			"SELECT * FROM descriptions WHERE model = ? AND prompt_digest = ? AND image_digest = ?",
+			key,
+		)
+		row = cursor.fetchone()
+		if row is None:
+			return None
+		# shared databases may have been written by an older version, without every column
+		columns = [column[0] for column in cursor.description]
+		entry = {field: value for field, value in zip(columns, row) if field in ENTRY_FIELDS}
+		if self.read_only:
+			return entry
+		entry["last_used"] = time.time()
+		conn.execute(
+			"UPDATE descriptions SET last_used = ? WHERE model = ? AND prompt_digest = ? AND image_digest = ?",
+			(entry["last_used"],) + key,
+		)
+		return entry
+
+	def put(self, cache_name, prompt_digest, image_digest, entry):
+		# each row is committed as it's written, so this is the SQLite equivalent of a flush
+		with _timed("flush_seconds"):
+			self._insert(self._connect(), cache_name, prompt_digest, image_digest, entry)
+
+	def iter_phashes(self, cache_name, prompt_digest):
+		"""Yields (image_digest, phash, width, height) for entries stored under a prompt digest."""
+		yield from self._connect().execute(
+			"SELECT image_digest, phash, width, height FROM descriptions "
+			"WHERE model = ? AND prompt_digest = ? AND phash IS NOT NULL",
+			(cache_name, prompt_digest),
+		)
+
+	def count(self, cache_name):
+		return self._connect().execute(
+			"SELECT count(*) FROM descriptions WHERE model = ?", (cache_name,)
+		).fetchone()[0]
+
+	def evict(self, cache_name, limits):
+		"""Drops entries unused for longer than max_age, then the least recently used ones until the
+		cache fits its limits.
+
+		Returns the number of entries removed."""
+		conn = self._connect()
+		removed = 0
+		if limits.max_age:
+			# last_used is filled in for every row, from created for those made before it existed
+			removed += conn.execute(
+				"DELETE FROM descriptions WHERE model = ? AND last_used < ?",
+				(cache_name, time.time() - limits.max_age),
+			).rowcount
+		if limits.max_entries:
+			removed += conn.execute(
+				"DELETE FROM descriptions WHERE rowid IN ("
+				"SELECT rowid FROM descriptions WHERE model = ? ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+				(cache_name, limits.max_entries),
+			).rowcount
+		if limits.max_bytes:
+			# keep the most recently used entries whose sizes add up to no more than the limit
+			removed += conn.execute(
+				"DELETE FROM descriptions WHERE rowid IN ("
+				"SELECT rowid FROM (SELECT rowid, SUM(size) OVER (ORDER BY last_used DESC) AS total "
+				"FROM descriptions WHERE model = ?) WHERE total > ?)",
+				(cache_name, limits.max_bytes),
+			).rowcount
+		return removed
+
+	def flush(self):
+		pass  # every write is committed as it happens
+
+	def close(self):
+		with self._lock:
+			connections, self._connections = self._connections, []
+		for conn in connections:
+			try:
+				conn.close()
+			except self._sqlite3.Error:
+				log.debugWarning("Could not close a cache connection", exc_info=True)
+		self._local = threading.local()
+
+
+def _last_used(entry):
+	return entry.get("last_used") or entry.get("created", 0)
+
+
+def _entry_size(entry):
+	size = entry.get("size")
+	if size is None:
+		size = len(entry.get("description", "").encode("utf-8"))
+	return size
+
+
+_stats = {name: 0.0 if name.endswith("_seconds") else 0 for name in STAT_NAMES}
+_stats_lock = threading.Lock()
+
+
+def record(name, amount=1):
+	"""Adds to one of the STAT_NAMES counters."""
+	with _stats_lock:
+		_stats[name] += amount
+
+
+@contextlib.contextmanager
+def _timed(name):
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		record(name, time.perf_counter() - start)
+
+
+def get_stats():
+	"""Returns a copy of this session's counters, along with api_calls_avoided and hit_rate (0 to 1)."""
+	with _stats_lock:
+		stats = dict(_stats)
+	answered = stats["hits"] + stats["near_hits"]
+	stats["api_calls_avoided"] = answered + stats["coalesced"]
+	stats["hit_rate"] = answered / (answered + stats["misses"]) if answered + stats["misses"] else 0.0
+	return stats
+
+
+def format_stats(stats):
+	return ", ".join(
+		f"{name}={value:.3f}" if isinstance(value, float) else f"{name}={value}"
+		for name, value in stats.items()
+	)
+
+
+_store = None
+# read-only caches shared between machines, checked in order after the local store
+_shared_stores = None
+_store_lock = threading.Lock()
+# caches that have had their limits applied since the store was opened
+_evicted = set()
+# cache name: descriptions stored since it was last evicted from
+_stored_since_eviction = {}
+_eviction_lock = threading.Lock()
+# (cache name, prompt digest): BKTree of perceptual hashes, built on the first near-duplicate lookup
+_phash_indexes = {}
+_index_lock = threading.Lock()
+
+
+def _open_store():
+	directory = globalVars.appArgs.configPath
+	if ch.config["global"]["cache_backend"] == "sqlite":
+		try:
+			return SQLiteCacheStore(os.path.abspath(os.path.join(directory, SQLITE_FILE_NAME)))
+		except Exception:
+			log.exception("Could not open the SQLite description cache, falling back to JSON files")
+	return JSONCacheStore(directory)
+
+
+def _open_shared_stores():
+	stores = []
+	for path in ch.config["global"]["shared_cache_paths"]:
+		path = os.path.expandvars(path.strip())
+		if not path:
+			continue
+		try:
+			if os.path.isdir(path):
+				stores.append(JSONCacheStore(path, read_only=True))
+			elif os.path.isfile(path):
+				stores.append(SQLiteCacheStore(path, read_only=True))
+			else:
+				log.warning(f"The shared description cache {path} does not exist")
+		except Exception:
+			log.exception(f"Could not open the shared description cache {path}")
+	return stores
+
+
+def get_shared_stores():
+	"""Returns the configured shared caches, opening them on first use."""
+	global _shared_stores
+	with _store_lock:
+		if _shared_stores is None:
+			_shared_stores = _open_shared_stores()
+		return _shared_stores
+
+
+def get_store():
+	"""Returns the configured cache store, opening it on first use."""
+	global _store
+	with _store_lock:
+		if _store is None:
+			_store = _open_store()
+		return _store
+
+
+def reset():
+	"""Closes the current store so that the next lookup reopens it, e.g. after the backend setting changes."""
+	global _store, _shared_stores
+	with _store_lock:
+		store, _store = _store, None
+		shared_stores, _shared_stores = _shared_stores or [], None
+		_evicted.clear()
+	with _eviction_lock:
+		_stored_since_eviction.clear()
+	with _index_lock:
+		_phash_indexes.clear()
+	if store is not None:
+		store.close()
+	for shared_store in shared_stores:
+		shared_store.close()
+
+
+def evict(cache_name, limits):
+	if not any(limits):
+		return 0
+	with _eviction_lock:
+		_stored_since_eviction[cache_name] = 0
+	removed = get_store().evict(cache_name, limits)
+	if removed:
+		log.debug(f"Evicted {removed} cached descriptions from {cache_name}")
+		record("evicted", removed)
+		with _index_lock:
+			for (index_cache_name, prompt_digest), index in _phash_indexes.items():
+				if index_cache_name == cache_name:
+					index.stale += removed
+	return removed
+
+
+def lookup(cache_name, digest, prompt_digest="", limits=NO_LIMITS):
+	"""Returns the cached entry for an image digest, or None.
+
+	The local store is checked first, then each shared store in order. A description found in a
+	shared store is copied into the local one, so it stays available if the share goes away.
+	The first lookup in each cache also applies its limits, so caches that are only ever read
+	(like the legacy fallback cache) still shed old entries."""
+	if cache_name not in _evicted:
+		_evicted.add(cache_name)
+		evict(cache_name, limits)
+	entry = get_store().get(cache_name, prompt_digest, digest)
+	if entry is not None:
+		return entry
+	for shared_store in get_shared_stores():
+		try:
+			entry = shared_store.get(cache_name, prompt_digest, digest)
+		except Exception:
+			log.debugWarning("Could not read a shared description cache", exc_info=True)
+			continue
+		if entry is not None:
+			log.debug(f"Found a description for {cache_name} in a shared cache")
+			record("shared_hits")
+			entry["last_used"] = time.time()
+			store(cache_name, digest, entry, prompt_digest, limits)
+			return entry
+	return None
+
+
+def store(cache_name, digest, entry, prompt_digest="", limits=NO_LIMITS):
+	get_store().put(cache_name, prompt_digest, digest, entry)
+	record("entries_stored")
+	record("bytes_stored", _entry_size(entry))
+	if entry.get("phash"):
+		with _index_lock:
+			index = _phash_indexes.get((cache_name, prompt_digest))
+			if index is not None:
+				index.add(int(entry["phash"], 16), (digest, entry.get("width"), entry.get("height")))
+	if _is_eviction_due(cache_name, limits):
+		evict(cache_name, limits)
+
+
+def _is_eviction_due(cache_name, limits):
+	"""Whether enough has been stored in a cache since it was last evicted from to do so again."""
+	if not any(limits):
+		return False
+	with _eviction_lock:
+		stored = _stored_since_eviction[cache_name] = _stored_since_eviction.get(cache_name, 0) + 1
+	if stored >= EVICTION_INTERVAL:
+		return True
+	return bool(limits.max_entries) and get_store().count(cache_name) > limits.max_entries * (1 + EVICTION_HEADROOM)
+
+
+def _get_phash_index(cache_name, prompt_digest):
+	"""Returns the BK-tree for a cache, (re)building it when missing or mostly stale."""
+	key = (cache_name, prompt_digest)
+	with _index_lock:
+		index = _phash_indexes.get(key)
+		if index is not None and index.stale <= index.size // 2:
+			return index
+		index = BKTree()
+		for digest, phash, width, height in get_store().iter_phashes(cache_name, prompt_digest):
+			index.add(int(phash, 16), (digest, width, height))
+		_phash_indexes[key] = index
+		return index
+
+
+def lookup_similar(cache_name, fingerprint, max_distance, prompt_digest=""):
+	"""Returns the cached entry for the nearest image of the same size and with nearly the same edges
+	whose perceptual hash is within max_distance bits of this one, or None."""
+	if not fingerprint.phash or not fingerprint.edge_map:
+		return None
+	index = _get_phash_index(cache_name, prompt_digest)
+	for distance, (digest, width, height) in index.search(int(fingerprint.phash, 16), max_distance):
+		if (width, height) != (fingerprint.width, fingerprint.height):
+			continue
+		# the tree may still hold entries that have since been evicted
+		entry = get_store().get(cache_name, prompt_digest, digest)
+		# a changed word or a moved shape can leave the perceptual hash almost the same, but not the edges
+		if entry is not None and entry.get("edge_map") and edges_match(entry["edge_map"], fingerprint.edge_map):
+			log.debug(f"Near-duplicate cache hit in {cache_name}, {distance} bits from a cached image")
+			return entry
+	return None
+
+
+def flush():
+	"""Writes any pending changes to disk."""
+	with _store_lock:
+		store = _store
+	if store is not None:
+		store.flush()
 
 
-def write_cache(cache_name):
-	cache_path = _get_cache_path(cache_name)
-	with open(cache_path, "w") as f:
-		json.dump(cache[cache_name], f, indent="\t")
+def terminate():
+	"""Flushes outstanding changes and closes the store. Called when the add-on is unloaded."""
+	reset()
+	stats = get_stats()
+	if stats["hits"] or stats["near_hits"] or stats["misses"]:
+		log.info(f"Description cache statistics for this session: {format_stats(stats)}")
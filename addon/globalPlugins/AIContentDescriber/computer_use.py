@@ -1,10 +1,8 @@
-import base64
+import concurrent.futures
 import logging
-import math
 import queue
 import threading
 import time
-import urllib.error
 from io import BytesIO
 
 log = logging.getLogger(__name__)
@@ -18,6 +16,9 @@ import tones
 import wx
 
 import dependency_checker
+import image_processing
+import request_body
+import transport
 
 dependency_checker.expand_path()
 from PIL import Image
@@ -42,20 +43,10 @@ def _on_main_thread(fn):
 	wx.CallAfter(_do)
 
 
-def _is_retryable_request_error(error):
-	"""Returns True for a transport failure where no HTTP response was received (SSL EOF, connection reset, DNS issue, timeout, etc.)
-	Returns False if an HTTP response was received."""
-	cause = getattr(error, "__cause__", None)
-	if isinstance(cause, urllib.error.HTTPError):
-		return False
-	return isinstance(cause, (urllib.error.URLError, OSError))
-
-
 # In case a synth driver doesn't signal completion of an utterance, continue after this many seconds
 ANNOUNCE_TIMEOUT_SECONDS = 5
-# A transient transport failure (SSL EOF, connection reset) shouldn't end an entire session. We can simply re-issue the request a maximum number of times
-MAX_REQUEST_ATTEMPTS = 3
-RETRY_BACKOFF_BASE_SECONDS = 1.0
+# How long to wait for an aborted request to close its connection before moving on
+ABORT_WAIT_SECONDS = 2
 TYPE_PREVIEW_MAX_CHARS = 40
 # Above this length, paste the text instead of synthesizing a keystroke per character.
 PASTE_TYPE_THRESHOLD_CHARS = 512
@@ -107,20 +98,6 @@ def _announce_and_wait(text):
 		synthDriverHandler.synthDoneSpeaking.unregister(_on_done)
 
 
-def _calculate_scale(w, h, max_long_edge=None, max_pixels=None):
-	"""Return the scale factor satisfying both the long-edge and pixel-area limits."""
-	scale = 1.0
-	if max_long_edge is not None:
-		long_edge = max(w, h)
-		if long_edge > max_long_edge:
-			scale = min(scale, max_long_edge / long_edge)
-	if max_pixels is not None:
-		pixels = w * h
-		if pixels > max_pixels:
-			scale = min(scale, math.sqrt(max_pixels / pixels))
-	return scale
-
-
 def _focus_metadata(obj, width, height):
 	"""Build the focused-window metadata for a capture.
 	This is sent to the model as part of every computer-use request."""
@@ -176,13 +153,13 @@ class Capture:
 		self._win_y = 0
 
 	def capture(self):
-		"""Returns (b64_png_str, api_w, api_h, focus_dict)."""
+		"""Returns (b64_png, api_w, api_h, focus_dict). b64_png is a request_body.Base64Image."""
 		hwnd, obj = self._resolve_target()
 		rect = winUser.getClientRect(hwnd)
 		cap_w = rect.right - rect.left
 		cap_h = rect.bottom - rect.top
 		self._win_x, self._win_y = winUser.ClientToScreen(hwnd, 0, 0)
-		self._scale = _calculate_scale(
+		self._scale = image_processing.calculate_scale(
 			cap_w, cap_h, self._max_long_edge, self._max_pixels
 		)
 		api_w = max(1, int(cap_w * self._scale))
@@ -193,7 +170,7 @@ class Capture:
 		img = Image.frombuffer("RGB", (api_w, api_h), buf, "raw", "BGRX", 0, 1)
 		out = BytesIO()
 		img.save(out, format="PNG")
-		b64 = base64.b64encode(out.getvalue()).decode("ascii")
+		b64 = request_body.Base64Image(out.getvalue())
 		focus = _focus_metadata(obj, api_w, api_h)
 		return b64, api_w, api_h, focus
 
@@ -634,9 +611,9 @@ class ComputerUseSession:
 				log.error("computer use: screenshot failed", exc_info=True)
 				self._dialog.append_message(f"Screenshot failed: {e}", role="system")
 				break
-			# Run the request on a worker thread so a pause or cancel interrupts the
-			# wait instead of blocking on a slow turn until the socket times out.
-			# step() does not mutate saved state, so an abandoned turn leaves the
+			# Run the request on a worker thread so a pause or cancel aborts it
+			# instead of blocking on a slow turn until the socket times out.
+			# step() does not mutate saved state, so an aborted turn leaves the
 			# provider session untouched and the retry is clean.
 			status, payload = self._make_request_interruptible(
 				provider_session=provider_session,
@@ -650,7 +627,7 @@ class ComputerUseSession:
 			if status == "cancelled":
 				break
 			if status == "paused":
-				# The user paused while we waited. Abandon this turn, let them read the
+				# The user paused while we waited. The turn was aborted; let them read the
 				# log or type a follow-up, then loop back and re-issue the request with
 				# whatever they added. Committed state is untouched, so the retry is clean.
 				if not self._wait_while_paused():
@@ -750,7 +727,7 @@ class ComputerUseSession:
 		return self._drain_injection()
 
 	def _make_request_interruptible(self, provider_session, **kwargs):
-		"""Make the API request on a worker thread, polling for pause/cancel so a slow
+		"""Make the API request on a shared worker thread, polling for pause/cancel so a slow
 		turn never blocks the loop until the socket times out.
 
 		Returns one of:
@@ -759,47 +736,29 @@ class ComputerUseSession:
 		("cancelled", None)
 		("error", exception).
 
-		A paused or cancelled request is abandoned with its worker thread finishing and quietly failing in the background.
-		A transient transport failure is retried a few times, backing off at a globally defined interval.
+		A paused or cancelled request is aborted: its connection is closed, stopping any upload still in
+		progress, before this returns. That way a re-issued turn never overlaps the one it replaces.
+		Transient failures (dropped connections, rate limiting, overloaded servers) are retried by the
+		transport, and aborting the request also cancels any wait to retry it.
 		"""
-		for attempt in range(MAX_REQUEST_ATTEMPTS):
-			holder = {}
-			done = threading.Event()
-
-			def _worker():
-				try:
-					holder["resp"] = provider_session.step(**kwargs)
-				except Exception as e:
-					holder["error"] = e
-				finally:
-					done.set()
-
-			threading.Thread(target=_worker, daemon=True).start()
-			while not done.wait(0.05):
-				if self._cancel_event.is_set():
-					return "cancelled", None
-				if self._pause_event.is_set():
-					return "paused", None
-			if "error" not in holder:
-				return "ok", holder["resp"]
-			error = holder["error"]
-			if attempt + 1 >= MAX_REQUEST_ATTEMPTS or not _is_retryable_request_error(
-				error
-			):
-				return "error", error
-			log.warning(
-				f"computer use: request attempt {attempt + 1} failed, retrying",
-				exc_info=error,
-			)
-			# Back off before retrying, but make sure it is still possible to cancel while we're waiting.
-			backoff = RETRY_BACKOFF_BASE_SECONDS * (2**attempt)
-			waited = 0.0
-			while waited < backoff:
-				if self._cancel_event.is_set():
-					return "cancelled", None
-				time.sleep(0.05)
-				waited += 0.05
-		return "error", holder["error"]
+		job = transport.run_in_background(provider_session.step, **kwargs)
+		while not concurrent.futures.wait((job,), timeout=0.05).done:
+			if self._cancel_event.is_set():
+				self._abort_request(job)
+				return "cancelled", None
+			if self._pause_event.is_set():
+				self._abort_request(job)
+				return "paused", None
+		error = job.exception()
+		if error is not None:
+			return "error", error
+		return "ok", job.result()
+
+	def _abort_request(self, job):
+		"""Abort an unfinished turn and wait for its request to be torn down."""
+		job.abort()
+		if not concurrent.futures.wait((job,), timeout=ABORT_WAIT_SECONDS).done:
+			log.debug("computer use: aborted request is still finishing")
 
 	def _wait_while_paused(self):
 		"""If paused, surface the dialog so the user can read the log or inject a
@@ -12,6 +12,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [Claude 4.6 Opus]
@@ -19,6 +22,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [Claude 4.6 Sonnet]
@@ -26,6 +32,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=20, min=1)
 
 [Claude 4.5 Opus]
@@ -33,6 +42,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [Claude 4.5 Sonnet]
@@ -40,6 +52,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=20, min=1)
 
 [Claude 4.5 Haiku]
@@ -47,6 +62,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=512)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [Claude 4.1 Opus]
@@ -54,6 +72,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [GPT-4 turbo]
@@ -61,6 +82,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [GPT-4 omni]
@@ -68,6 +92,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [Google Gemini 2.5 Flash]
@@ -75,6 +102,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [Google Gemini 2.5 Flash-Lite]
@@ -82,6 +112,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=512)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [Google Gemini 2.5 Pro]
@@ -89,6 +122,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [Google Gemini 3 Flash Preview]
@@ -96,6 +132,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [Google Gemini 3.1 Flash-Lite Preview]
@@ -103,6 +142,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=512)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [Google Gemini 3.1 Pro Preview]
@@ -110,6 +152,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [Google Gemini 3.5 Flash]
@@ -117,6 +162,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [Ollama]
@@ -125,6 +173,9 @@ prompt = string(default="")
 chosen_model = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=60, min=1)
 
 [llama.cpp]
@@ -132,6 +183,9 @@ base_url = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=60, min=1)
 
 [Pixtral Large]
@@ -139,12 +193,18 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [Pollinations (OpenAI)]
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [OpenAI O3]
@@ -152,6 +212,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [OpenAI O3 pro]
@@ -159,6 +222,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [OpenAI O3 mini]
@@ -166,6 +232,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=20, min=1)
 
 [OpenAI O4 mini]
@@ -173,6 +242,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [GPT-4.1]
@@ -180,6 +252,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [GPT-4.1 mini]
@@ -187,6 +262,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=20, min=1)
 
 [GPT-4.1 nano]
@@ -194,6 +272,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=512)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [GPT-5]
@@ -201,6 +282,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [GPT-5 mini]
@@ -208,6 +292,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=20, min=1)
 
 [GPT-5 nano]
@@ -215,6 +302,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=512)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [GPT-5 chat]
@@ -222,6 +312,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [GPT-5.4]
@@ -229,6 +322,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [GPT-5.4 mini]
@@ -236,6 +332,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=20, min=1)
 
 [GPT-5.4 nano]
@@ -243,6 +342,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=512)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [GPT-5.5]
@@ -250,6 +352,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [GPT-5.5 pro]
@@ -257,6 +362,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=60, min=1)
 
 [Grok 2 vision]
@@ -264,6 +372,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [Grok 4]
@@ -271,6 +382,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [Grok 4 Fast (reasoning)]
@@ -278,6 +392,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [Grok 4 Fast (non-reasoning)]
@@ -285,6 +402,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=15, min=1)
 
 [Grok 4.3]
@@ -292,6 +412,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 
@@ -300,6 +423,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [Claude 4 Sonnet]
@@ -307,6 +433,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=20, min=1)
 
 [Kimi K3]
@@ -314,6 +443,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=2048)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [Kimi K2.6]
@@ -321,6 +453,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [Kimi K2.5]
@@ -328,6 +463,9 @@ api_key = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [vivo BlueLM Vision (NVDA-CN)]
@@ -335,6 +473,9 @@ nvdacn_user = string(default="")
 nvdacn_pass = string(default="")
 prompt = string(default="")
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [LiteLLM Proxy]
@@ -344,15 +485,51 @@ chosen_model = string(default="")
 prompt = string(default="")
 max_tokens = integer(default=1024)
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=30, min=1)
 
 [Seer]
 base_url = string(default="http://127.0.0.1:11435")
 cache_descriptions = boolean(default=False)
+cache_max_entries = integer(default=0, min=0)
+cache_max_megabytes = integer(default=0, min=0)
+cache_max_age_days = integer(default=0, min=0)
 timeout = integer(default=60, min=1)
 
 [global]
 optimize_for_size = boolean(default=False)
+trim_borders = boolean(default=False)
 open_in_dialog = boolean(default=True)
+stream_responses = boolean(default=False)
+hedge_requests = boolean(default=False)
+hedge_secondary_model = string(default="")
 last_used_model = string(default="Pollinations (OpenAI)")
+cache_backend = option("json", "sqlite", default="json")
+near_duplicate_matching = boolean(default=False)
+near_duplicate_distance = integer(default=4, min=1, max=64)
+shared_cache_paths = string_list(default=list())
+prefetch_focus = boolean(default=False)
+prefetch_delay_ms = integer(default=750, min=100)
+prefetch_max_per_minute = integer(default=4, min=1)
+prewarm_connections = boolean(default=True)
+prewarm_on_startup = boolean(default=False)
+connection_idle_timeout = integer(default=50, min=5, max=600)
+
+[rate_limits]
+openai_per_minute = integer(default=500, min=1)
+openai_concurrent = integer(default=4, min=1)
+anthropic_per_minute = integer(default=50, min=1)
+anthropic_concurrent = integer(default=4, min=1)
+google_per_minute = integer(default=60, min=1)
+google_concurrent = integer(default=4, min=1)
+xai_per_minute = integer(default=60, min=1)
+xai_concurrent = integer(default=4, min=1)
+mistral_per_minute = integer(default=60, min=1)
+mistral_concurrent = integer(default=2, min=1)
+local_per_minute = integer(default=600, min=1)
+local_concurrent = integer(default=2, min=1)
+other_per_minute = integer(default=60, min=1)
+other_concurrent = integer(default=4, min=1)
 """)
@@ -7,11 +7,17 @@
 import base64
 import json
 import functools
+import contextlib
 import urllib.parse
 import urllib.request
-import hashlib
+import threading
+import queue
 import uuid
 import vivo_auth
+import transport
+import streaming
+import request_body
+import image_processing
 import logHandler
 
 log = logHandler.log
@@ -43,38 +49,61 @@ class StepResult:
 
 
 def encode_image(image_path):
-	with open(image_path, "rb") as image_file:
-		return base64.b64encode(image_file.read()).decode("utf-8")
+	"""Returns the image (a path or an image_processing.ImageAsset) as a request_body.Base64Image,
+	which is only base64-encoded as it is sent."""
+	return image_processing.as_asset(image_path).base64
 
 
 def detect_image_media_type(base64_data):
-	"""Detect the media type of an image from its base64-encoded data.
+	"""Detect the media type of an image from its base64-encoded data (or a Base64Image).
 
 	Examines magic bytes to determine the actual image format rather than
 	relying on file extensions, which may not match the image content
 	(e.g. clipboard images).
 	"""
-	header = base64.b64decode(base64_data[:32])
-	if header[:3] == b"\xff\xd8\xff":
-		return "image/jpeg"
-	if header[:8] == b"\x89PNG\r\n\x1a\n":
-		return "image/png"
-	if header[:4] == b"GIF8":
-		return "image/gif"
-	if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
-		return "image/webp"
-	return "image/png"
+	if isinstance(base64_data, request_body.Base64Image):
+		return base64_data.media_type
+	return request_body.sniff_media_type(base64.b64decode(base64_data[:32]))
 
 
 def get_image_hash(image_path):
-	"""Generate a consistent hash for an image file to use as conversation key"""
-	with open(image_path, "rb") as f:
-		return hashlib.md5(f.read()).hexdigest()
+	"""Generate a consistent hash for an image (a path or an image_processing.ImageAsset) to use as conversation key"""
+	return image_processing.as_asset(image_path).digest
+
+
+_background = threading.local()
+
+
+@contextlib.contextmanager
+def background_request():
+	"""Marks description requests made on this thread as speculative.
+
+	Errors are raised instead of spoken, and no conversation is started, so the user never
+	notices a request they didn't ask for.
+	"""
+	_background.active = True
+	try:
+		yield
+	finally:
+		_background.active = False
+
+
+def is_background_request():
+	return getattr(_background, "active", False)
+
+
+def report_error(message):
+	"""Speaks an error found in a reply, or raises it as an IOError during a background request."""
+	if is_background_request():
+		raise IOError(message)
+	import ui
+
+	ui.message(message)
 
 
 def get(*args, **kwargs):
 	"""Get the contents of a URL and report status information back to NVDA.
-	Arguments are the same as those accepted by urllib.request.urlopen.
+	Arguments are the same as those accepted by urllib.request.urlopen; connections are pooled by the transport module.
 	"""
 	import ui
 	import tones
@@ -82,7 +111,7 @@ def get(*args, **kwargs):
 	# translators: error
 	error = _("error")
 	try:
-		response = urllib.request.urlopen(*args, **kwargs).read()
+		response = transport.urlopen(*args, **kwargs).read()
 	except IOError as i:
 		tones.beep(150, 200)
 		# translators: message spoken when we can't connect (error with connection)
@@ -118,6 +147,8 @@ def get(*args, **kwargs):
 def post(**kwargs):
 	"""Post to a URL and report status information back to NVDA.
 	Keyword arguments are the same as those accepted by urllib.request.Request, except for timeout, which is handled separately.
+	Connections are kept open between requests by the transport module, which also retries transient failures
+	(dropped connections, 429s and 5xx errors) before anything is reported.
 	"""
 	import ui
 	import tones
@@ -126,7 +157,9 @@ def post(**kwargs):
 	error = _("error")
 	# Callers that report errors themselves (the computer-use loop, which may have
 	# already abandoned this request) pass quiet=True so we raise instead of speaking.
-	quiet = kwargs.pop("quiet", False)
+	quiet = kwargs.pop("quiet", False) or is_background_request()
+	# Streamed responses are handed over a line at a time as they arrive (on the transport thread), and b"" is returned
+	on_line = kwargs.pop("on_line", None)
 	kwargs["method"] = "POST"
 	if "timeout" in kwargs:
 		timeout = kwargs.get("timeout", 10)
@@ -135,7 +168,17 @@ def post(**kwargs):
 		timeout = 10
 	try:
 		request = urllib.request.Request(**kwargs)
-		response = urllib.request.urlopen(request, timeout=timeout).read()
+		response = transport.request(
+			request.full_url,
+			data=request.data,
+			headers=dict(request.header_items()),
+			method="POST",
+			timeout=timeout,
+			on_line=on_line,
+		).read()
+	except transport.RequestCancelled:
+		# whoever cancelled it has stopped waiting for an answer, so there's nothing to report
+		raise
 	except IOError as i:
 		if quiet:
 			detail = str(i)
@@ -196,6 +239,16 @@ class BaseDescriptionService:
 	needs_configuration_dialog = True
 	configurationPanel = None
 	supports_computer_use = False
+	# Whether replies can be streamed, and whether the stream is server-sent events ("sse")
+	# or newline-delimited JSON ("ndjson")
+	supports_streaming = False
+	stream_format = "sse"
+	# Limits images are scaled down to when optimize_for_size is on. The provider would shrink
+	# anything larger before the model sees it, so sending more only costs upload time.
+	_image_max_long_edge = 2048
+	_image_max_pixels = None
+	# Largest image accepted, in bytes before base64 encoding
+	_image_max_bytes = 15 * 1024 * 1024
 
 	# Conversation management
 	_active_conversation = None
@@ -289,7 +342,7 @@ class BaseDescriptionService:
 						{
 							"type": "image_url",
 							"image_url": {
-								"url": f"data:image/jpeg;base64,{msg['image']}"
+								"url": request_body.data_uri(msg["image"], detect_image_media_type(msg["image"]))
 							},
 						},
 					],
@@ -329,15 +382,93 @@ class BaseDescriptionService:
 		"""Extract the assistant's response from API response. Override if needed."""
 		return response_json["choices"][0]["message"]["content"]
 
+	def _get_stream_url(self):
+		"""Get URL for streamed requests. Override if needed."""
+		return self._get_conversation_url()
+
+	def get_prewarm_url(self):
+		"""A URL on the host requests are sent to, for connecting ahead of them. Override if needed."""
+		return self._get_conversation_url()
+
+	def image_limits(self):
+		"""(max long edge, max pixels, max bytes) for images sent to this model.
+
+		Models that declare limits for computer use screenshots use them for every image."""
+		if hasattr(self, "_capture_max_long_edge"):
+			return self._capture_max_long_edge, self._capture_max_pixels, self._image_max_bytes
+		return self._image_max_long_edge, self._image_max_pixels, self._image_max_bytes
+
+	def prepare_image(self, image_path):
+		"""The image to send, as a request_body.Base64Image. With optimize_for_size on, it is
+		scaled down to this model's limits and re-encoded in a smaller format it accepts."""
+		image = image_processing.as_asset(image_path)
+		if not ch.config["global"]["optimize_for_size"]:
+			return image.base64
+		long_edge, pixels, max_bytes = self.image_limits()
+		return image.optimized(long_edge, pixels, max_bytes, image_processing.accepted_formats(self.supported_formats))
+
+	def _enable_streaming(self, payload):
+		"""Ask for a streamed reply in a payload from build_conversation_payload. Override if needed."""
+		payload["stream"] = True
+
+	def _extract_stream_delta(self, event):
+		"""Extract the text added by one streamed event. This default works for OpenAI-compatible APIs."""
+		if "error" in event:
+			err = event["error"]
+			raise IOError(err.get("message", str(err)) if isinstance(err, dict) else str(err))
+		choices = event.get("choices") or [{}]
+		return (choices[0].get("delta") or {}).get("content") or ""
+
+	def request_conversation(self, payload, stream_callback=None):
+		"""Send a payload from build_conversation_payload and return the assistant's reply.
+
+		If stream_callback is given and the provider supports streaming, the reply is streamed,
+		and stream_callback is called with each new piece of text as it arrives.
+		"""
+		headers = self._get_conversation_headers()
+		if stream_callback is None or not self.supports_streaming:
+			response = post(
+				url=self._get_conversation_url(),
+				headers=headers,
+				data=request_body.JSONBody(payload),
+				timeout=self.timeout,
+			)
+			response_json = json.loads(response.decode("utf-8"))
+			return self._extract_conversation_response(response_json)
+		self._enable_streaming(payload)
+		pieces = []
+
+		def on_line(line):
+			event = streaming.parse_line(line, self.stream_format)
+			if event is None:
+				return
+			delta = self._extract_stream_delta(event)
+			if delta:
+				pieces.append(delta)
+				stream_callback(delta)
+
+		if post(
+			url=self._get_stream_url(),
+			headers=headers,
+			data=request_body.JSONBody(payload),
+			timeout=self.timeout,
+			on_line=on_line,
+		) is None:
+			return ""  # the error has already been reported
+		return "".join(pieces)
+
 	def start_conversation(
 		self, image_path=None, initial_prompt=None, initial_response=None
 	):
 		"""Start a new conversation, optionally with an image"""
+		if is_background_request():
+			# nobody asked, so don't replace the conversation the user may be having
+			return
 		messages = []
 		if image_path and initial_prompt and initial_response:
 			# We have an image/initial prompt and response i.e. a description
 			image_hash = get_image_hash(image_path)
-			base64_image = encode_image(image_path)
+			base64_image = self.prepare_image(image_path)
 			messages = [
 				{"role": "user", "content": initial_prompt, "image": base64_image},
 				{"role": "assistant", "content": initial_response},
@@ -360,9 +491,11 @@ class BaseDescriptionService:
 			self._active_conversation = conversation_id
 
 	def add_to_conversation(
-		self, user_message, image_path=None, include_original_image=True
+		self, user_message, image_path=None, include_original_image=True, stream_callback=None
 	):
-		"""Add user message and get AI response. Returns the AI's response."""
+		"""Add user message and get AI response. Returns the AI's response.
+
+		stream_callback works as it does for request_conversation."""
 		if (
 			not self._active_conversation
 			or self._active_conversation not in self._conversations
@@ -371,7 +504,7 @@ class BaseDescriptionService:
 		messages = self._conversations[self._active_conversation].copy()
 		new_message = {"role": "user", "content": user_message}
 		if image_path:
-			new_message["image"] = encode_image(image_path)
+			new_message["image"] = self.prepare_image(image_path)
 		elif include_original_image and messages:
 			for msg in messages:
 				if msg["role"] == "user" and msg.get("image"):
@@ -379,16 +512,7 @@ class BaseDescriptionService:
 					break
 		messages.append(new_message)
 		payload = self.build_conversation_payload(messages)
-		headers = self._get_conversation_headers()
-		url = self._get_conversation_url()
-		response = post(
-			url=url,
-			headers=headers,
-			data=json.dumps(payload).encode("utf-8"),
-			timeout=self.timeout,
-		)
-		response_json = json.loads(response.decode("utf-8"))
-		ai_response = self._extract_conversation_response(response_json)
+		ai_response = self.request_conversation(payload, stream_callback)
 		messages.append({"role": "assistant", "content": ai_response})
 		self._conversations[self._active_conversation] = messages
 		return ai_response
@@ -428,10 +552,62 @@ class BaseDescriptionService:
 		pass  # implement in subclasses
 
 
+class _InFlightRequest:
+	"""A description request that identical requests wait on instead of repeating."""
+
+	def __init__(self):
+		self.done = threading.Event()
+		self.result = None
+		self.error = None
+		# made by background_request, so its failures were never reported
+		self.background = is_background_request()
+
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def single_flight(key, func):
+	"""Calls func, unless a call with the same key is already running.
+
+	In that case, waits for the running call and returns its result, or raises its exception,
+	so concurrent identical requests share a single network call. The exception is a background
+	request (see background_request) that fails or answers nothing: a request the user made calls
+	func itself instead, so the failure is reported to them as usual.
+	"""
+	while True:
+		with _in_flight_lock:
+			request = _in_flight.get(key)
+			is_leader = request is None
+			if is_leader:
+				request = _in_flight[key] = _InFlightRequest()
+		if is_leader:
+			break
+		log.debug("Waiting for an identical request that is already in flight")
+		request.done.wait()
+		if request.background and not is_background_request() and (request.error is not None or not request.result):
+			log.debug("The background request waited on failed, so making this one afresh")
+			continue
+		if request.error is not None:
+			raise request.error
+		return request.result
+	try:
+		request.result = func()
+		return request.result
+	except BaseException as e:
+		request.error = e
+		raise
+	finally:
+		with _in_flight_lock:
+			del _in_flight[key]
+		request.done.set()
+
+
 def cached_description(func):
 	"""
 	Wraps a description service to provide caching of descriptions. That way, if the same image is
-	processed multiple times, the description is only fetched once from the API.
+	processed multiple times, the description is only fetched once from the API. Identical requests
+	made while one is still running wait for and share its result.
 
 	Usage (In a child of `BaseDescription`):
 	```py
@@ -442,42 +618,141 @@ def cached_description(func):
 			# note, however, that if there is an image in the cache, your function will never be called.
 			return description
 	```
+	image_path may be a path or an image_processing.ImageAsset, and reaches your function as an
+	ImageAsset, so pass it on to prepare_image and start_conversation rather than reading it yourself.
 	"""
 	# TODO: remove fallback cache in later versions
 	FALLBACK_CACHE_NAME = "images"
 
 	@functools.wraps(func)
 	def wrapper(self, image_path, *args, **kw):
+		# read, hashed and encoded once, here, for the cache, the request and the conversation
+		image_path = image_processing.as_asset(image_path)
 		is_cache_enabled = kw.get("cache_descriptions", True)
-		base64_image = encode_image(image_path)
+		prompt = kw.get("prompt") or self.prompt
+		# the hashes for near-duplicate matching are only worth their time when it's on
+		if ch.config["global"]["near_duplicate_matching"]:
+			fingerprint = image_path.similarity_fingerprint
+		else:
+			fingerprint = image_path.fingerprint
+		prompt_digest = cache.request_digest(
+			prompt,
+			kw.get("max_tokens", self.max_tokens),
+			getattr(self, "internal_model_name", None) or ch.config[self.name].get("chosen_model"),
+		)
 		# (optionally) read the cache
 		if is_cache_enabled:
-			cache.read_cache(self.name)
-			description = cache.cache[self.name].get(base64_image)
-			if description is None:
-				# TODO: remove fallback cache in later versions
-				cache.read_cache(FALLBACK_CACHE_NAME)
-				description = cache.cache[FALLBACK_CACHE_NAME].get(base64_image)
-			if description is not None:
+			limits = cache.limits_for(self.name)
+			entry = cache.lookup(self.name, fingerprint.digest, prompt_digest, limits=limits)
+			if entry is None and not kw.get("prompt") and kw.get("max_tokens", self.max_tokens) == self.max_tokens:
+				# entries stored before the prompt was part of the key were all plain descriptions, made
+				# with the configured prompt and token limit, so only requests for one of those may use them
+				entry = cache.lookup(self.name, fingerprint.digest, limits=limits)
+				if entry is None:
+					entry = cache.lookup(FALLBACK_CACHE_NAME, fingerprint.digest, limits=limits)
+			if entry is not None:
+				cache.record("hits")
+			elif ch.config["global"]["near_duplicate_matching"]:
+				# a visually identical image, such as the same control in another colour
+				entry = cache.lookup_similar(
+					self.name,
+					fingerprint,
+					ch.config["global"]["near_duplicate_distance"],
+					prompt_digest,
+				)
+				if entry is not None:
+					cache.record("near_hits")
+			if entry is not None:
 				log.debug(
 					f"Cache hit. Using cached description for {image_path} from {self.name}"
 				)
+				description = entry["description"]
 				# Start a conversation in case the user wishes to follow-up
-				self.start_conversation(image_path, self.prompt, description)
+				self.start_conversation(image_path, prompt, description)
 				return description
-		# delegate to the wrapped description service
-		log.debug(f"Cache miss. Fetching description for {image_path} from {self.name}")
-		description = func(self, image_path, **kw)
-		# (optionally) update the cache
-		if is_cache_enabled:
-			cache.read_cache(self.name)
-			cache.cache[self.name][base64_image] = description
-			cache.write_cache(self.name)
+			cache.record("misses")
+
+		fetched = []
+
+		def fetch():
+			fetched.append(True)
+			# delegate to the wrapped description service
+			log.debug(f"Cache miss. Fetching description for {image_path} from {self.name}")
+			description = func(self, image_path, **kw)
+			# (optionally) update the cache. Failed requests return nothing and shouldn't be remembered
+			if is_cache_enabled and description:
+				cache.store(
+					self.name,
+					fingerprint.digest,
+					cache.make_entry(description, fingerprint),
+					prompt_digest,
+					limits=limits,
+				)
+			return description
+
+		# the same image may already be on its way to this model, e.g. after pressing the gesture twice
+		description = single_flight((self.name, prompt_digest, fingerprint.digest), fetch)
+		if not fetched:
+			cache.record("coalesced")
+		if not fetched and description:
+			# the request that fetched it may have been in the background, or for someone else
+			self.start_conversation(image_path, prompt, description)
 		return description
 
 	return wrapper
 
 
+def race(calls, image_path, on_all_done=None):
+	"""Sends the same image to several services at once, returning (service, description) for the first answer.
+
+	calls is a list of (service, kwargs for its process method), with the preferred service first.
+	Every request runs in the background, so errors are raised rather than spoken. The first answer
+	starts a conversation with the preferred service, so follow-up questions go to it. Slower
+	requests are left to finish on their own, and their descriptions still end up in the cache.
+	on_all_done is called once every request has finished, e.g. to delete the image.
+	If every request fails, the preferred service's error is raised.
+	"""
+	# shared, so every service uses the same bytes, fingerprint and encodings
+	image_path = image_processing.as_asset(image_path)
+	results = queue.Queue()
+	lock = threading.Lock()
+	state = {"remaining": len(calls), "answered": False}
+
+	def run(service, kwargs):
+		try:
+			with background_request():
+				description = service.process(image_path, **kwargs)
+			with lock:
+				is_first = bool(description) and not state["answered"]
+				state["answered"] = state["answered"] or is_first
+			if is_first:
+				primary, primary_kwargs = calls[0]
+				primary.start_conversation(image_path, primary_kwargs.get("prompt") or primary.prompt, description)
+			results.put((service, description, None))
+		except Exception as e:
+			results.put((service, None, e))
+		finally:
+			with lock:
+				state["remaining"] -= 1
+				finished = state["remaining"] == 0
+			if finished and on_all_done is not None:
+				on_all_done()
+
+	for service, kwargs in calls:
+		transport.run_in_background(run, service, kwargs)
+	errors = {}
+	for i in range(len(calls)):
+		service, description, error = results.get()
+		if description:
+			log.debug(f"{service.name} answered first")
+			return service, description
+		errors[service.name] = error
+	for service, kwargs in calls:
+		if errors.get(service.name) is not None:
+			raise errors[service.name]
+	return calls[0][0], None
+
+
 def _normalize_openai_action(raw):
 	"""Normalize an OpenAI Responses API computer_call action to our internal format.
 
@@ -570,7 +845,7 @@ class OpenAIComputerSession:
 					"call_id": tr["call_id"],
 					"output": {
 						"type": "computer_screenshot",
-						"image_url": f"data:image/png;base64,{screenshot_b64}",
+						"image_url": request_body.data_uri(screenshot_b64, "image/png"),
 					},
 					"acknowledged_safety_checks": tr.get("safety_checks", []),
 				}
@@ -605,7 +880,7 @@ class OpenAIComputerSession:
 					+ [
 						{
 							"type": "input_image",
-							"image_url": f"data:image/png;base64,{screenshot_b64}",
+							"image_url": request_body.data_uri(screenshot_b64, "image/png"),
 							"detail": "original",
 						},
 					],
@@ -630,7 +905,7 @@ class OpenAIComputerSession:
 		raw = post(
 			url=OPENAI_RESPONSES_URL,
 			headers=headers,
-			data=json.dumps(payload).encode("utf-8"),
+			data=request_body.JSONBody(payload),
 			timeout=self._service.timeout,
 			quiet=True,
 		)
@@ -669,7 +944,11 @@ class BaseGPT(BaseDescriptionService):
 		".webp",
 	]
 	needs_api_key = True
+	supports_streaming = True
 	openai_url = "https://api.openai.com/v1/chat/completions"
+	# high detail images are fit within 2048x2048, then scaled so the short side is at most 768
+	_image_max_long_edge = 2048
+	_image_max_pixels = 2048 * 768
 
 	def _get_conversation_headers(self):
 		headers = {"Content-Type": "application/json", "User-Agent": "curl/8.4.0"}
@@ -682,26 +961,15 @@ class BaseGPT(BaseDescriptionService):
 
 	@cached_description
 	def process(self, image_path, **kw):
-		base64_image = encode_image(image_path)
+		base64_image = self.prepare_image(image_path)
 		prompt = kw.get("prompt") or self.prompt
 		messages = [{"role": "user", "content": prompt, "image": base64_image}]
 		payload = self.build_conversation_payload(
 			messages, max_tokens=kw.get("max_tokens", self.max_tokens)
 		)
-		headers = self._get_conversation_headers()
-		url = self._get_conversation_url()
-		response = post(
-			url=url,
-			headers=headers,
-			data=json.dumps(payload).encode("utf-8"),
-			timeout=self.timeout,
-		)
-		response_json = json.loads(response.decode("utf-8"))
-		content = self._extract_conversation_response(response_json)
+		content = self.request_conversation(payload, kw.get("stream_callback"))
 		if not content:
-			import ui
-
-			ui.message("content returned none")
+			report_error("content returned none")
 			return
 		self.start_conversation(image_path, prompt, content)
 		return content
@@ -911,6 +1179,10 @@ class GoogleGemini(BaseDescriptionService):
 		".png",
 	]
 	needs_api_key = True
+	supports_streaming = True
+	_image_max_long_edge = 3072
+	# requests with inline images are limited to 20 MB, base64 and prompt included
+	_image_max_bytes = 14 * 1024 * 1024
 
 	def build_conversation_payload(self, messages, **kw):
 		"""Override for Gemini's contents/parts format"""
@@ -920,7 +1192,7 @@ class GoogleGemini(BaseDescriptionService):
 			if msg.get("image"):
 				parts.insert(
 					0,
-					{"inline_data": {"mime_type": "image/jpeg", "data": msg["image"]}},
+					{"inline_data": {"mime_type": detect_image_media_type(msg["image"]), "data": msg["image"]}},
 				)
 			role = msg["role"]
 			if role == "assistant":
@@ -935,15 +1207,26 @@ class GoogleGemini(BaseDescriptionService):
 	def _get_conversation_url(self):
 		return f"https://generativelanguage.googleapis.com/v1beta/models/{self.internal_model_name}:generateContent?key={self.api_key}"
 
+	def _get_stream_url(self):
+		return f"https://generativelanguage.googleapis.com/v1beta/models/{self.internal_model_name}:streamGenerateContent?alt=sse&key={self.api_key}"
+
+	def _enable_streaming(self, payload):
+		pass  # chosen by the URL
+
+	def _extract_stream_delta(self, event):
+		if "error" in event:
+			raise IOError(event["error"].get("message", str(event["error"])))
+		candidates = event.get("candidates") or [{}]
+		parts = (candidates[0].get("content") or {}).get("parts") or []
+		return "".join(part.get("text", "") for part in parts if not part.get("thought"))
+
 	def _get_conversation_headers(self):
 		return {"Content-Type": "application/json"}
 
 	def _extract_conversation_response(self, response_json):
 		if "error" in response_json:
-			import ui
-
 			# translators: message spoken when Google gemini encounters an error with the format or content of the input.
-			ui.message(
+			report_error(
 				_("Gemini encountered an error: {code}, {msg}").format(
 					code=response_json["error"]["code"],
 					msg=response_json["error"]["message"],
@@ -953,10 +1236,8 @@ class GoogleGemini(BaseDescriptionService):
 		try:
 			return response_json["candidates"][0]["content"]["parts"][0]["text"]
 		except (KeyError, IndexError):
-			import ui
-
 			# translators: message spoken when a Gemini thinking model uses all its tokens for reasoning, leaving nothing for the visible response. The user should increase max tokens in settings.
-			ui.message(
+			report_error(
 				_(
 					"The model used all available tokens for reasoning and returned no visible response. Try increasing the max tokens setting."
 				)
@@ -965,22 +1246,13 @@ class GoogleGemini(BaseDescriptionService):
 
 	@cached_description
 	def process(self, image_path, **kw):
-		base64_image = encode_image(image_path)
+		base64_image = self.prepare_image(image_path)
 		prompt = kw.get("prompt") or self.prompt
 		messages = [{"role": "user", "content": prompt, "image": base64_image}]
 		payload = self.build_conversation_payload(
 			messages, max_tokens=kw.get("max_tokens", self.max_tokens)
 		)
-		headers = self._get_conversation_headers()
-		url = self._get_conversation_url()
-		response = post(
-			url=url,
-			headers=headers,
-			data=json.dumps(payload).encode("utf-8"),
-			timeout=self.timeout,
-		)
-		response_json = json.loads(response.decode("utf-8"))
-		content = self._extract_conversation_response(response_json)
+		content = self.request_conversation(payload, kw.get("stream_callback"))
 		if not content:
 			return
 		self.start_conversation(image_path, prompt, content)
@@ -1147,7 +1419,7 @@ class AnthropicComputerSession:
 		raw = post(
 			url="https://api.anthropic.com/v1/messages",
 			headers=headers,
-			data=json.dumps(payload).encode("utf-8"),
+			data=request_body.JSONBody(payload),
 			timeout=self._service.timeout,
 			quiet=True,
 		)
@@ -1208,6 +1480,11 @@ class AnthropicComputerSession:
 
 class Anthropic(BaseDescriptionService):
 	supported_formats = [".jpeg", ".jpg", ".png", ".gif", ".webp"]
+	supports_streaming = True
+	_image_max_long_edge = 1568
+	_image_max_pixels = 1_150_000
+	# 5 MB per image, measured after base64 encoding
+	_image_max_bytes = 5 * 1024 * 1024 * 3 // 4
 
 	def build_conversation_payload(self, messages, **kw):
 		"""Override for Anthropic's message format with content arrays"""
@@ -1247,10 +1524,8 @@ class Anthropic(BaseDescriptionService):
 
 	def _extract_conversation_response(self, response_json):
 		if response_json.get("type") == "error":
-			import ui
-
 			# translators: message spoken when Claude encounters an error with the format or content of the input.
-			ui.message(
+			report_error(
 				_("Claude encountered an error. {err}").format(
 					err=response_json["error"]["message"]
 				)
@@ -1258,24 +1533,22 @@ class Anthropic(BaseDescriptionService):
 			return ""
 		return response_json["content"][0]["text"]
 
+	def _extract_stream_delta(self, event):
+		if event.get("type") == "error":
+			raise IOError(event["error"]["message"])
+		if event.get("type") == "content_block_delta" and event["delta"].get("type") == "text_delta":
+			return event["delta"]["text"]
+		return ""
+
 	@cached_description
 	def process(self, image_path, **kw):
-		base64_image = encode_image(image_path)
+		base64_image = self.prepare_image(image_path)
 		prompt = kw.get("prompt") or self.prompt
 		messages = [{"role": "user", "content": prompt, "image": base64_image}]
 		payload = self.build_conversation_payload(
 			messages, max_tokens=kw.get("max_tokens", self.max_tokens)
 		)
-		headers = self._get_conversation_headers()
-		url = self._get_conversation_url()
-		response = post(
-			url=url,
-			headers=headers,
-			data=json.dumps(payload).encode("utf-8"),
-			timeout=self.timeout,
-		)
-		response_json = json.loads(response.decode("utf-8"))
-		content = self._extract_conversation_response(response_json)
+		content = self.request_conversation(payload, kw.get("stream_callback"))
 		if not content:
 			return
 		self.start_conversation(image_path, prompt, content)
@@ -1413,6 +1686,8 @@ class Claude4_7Opus(Anthropic):
 class MistralAI(BaseDescriptionService):
 	supported_formats = [".png", ".jpg", ".jpeg", ".webp", ".gif"]
 	needs_api_key = True
+	supports_streaming = True
+	_image_max_bytes = 10 * 1024 * 1024
 
 	def _get_conversation_url(self):
 		return "https://api.mistral.ai/v1/chat/completions"
@@ -1436,7 +1711,7 @@ class MistralAI(BaseDescriptionService):
 						{"type": "text", "text": msg["content"]},
 						{
 							"type": "image_url",
-							"image_url": f"data:image/jpeg;base64,{msg['image']}",
+							"image_url": request_body.data_uri(msg["image"], detect_image_media_type(msg["image"])),
 						},
 					],
 				}
@@ -1455,26 +1730,15 @@ class MistralAI(BaseDescriptionService):
 
 	@cached_description
 	def process(self, image_path, **kw):
-		base64_image = encode_image(image_path)
+		base64_image = self.prepare_image(image_path)
 		prompt = kw.get("prompt") or self.prompt
 		messages = [{"role": "user", "content": prompt, "image": base64_image}]
 		payload = self.build_conversation_payload(
 			messages, max_tokens=kw.get("max_tokens", self.max_tokens)
 		)
-		headers = self._get_conversation_headers()
-		url = self._get_conversation_url()
-		response = post(
-			url=url,
-			headers=headers,
-			data=json.dumps(payload).encode("utf-8"),
-			timeout=self.timeout,
-		)
-		response_json = json.loads(response.decode("utf-8"))
-		content = self._extract_conversation_response(response_json)
+		content = self.request_conversation(payload, kw.get("stream_callback"))
 		if not content:
-			import ui
-
-			ui.message("content returned none")
+			report_error("content returned none")
 			return
 		self.start_conversation(image_path, prompt, content)
 		return content
@@ -1616,12 +1880,14 @@ class Ollama(BaseDescriptionService):
 		".png",
 	]
 	about_url = "https://github.com/ollama/ollama/blob/main/README.md#quickstart"
+	supports_streaming = True
+	stream_format = "ndjson"
 
 	def list_model_names(self, base_url):
 		base_url = base_url or self.base_url
 		url = urllib.parse.urljoin(base_url, "api/tags")
 		try:
-			content = urllib.request.urlopen(url=url).read()
+			content = transport.urlopen(url).read()
 		except Exception as exc:
 			import ui
 
@@ -1654,32 +1920,26 @@ class Ollama(BaseDescriptionService):
 
 	def _extract_conversation_response(self, response_json):
 		if "message" not in response_json:
-			import ui
-
-			ui.message(
+			report_error(
 				_("The response appears to be malformed. " + repr(response_json))
 			)
 			return ""
 		return response_json["message"]["content"]
 
+	def _extract_stream_delta(self, event):
+		if "error" in event:
+			raise IOError(event["error"])
+		return (event.get("message") or {}).get("content") or ""
+
 	@cached_description
 	def process(self, image_path, **kw):
 		# Build single-image conversation
-		base64_image = encode_image(image_path)
+		base64_image = self.prepare_image(image_path)
 		prompt = kw.get("prompt") or self.prompt
 		messages = [{"role": "user", "content": prompt, "image": base64_image}]
 		# Use conversation methods for consistency
 		payload = self.build_conversation_payload(messages)
-		headers = self._get_conversation_headers()
-		url = self._get_conversation_url()
-		response = post(
-			url=url,
-			headers=headers,
-			data=json.dumps(payload).encode("utf-8"),
-			timeout=self.timeout,
-		)
-		response_json = json.loads(response.decode("utf-8"))
-		content = self._extract_conversation_response(response_json)
+		content = self.request_conversation(payload, kw.get("stream_callback"))
 		if not content:
 			return
 		self.start_conversation(image_path, prompt, content)
@@ -1700,6 +1960,7 @@ class LiteLLMProxy(BaseDescriptionService):
 		".webp",
 	]
 	about_url = "https://docs.litellm.ai/docs/proxy/quick_start"
+	supports_streaming = True
 
 	def list_model_names(self, base_url, api_key=None):
 		base_url = base_url or self.base_url
@@ -1718,7 +1979,7 @@ class LiteLLMProxy(BaseDescriptionService):
 
 		try:
 			request = urllib.request.Request(url, headers=headers)
-			content = urllib.request.urlopen(request).read()
+			content = transport.urlopen(request).read()
 		except Exception as exc:
 			import ui
 
@@ -1754,7 +2015,7 @@ class LiteLLMProxy(BaseDescriptionService):
 				formatted_msg["content"].append(
 					{
 						"type": "image_url",
-						"image_url": {"url": f"data:image/jpeg;base64,{msg['image']}"},
+						"image_url": {"url": request_body.data_uri(msg["image"], detect_image_media_type(msg["image"]))},
 					}
 				)
 
@@ -1784,9 +2045,7 @@ class LiteLLMProxy(BaseDescriptionService):
 			or not response_json["choices"]
 			or "message" not in response_json["choices"][0]
 		):
-			import ui
-
-			ui.message(
+			report_error(
 				_("The response appears to be malformed. " + repr(response_json))
 			)
 			return ""
@@ -1795,22 +2054,13 @@ class LiteLLMProxy(BaseDescriptionService):
 	@cached_description
 	def process(self, image_path, **kw):
 		"""Process an image through the LiteLLM proxy and return a description"""
-		base64_image = encode_image(image_path)
+		base64_image = self.prepare_image(image_path)
 		prompt = kw.get("prompt") or self.prompt
 		messages = [{"role": "user", "content": prompt, "image": base64_image}]
 		payload = self.build_conversation_payload(
 			messages, max_tokens=kw.get("max_tokens", self.max_tokens)
 		)
-		headers = self._get_conversation_headers()
-		url = self._get_conversation_url()
-		response = post(
-			url=url,
-			headers=headers,
-			data=json.dumps(payload).encode("utf-8"),
-			timeout=self.timeout,
-		)
-		response_json = json.loads(response.decode("utf-8"))
-		content = self._extract_conversation_response(response_json)
+		content = self.request_conversation(payload, kw.get("stream_callback"))
 		if not content:
 			return
 		self.start_conversation(image_path, prompt, content)
@@ -1821,6 +2071,7 @@ class LlamaCPP(BaseDescriptionService):
 	name = "llama.cpp"
 	needs_api_key = False
 	needs_base_url = True
+	supports_streaming = True
 	supported_formats = [
 		".jpeg",
 		".jpg",
@@ -1871,9 +2122,7 @@ This add-on integration assumes that you have obtained llama.cpp from Github and
 
 	def _extract_conversation_response(self, response_json):
 		if "content" not in response_json:
-			import ui
-
-			ui.message(
+			report_error(
 				_(
 					"Image recognition response appears to be malformed.\n{response}"
 				).format(response=repr(response_json))
@@ -1881,24 +2130,18 @@ This add-on integration assumes that you have obtained llama.cpp from Github and
 			return ""
 		return response_json["content"]
 
+	def _extract_stream_delta(self, event):
+		return event.get("content") or ""
+
 	@cached_description
 	def process(self, image_path, **kw):
-		base64_image = encode_image(image_path)
+		base64_image = self.prepare_image(image_path)
 		prompt = kw.get("prompt") or self.prompt
 		messages = [{"role": "user", "content": prompt, "image": base64_image}]
 		payload = self.build_conversation_payload(
 			messages, max_tokens=kw.get("max_tokens", self.max_tokens)
 		)
-		headers = self._get_conversation_headers()
-		url = self._get_conversation_url()
-		response = post(
-			url=url,
-			headers=headers,
-			data=json.dumps(payload).encode("utf-8"),
-			timeout=self.timeout,
-		)
-		response_json = json.loads(response.decode("utf-8"))
-		content = self._extract_conversation_response(response_json)
+		content = self.request_conversation(payload, kw.get("stream_callback"))
 		if not content:
 			return
 		self.start_conversation(image_path, prompt, content)
@@ -1915,6 +2158,9 @@ class VivoBlueLMVision(BaseDescriptionService):
 	needs_api_key = False
 	supported_formats = [".jpeg", ".jpg", ".png", ".webp"]
 
+	def get_prewarm_url(self):
+		return "https://api-ai.vivo.com.cn/"
+
 	# Custom properties to manage NVDA-CN credentials from the config file.
 	@property
 	def nvdacn_user(self):
@@ -1949,7 +2195,7 @@ class VivoBlueLMVision(BaseDescriptionService):
 					vivo_messages.append(
 						{
 							"role": "user",
-							"content": f"data:image/jpeg;base64,{msg['image']}",
+							"content": request_body.data_uri(msg["image"], detect_image_media_type(msg["image"])),
 							"contentType": "image",
 						}
 					)
@@ -1976,15 +2222,13 @@ class VivoBlueLMVision(BaseDescriptionService):
 		Extracts content from a successful response or raises an exception for business errors.
 		This approach prevents caching of failed API calls.
 		"""
-		import ui
-
 		if response_json.get("code") != 0:
 			error_msg = response_json.get("msg", "Unknown error from vivo API")
 			log.warning(
 				f"VIVO API returned a business error. Code: {response_json.get('code')}, Message: {error_msg}"
 			)
 			formatted_error = _("API Error: {error}").format(error=error_msg)
-			ui.message(formatted_error)
+			report_error(formatted_error)
 			raise IOError(formatted_error)
 		data_obj = response_json.get("data", {})
 		content_str = data_obj.get("content")
@@ -2030,7 +2274,7 @@ class VivoBlueLMVision(BaseDescriptionService):
 			response_bytes = post(
 				url=full_url,
 				headers=headers,
-				data=json.dumps(payload).encode("utf-8"),
+				data=request_body.JSONBody(payload),
 				timeout=self.timeout,
 			)
 			if not response_bytes:
@@ -2047,7 +2291,8 @@ class VivoBlueLMVision(BaseDescriptionService):
 				f"An error occurred during VIVO request preparation or parsing: {e}",
 				exc_info=True,
 			)
-			ui.message(str(e))
+			if not is_background_request():
+				ui.message(str(e))
 			# Re-throw the exception to ensure the operation fails correctly.
 			raise
 
@@ -2060,7 +2305,7 @@ class VivoBlueLMVision(BaseDescriptionService):
 		"""
 		prompt = kw.get("prompt") or self.prompt
 		messages = [
-			{"role": "user", "content": prompt, "image": encode_image(image_path)}
+			{"role": "user", "content": prompt, "image": self.prepare_image(image_path)}
 		]
 		content = self._perform_vivo_request(messages)
 		self.start_conversation(image_path, prompt, content)
@@ -2081,7 +2326,7 @@ class VivoBlueLMVision(BaseDescriptionService):
 		messages = self._conversations[self._active_conversation].copy()
 		new_message = {"role": "user", "content": user_message}
 		if image_path:
-			new_message["image"] = encode_image(image_path)
+			new_message["image"] = self.prepare_image(image_path)
 		messages.append(new_message)
 		try:
 			ai_response = self._perform_vivo_request(messages)
@@ -2108,15 +2353,18 @@ class Seer(BaseDescriptionService):
 	about_url = "https://github.com/recursia-lab/Seer"
 	supported_formats = [".jpeg", ".jpg", ".png", ".webp", ".bmp"]
 
+	def get_prewarm_url(self):
+		return self.base_url
+
 	@cached_description
 	def process(self, image_path, **kw):
-		base64_image = encode_image(image_path)
-		payload = json.dumps(
+		base64_image = self.prepare_image(image_path)
+		payload = request_body.JSONBody(
 			{
 				"image_b64": base64_image,
 				"task": "caption",
 			}
-		).encode("utf-8")
+		)
 		headers = {"Content-Type": "application/json"}
 		url = urllib.parse.urljoin(self.base_url.rstrip("/") + "/", "describe")
 		response = post(url=url, headers=headers, data=payload, timeout=self.timeout)
@@ -0,0 +1,437 @@
+# Image preparation for the AI Content Describer NVDA add-on
+# Copyright (C) 2023 - 2026, Carter Temm
+# This add-on is free software, licensed under the terms of the GNU General Public License (version 2).
+# For more details see: https://www.gnu.org/licenses/gpl-2.0.html
+
+"""Images on their way to a model, and shrinking them for the "optimize images for size" setting.
+
+Every image described is an ImageAsset, whether it came from a file or was captured in memory
+(screenshots, clipboard images and camera pictures, which are never written to a file). Its bytes,
+base64 text, digests, dimensions and media type are each worked out at most once, however many
+times the cache, payload builders and conversations ask for them.
+
+Providers downscale large images to a fixed resolution before a model sees them, so anything
+beyond that only costs upload and processing time. optimize() scales an image down to a
+provider's limits, picks an encoding suited to what the image shows (see classify), and keeps
+reducing it until it fits the provider's largest accepted size.
+
+Captures of objects and windows often have wide blank margins. ImageAsset.from_capture can trim
+them away first (see find_content_box).
+"""
+
+import functools
+import hashlib
+import io
+import logging
+import math
+import threading
+
+import cache
+import dependency_checker
+import request_body
+
+log = logging.getLogger(__name__)
+
+dependency_checker.expand_path()
+from PIL import Image, ImageChops, ImageFilter, features
+
+DEFAULT_QUALITY = {"image/jpeg": 85, "image/webp": 80}
+# Lossy quality isn't reduced below this to meet a size limit; the image is scaled down instead
+MIN_QUALITY = 50
+QUALITY_STEP = 15
+# Each further reduction in size once MIN_QUALITY is reached
+DOWNSCALE_STEP = 0.75
+# Media types by the file extensions in a service's supported_formats
+FORMATS_BY_EXTENSION = {
+	".jpg": "image/jpeg",
+	".jpeg": "image/jpeg",
+	".png": "image/png",
+	".webp": "image/webp",
+	".gif": "image/gif",
+	".bmp": "image/bmp",
+}
+# What an image shows, as decided by classify()
+CONTENT_KINDS = ("graphic", "text", "photo")
+# Long edge of the copy of an image that classify() looks at
+CLASSIFY_SIZE = 256
+# At most this many colours (in the classified copy) makes an image a graphic
+GRAPHIC_MAX_COLORS = 256
+# Graphics with up to this many colours are sent as a palette PNG. Past 256, the few extra shades
+# that anti-aliasing and scaling add are merged with their nearest neighbours.
+PALETTE_MAX_COLORS = 1024
+# Images with no more distinct colours than this fraction of their pixels are UI or documents,
+# whose anti-aliased text adds shades but nowhere near as many as a photo has
+TEXT_MAX_COLOR_RATIO = 0.1
+# ... as are those with more, where at least this fraction of pixels is on a sharp edge (text over a picture)
+TEXT_MIN_EDGE_DENSITY = 0.15
+# Brightness change (0-255) between neighbouring pixels counted as a sharp edge
+EDGE_THRESHOLD = 64
+# Long edge of the copy of an image searched for a uniform border
+TRIM_SAMPLE_SIZE = 512
+# Brightness difference (0-255) from the border colour that counts as content, in the averaged copy
+TRIM_TOLERANCE = 12
+# Pixels of border kept around the content, so nothing at its edge is lost to the copy's coarser pixels
+TRIM_MARGIN = 4
+# Borders are only trimmed when that removes at least this fraction of the image
+TRIM_MIN_SAVING = 0.05
+
+# Counters for this session: for each of CONTENT_KINDS, images optimized, and the bytes before and after.
+# Before is the file, or the PNG of a capture; for a capture that was scaled down before it was ever
+# encoded, the PNG of the scaled image.
+_stats = {f"{kind}_{name}": 0 for kind in CONTENT_KINDS for name in ("images", "bytes_before", "bytes_after")}
+_stats_lock = threading.Lock()
+
+
+def _record(kind, before, after):
+	with _stats_lock:
+		_stats[f"{kind}_images"] += 1
+		_stats[f"{kind}_bytes_before"] += before
+		_stats[f"{kind}_bytes_after"] += after
+
+
+def get_stats():
+	"""Returns a copy of this session's counters, along with a {kind}_bytes_saved for each of CONTENT_KINDS."""
+	with _stats_lock:
+		stats = dict(_stats)
+	for kind in CONTENT_KINDS:
+		stats[f"{kind}_bytes_saved"] = stats[f"{kind}_bytes_before"] - stats[f"{kind}_bytes_after"]
+	return stats
+
+
+def _memoized(method):
+	"""Makes a method of ImageAsset a property that is computed at most once, even across threads."""
+	name = method.__name__
+
+	@functools.wraps(method)
+	def getter(self):
+		try:
+			return self._memo[name]
+		except KeyError:
+			pass
+		with self._lock:
+			if name not in self._memo:
+				self._memo[name] = method(self)
+			return self._memo[name]
+
+	return property(getter)
+
+
+class ImageAsset:
+	"""An image to be described, from a file or held in memory.
+
+	Make one with from_file, from_image (a PIL image, such as a screenshot) or from_bytes. It never
+	changes, so it can be shared between threads, as when one image is raced between two models.
+	Each property is computed the first time it is used and kept.
+	"""
+
+	def __init__(self, path=None, image=None, data=None):
+		self._path = path
+		self._image = image
+		self._data = data
+		self._memo = {}
+		# reentrant, since some properties are made from others
+		self._lock = threading.RLock()
+
+	@classmethod
+	def from_file(cls, path):
+		return cls(path=path)
+
+	@classmethod
+	def from_image(cls, image):
+		return cls(image=image)
+
+	@classmethod
+	def from_bytes(cls, data):
+		return cls(data=bytes(data))
+
+	@classmethod
+	def from_capture(cls, image, trim=False):
+		"""An ImageAsset for a screen capture. With trim, any uniform border around the content is cropped away."""
+		if trim:
+			box = find_content_box(image)
+			if box is not None:
+				log.debug(f"Trimmed a {image.width}x{image.height} capture to {box}")
+				image = image.crop(box)
+		return cls(image=image)
+
+	@property
+	def path(self):
+		"""The file the image came from, or None if it was only ever in memory."""
+		return self._path
+
+	@_memoized
+	def data(self):
+		"""The encoded image: the file's contents, or PNG for an image captured in memory."""
+		if self._data is not None:
+			return self._data
+		if self._image is not None:
+			out = io.BytesIO()
+			self._image.save(out, format="PNG")
+			return out.getvalue()
+		with open(self._path, "rb") as f:
+			return f.read()
+
+	@_memoized
+	def decoded(self):
+		"""The image as a PIL image, or None if PIL can't read it."""
+		if self._image is not None:
+			return self._image
+		try:
+			img = Image.open(io.BytesIO(self.data))
+			img.load()
+			return img
+		except Exception:
+			log.debug(f"Couldn't decode {self}", exc_info=True)
+			return None
+
+	@_memoized
+	def base64(self):
+		"""The image as a request_body.Base64Image, sharing its bytes."""
+		return request_body.Base64Image(self.data, media_type=self.media_type)
+
+	@_memoized
+	def media_type(self):
+		return request_body.sniff_media_type(self.data)
+
+	@_memoized
+	def digest(self):
+		"""An MD5 digest of the encoded image, identifying its conversation."""
+		return hashlib.md5(self.data).hexdigest()
+
+	@_memoized
+	def fingerprint(self):
+		"""The cache.Fingerprint of the image's pixels."""
+		if self.decoded is None:
+			return cache.fingerprint_image(self.data)
+		return cache.fingerprint_decoded(self.decoded)
+
+	@_memoized
+	def similarity_fingerprint(self):
+		"""fingerprint, with the hashes for near-duplicate matching (which take longer) filled in."""
+		if self.decoded is None:
+			return self.fingerprint
+		return cache.with_similarity(self.fingerprint, self.decoded)
+
+	@property
+	def encoded_size(self):
+		"""The length of data, or None for a capture that hasn't been encoded yet (as that takes time)."""
+		if self._image is not None and "data" not in self._memo:
+			return None
+		return len(self.data)
+
+	@property
+	def size(self):
+		"""(width, height), or None if PIL can't read the image."""
+		return None if self.decoded is None else self.decoded.size
+
+	def optimized(self, max_long_edge=None, max_pixels=None, max_bytes=None, formats=("image/jpeg", "image/png")):
+		"""optimize() for this image, as a request_body.Base64Image. Kept for each set of limits."""
+		key = ("optimized", max_long_edge, max_pixels, max_bytes, frozenset(formats))
+		with self._lock:
+			if key not in self._memo:
+				data = optimize(self, max_long_edge, max_pixels, max_bytes, formats)
+				self._memo[key] = self.base64 if data is self.data else request_body.Base64Image(data)
+			return self._memo[key]
+
+	def __str__(self):
+		if self._path is not None:
+			return self._path
+		if self._image is not None:
+			return f"captured {self._image.width}x{self._image.height} image"
+		return f"{len(self._data)} byte image"
+
+
+def as_asset(image):
+	"""An ImageAsset for image, given as one already or as the path of an image file."""
+	if isinstance(image, ImageAsset):
+		return image
+	return ImageAsset.from_file(image)
+
+
+def calculate_scale(w, h, max_long_edge=None, max_pixels=None):
+	"""Return the scale factor satisfying both the long-edge and pixel-area limits."""
+	scale = 1.0
+	if max_long_edge is not None:
+		long_edge = max(w, h)
+		if long_edge > max_long_edge:
+			scale = min(scale, max_long_edge / long_edge)
+	if max_pixels is not None:
+		pixels = w * h
+		if pixels > max_pixels:
+			scale = min(scale, math.sqrt(max_pixels / pixels))
+	return scale
+
+
+def accepted_formats(supported_formats):
+	"""The media types a service accepts, from its supported_formats file extensions."""
+	return {FORMATS_BY_EXTENSION[ext] for ext in supported_formats if ext in FORMATS_BY_EXTENSION}
+
+
+def _scaled(img, scale):
+	return img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.LANCZOS)
+
+
+def _flatten(img):
+	"""The image as RGB, with any transparency over white, for formats without an alpha channel."""
+	if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+		img = img.convert("RGBA")
+		background = Image.new("RGB", img.size, (255, 255, 255))
+		background.paste(img, mask=img.getchannel("A"))
+		return background
+	return img if img.mode == "RGB" else img.convert("RGB")
+
+
+def classify(img):
+	"""What a PIL image shows, as one of CONTENT_KINDS, from the colours and edges of a small copy of it.
+
+	A graphic has few colours (flat UI, diagrams, most documents), and text has many but is mostly
+	flat colour or sharp edges (anti-aliased text, text over a picture). Both are kept lossless so
+	text stays legible. Anything else is a photo, which is far smaller in a lossy format.
+	"""
+	scale = min(1.0, CLASSIFY_SIZE / max(img.width, img.height))
+	# nearest neighbour, so the copy has only colours the image has
+	sample = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.NEAREST)
+	sample = _flatten(sample)
+	pixels = sample.width * sample.height
+	colors = len(sample.getcolors(pixels))
+	if colors <= GRAPHIC_MAX_COLORS:
+		return "graphic"
+	if colors <= pixels * TEXT_MAX_COLOR_RATIO:
+		return "text"
+	edges = sample.convert("L").filter(ImageFilter.FIND_EDGES).point(lambda value: 255 if value >= EDGE_THRESHOLD else 0)
+	if edges.histogram()[255] >= pixels * TEXT_MIN_EDGE_DENSITY:
+		return "text"
+	return "photo"
+
+
+def find_content_box(img):
+	"""The box (left, top, right, bottom) around a PIL image's content inside a uniform border.
+
+	The border colour is that of the top-left corner, and the search is done on a small averaged
+	copy of the image. Returns None when there is no border worth trimming, or nothing but border.
+	"""
+	scale = min(1.0, TRIM_SAMPLE_SIZE / max(img.width, img.height))
+	# averaging, so thin lines of text still stand out from the border in the smaller copy
+	sample = _flatten(img).resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.BOX)
+	border = Image.new("RGB", sample.size, sample.getpixel((0, 0)))
+	difference = ImageChops.difference(sample, border).convert("L")
+	box = difference.point(lambda value: 255 if value > TRIM_TOLERANCE else 0).getbbox()
+	if box is None:
+		return None
+	# back to the image's pixels, with the copy's pixels at the edges of the content counted in full
+	margin = TRIM_MARGIN
+	left = max(0, math.floor(box[0] / scale) - margin)
+	top = max(0, math.floor(box[1] / scale) - margin)
+	right = min(img.width, math.ceil(box[2] / scale) + margin)
+	bottom = min(img.height, math.ceil(box[3] / scale) + margin)
+	if (right - left) * (bottom - top) > img.width * img.height * (1 - TRIM_MIN_SAVING):
+		return None
+	return left, top, right, bottom
+
+
+def _encode(img, media_type, quality=None, lossless=False):
+	out = io.BytesIO()
+	if media_type == "image/png":
+		img.save(out, format="PNG", optimize=True)
+	elif media_type == "image/webp":
+		if lossless:
+			img.save(out, format="WEBP", lossless=True, method=4)
+		else:
+			img.save(out, format="WEBP", quality=quality or DEFAULT_QUALITY[media_type], method=4)
+	else:
+		_flatten(img).save(out, format="JPEG", quality=quality or DEFAULT_QUALITY["image/jpeg"], optimize=True)
+	return out.getvalue()
+
+
+def _encode_palette(img):
+	"""The image as a palette PNG, or None if it has too many colours for one."""
+	if img.mode != "RGB":
+		# images with transparency or fewer channels are left to an ordinary PNG
+		return None
+	if img.getcolors(PALETTE_MAX_COLORS) is None:
+		return None
+	# exact for 256 colours or fewer
+	out = io.BytesIO()
+	img.quantize(colors=256, dither=Image.NONE).save(out, format="PNG", optimize=True)
+	return out.getvalue()
+
+
+def _lossy_formats(formats):
+	lossy = []
+	if "image/webp" in formats and features.check("webp"):
+		lossy.append("image/webp")
+	if "image/jpeg" in formats:
+		lossy.append("image/jpeg")
+	return lossy
+
+
+def _lossless_candidates(img, kind, formats, resized):
+	"""Yields (bytes, media type) for each lossless encoding worth trying for a graphic or text image."""
+	if resized:
+		yield _encode(img, "image/png"), "image/png"
+	if kind == "graphic":
+		data = _encode_palette(img)
+		if data is not None:
+			yield data, "image/png"
+	if "image/webp" in formats and features.check("webp"):
+		yield _encode(img, "image/webp", lossless=True), "image/webp"
+
+
+def optimize(asset, max_long_edge=None, max_pixels=None, max_bytes=None, formats=("image/jpeg", "image/png")):
+	"""Returns the bytes of an ImageAsset shrunk to the given limits, or its own bytes if nothing smaller could be made.
+
+	The image is scaled down to fit max_long_edge and max_pixels, then encoded in whichever of
+	formats (media types) is smallest among those suited to it: lossless encodings for graphics and
+	text, and lossy ones for photos (see classify). If that is still over max_bytes, a lossy format
+	is used after all, its quality lowered and then the image scaled down further until it fits.
+	"""
+	img = asset.decoded
+	if img is None or getattr(img, "is_animated", False):
+		# sent as it is; re-encoding an animation would keep only the first frame
+		return asset.data
+	kind = classify(img)
+	scale = calculate_scale(img.width, img.height, max_long_edge, max_pixels)
+	resized = scale < 1
+	if resized:
+		img = _scaled(img, scale)
+		data = None
+	else:
+		data = asset.data
+	lossy = _lossy_formats(formats)
+	candidates = [] if resized else [(data, None)]
+	if kind == "photo" and lossy:
+		candidates.extend((_encode(img, media_type), media_type) for media_type in lossy)
+	elif kind == "photo":
+		if resized:
+			candidates.append((_encode(img, "image/png"), "image/png"))
+	else:
+		candidates.extend(_lossless_candidates(img, kind, formats, resized))
+	# read once data has been, if it was; a capture scaled down first is never encoded at full size
+	before = asset.encoded_size
+	if before is None:
+		# the plain PNG comes first among the candidates for a scaled graphic or text image
+		first, first_type = candidates[0]
+		before = len(first) if first_type == "image/png" else len(_encode(img, "image/png"))
+	best, media_type = min(candidates, key=lambda candidate: len(candidate[0]))
+	if max_bytes is not None and len(best) > max_bytes:
+		# lower the quality of a lossy format first, since that costs less detail than scaling down
+		if lossy and media_type not in lossy:
+			media_type = lossy[0]
+		media_type = media_type or "image/png"
+		quality = None
+		while len(best) > max_bytes and min(img.size) > 1:
+			if media_type in lossy and (quality or DEFAULT_QUALITY[media_type]) - QUALITY_STEP >= MIN_QUALITY:
+				quality = (quality or DEFAULT_QUALITY[media_type]) - QUALITY_STEP
+			else:
+				img = _scaled(img, DOWNSCALE_STEP)
+				quality = None
+			best = _encode(img, media_type, quality)
+	if not resized and len(best) >= len(data):
+		best = data
+	_record(kind, before, len(best))
+	if best is not data:
+		log.debug(
+			f"Optimized {asset} ({kind}) to {len(best)} bytes of {media_type} ({img.width}x{img.height}), "
+			f"saving {before - len(best)} bytes"
+		)
+	return best
@@ -1,8 +1,10 @@
-import threading
 import wx
 import os
 
 import ui
+import config_handler as ch
+import streaming
+import transport
 import logging
 log = logging.getLogger(__name__)
 import addonHandler
@@ -24,6 +26,10 @@ class MultimodalInput(wx.Dialog):
 		self.current_image_path = None
 		self.files = []  # the files (images) that are a part of the conversation and need to be cleaned up when this dialog is destroyed
 		self.include_original_image = True
+		# speaks the reply being streamed in, if any
+		self.speaker = None
+		# the Job fetching the reply, aborted if the dialog is closed first
+		self.pending = None
 		self.init_ui()
 		self.load_conversation_history()
 		self.Centre()
@@ -156,8 +162,7 @@ class MultimodalInput(wx.Dialog):
 		# Show thinking indicator
 		# translators: The message shown in the multi-line read-only history field when the AI is processing the user's input.
 		self.text_ctrl.AppendText(_("AI: (thinking...)") + "\n")
-		# Start API call directly (no threading as per user's modifications)
-		threading.Thread(target=self.get_ai_response, args=[user_input], daemon=True).start()
+		self.pending = transport.run_in_background(self.get_ai_response, user_input)
 
 	def get_ai_response(self, user_input):
 		"""Get the response from the AI.
@@ -169,25 +174,48 @@ class MultimodalInput(wx.Dialog):
 				# translators: Message spoken when there is no active conversation in the conversation dialog.
 				self.show_error(_("No active conversation. Please restart the dialog."))
 				return
+			kwargs = {}
+			if ch.config["global"]["stream_responses"] and self.service.supports_streaming:
+				kwargs["stream_callback"] = lambda delta: wx.CallAfter(self.on_stream_delta, delta)
 			response = self.service.add_to_conversation(
 				user_input, 
 				image_path=self.current_image_path,
-				include_original_image=self.include_original_image
+				include_original_image=self.include_original_image,
+				**kwargs
 			)
 			wx.CallAfter(self.on_response_received, response)
+		except transport.RequestCancelled:
+			pass
 		except Exception as e:
 			wx.CallAfter(self.show_error, str(e))
 
-	def on_response_received(self, response):
-		"""Handle AI response on main thread"""
-		# Remove the "thinking..." line
+	def remove_thinking_line(self):
 		current_text = self.text_ctrl.GetValue()
 		if current_text.endswith(_("AI: (thinking...)") + "\n"):
 			lines = current_text.split('\n')
 			lines = lines[:-2]  # Remove empty line and thinking line
 			self.text_ctrl.SetValue('\n'.join(lines) + '\n')
-		self.text_ctrl.AppendText(_("AI: ") + response + "\n")
-		ui.message(response)
+
+	def on_stream_delta(self, delta):
+		"""Append a piece of a streamed reply on the main thread, speaking each sentence as it completes"""
+		if self.speaker is None:
+			self.remove_thinking_line()
+			self.text_ctrl.AppendText(_("AI: "))
+			self.speaker = streaming.SentenceSpeaker(ui.message)
+		self.text_ctrl.AppendText(delta)
+		self.speaker.feed(delta)
+
+	def on_response_received(self, response):
+		"""Handle AI response on main thread"""
+		if self.speaker is not None:
+			# already shown as it arrived
+			self.text_ctrl.AppendText("\n")
+			self.speaker.finish()
+			self.speaker = None
+		else:
+			self.remove_thinking_line()
+			self.text_ctrl.AppendText(_("AI: ") + response + "\n")
+			ui.message(response)
 		self.send_button.Enable(True)
 		self.input_txt.SetFocus()
 		if self.current_image_path:
@@ -196,6 +224,9 @@ class MultimodalInput(wx.Dialog):
 
 	def show_error(self, error_message):
 		"""Show error in the output field"""
+		if self.speaker is not None:
+			self.text_ctrl.AppendText("\n")
+			self.speaker = None
 		self.text_ctrl.AppendText(_("Error: ") + error_message + "\n")
 		ui.message(_("Error: ") + error_message)
 		self.send_button.Enable(True)
@@ -245,6 +276,8 @@ class MultimodalInput(wx.Dialog):
 		"""Handle dialog close"""
 		global _conversation_dialog
 		_conversation_dialog = None
+		if self.pending is not None:
+			self.pending.abort()
 		for file in self.files:
 			log.debug("Cleaning up image: "+file)
 			os.unlink(file)
@@ -252,8 +285,12 @@ class MultimodalInput(wx.Dialog):
 		self.Destroy()
 
 	def attach_new_image(self, image_path, delete=True):
-		"""Attach a new image to the conversation (called from main plugin)"""
-		if not image_path or not os.path.exists(image_path):
+		"""Attach a new image to the conversation (called from main plugin).
+		image_path may also be an image_processing.ImageAsset, which has no file to delete."""
+		if not image_path:
+			return False
+		is_file = isinstance(image_path, str)
+		if is_file and not os.path.exists(image_path):
 			return False
 		# Ask user if they want to attach to current conversation
 		dlg = wx.MessageDialog(
@@ -268,9 +305,13 @@ class MultimodalInput(wx.Dialog):
 		dlg.Destroy()
 		if result == wx.ID_YES:
 			self.current_image_path = image_path
-			if delete:
+			if delete and is_file:
 				self.files.append(image_path)
-			self.image_field.SetValue(os.path.basename(image_path))
+			if is_file:
+				self.image_field.SetValue(os.path.basename(image_path))
+			else:
+				# translators: Value placed in the read-only image field of the conversation dialog when a screenshot, clipboard image or camera picture has been attached.
+				self.image_field.SetValue(_("Captured image"))
 			self.Raise()  # Bring dialog to front
 			self.input_txt.SetFocus()
 			return True
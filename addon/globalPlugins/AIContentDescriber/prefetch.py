@@ -0,0 +1,122 @@
+# *-* coding: utf-8 *-*
+
+# NVDA Add-on: AI Content Describer
+# Copyright (C) 2023 - 2026, Carter Temm
+# This add-on is free software, licensed under the terms of the GNU General Public License (version 2).
+# For more details see: https://www.gnu.org/licenses/gpl-2.0.html
+
+# Speculatively describes unlabeled graphics as they gain focus, so the description is already
+# cached by the time the user asks for it.
+
+import ctypes
+import time
+from collections import deque
+import logging
+log = logging.getLogger(__name__)
+
+import wx
+import api
+import controlTypes
+import config_handler as ch
+import description_service
+import image_processing
+import transport
+import dependency_checker
+dependency_checker.expand_path()
+from PIL import ImageGrab
+
+
+# Roles of images, and of controls that are often nothing but an image when they have no name
+GRAPHIC_ROLES = frozenset((
+	controlTypes.Role.GRAPHIC,
+	controlTypes.Role.BUTTON,
+	controlTypes.Role.TOGGLEBUTTON,
+	controlTypes.Role.LINK,
+	controlTypes.Role.MENUITEM,
+))
+THREAD_PRIORITY_LOWEST = -2
+THREAD_PRIORITY_NORMAL = 0
+
+# the pending wx.CallLater, restarted each time focus moves
+_timer = None
+# monotonic times of the prefetches started within the last minute
+_recent = deque()
+
+
+def is_unlabeled_graphic(obj):
+	return obj.role in GRAPHIC_ROLES and not (obj.name or "").strip()
+
+
+def cancel():
+	global _timer
+	if _timer is not None:
+		_timer.Stop()
+		_timer = None
+
+
+def on_focus(plugin, service, obj):
+	"""Called on the main thread whenever focus moves. Schedules a prefetch once focus settles."""
+	global _timer
+	cancel()
+	if not ch.config["global"]["prefetch_focus"]:
+		return
+	# without the cache, the description would be thrown away
+	if not service or not service.is_available or not ch.config[service.name]["cache_descriptions"]:
+		return
+	if not is_unlabeled_graphic(obj):
+		return
+	_timer = wx.CallLater(ch.config["global"]["prefetch_delay_ms"], _capture, plugin, service, obj)
+
+
+def _within_rate_limit():
+	now = time.monotonic()
+	while _recent and now - _recent[0] >= 60:
+		_recent.popleft()
+	if len(_recent) >= ch.config["global"]["prefetch_max_per_minute"]:
+		return False
+	_recent.append(now)
+	return True
+
+
+def _capture(plugin, service, obj):
+	global _timer
+	_timer = None
+	if api.getFocusObject() is not obj or plugin.is_screen_curtain_running():
+		return
+	try:
+		left, top, width, height = obj.location
+	except TypeError:
+		return
+	if not width or not height:
+		return
+	if not _within_rate_limit():
+		log.debug("Skipping prefetch, the per-minute limit has been reached")
+		return
+	snap = ImageGrab.grab((left, top, left + width, top + height))
+	if not snap:
+		return
+	# trimmed as describe_object would, so the description is cached for the same image
+	image = image_processing.ImageAsset.from_capture(snap, trim=ch.config["global"]["trim_borders"])
+	transport.run_in_background(_prefetch, service, image)
+
+
+def _set_thread_priority(priority):
+	try:
+		ctypes.windll.kernel32.SetThreadPriority(ctypes.windll.kernel32.GetCurrentThread(), priority)
+	except (AttributeError, OSError):
+		pass
+
+
+def _prefetch(service, image):
+	# Stay out of the way of speech and the rest of NVDA
+	_set_thread_priority(THREAD_PRIORITY_LOWEST)
+	log.debug(f"Prefetching a description of the focused object using {service.name}")
+	try:
+		# same arguments as GlobalPlugin.describe_image, so the result lands under the same cache key
+		with description_service.background_request():
+			service.process(image, **ch.config[service.name])
+	except Exception:
+		log.debug("Prefetch failed", exc_info=True)
+	finally:
+		# the worker thread goes back to the shared pool
+		_set_thread_priority(THREAD_PRIORITY_NORMAL)
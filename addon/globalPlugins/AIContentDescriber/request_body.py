@@ -0,0 +1,131 @@
+# Request bodies for the AI Content Describer NVDA add-on
+# Copyright (C) 2023 - 2026, Carter Temm
+# This add-on is free software, licensed under the terms of the GNU General Public License (version 2).
+# For more details see: https://www.gnu.org/licenses/gpl-2.0.html
+
+"""JSON request bodies that carry images without ever holding them as one big string.
+
+A payload is built as usual, with a Base64Image wherever the base64 text of an image belongs.
+JSONBody serializes everything else once, and encodes each image a piece at a time while the
+request is being sent, so a request needs little more memory than the image itself.
+"""
+
+import base64
+import json
+import uuid
+
+# Bytes of image encoded at a time. A multiple of 3, so the pieces join without padding.
+ENCODE_CHUNK_SIZE = 48 * 1024
+
+
+def sniff_media_type(data):
+	"""The media type of image bytes, from their magic numbers. Defaults to PNG."""
+	if data[:3] == b"\xff\xd8\xff":
+		return "image/jpeg"
+	if data[:8] == b"\x89PNG\r\n\x1a\n":
+		return "image/png"
+	if data[:4] == b"GIF8":
+		return "image/gif"
+	if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+		return "image/webp"
+	return "image/png"
+
+
+class Base64Image:
+	"""The base64 text of an image, encoded only as it is sent.
+
+	prefix is written before the text, for data URIs. In a JSONBody the text is streamed; anywhere
+	else, str() gives the whole of it.
+	"""
+
+	def __init__(self, data, prefix="", media_type=None):
+		self.data = bytes(data)
+		self.prefix = prefix
+		self._media_type = media_type
+
+	@classmethod
+	def from_file(cls, path):
+		with open(path, "rb") as f:
+			return cls(f.read())
+
+	@property
+	def media_type(self):
+		if self._media_type is None:
+			self._media_type = sniff_media_type(self.data)
+		return self._media_type
+
+	def with_prefix(self, prefix):
+		"""The same image (sharing its bytes), with a different prefix."""
+		image = Base64Image.__new__(Base64Image)
+		image.data = self.data
+		image.prefix = prefix
+		image._media_type = self._media_type
+		return image
+
+	def encoded_chunks(self):
+		"""Yields the prefix and the base64 text as ASCII bytes, a piece at a time."""
+		if self.prefix:
+			yield self.prefix.encode("ascii")
+		view = memoryview(self.data)
+		for offset in range(0, len(view), ENCODE_CHUNK_SIZE):
+			yield base64.b64encode(view[offset:offset + ENCODE_CHUNK_SIZE])
+
+	@property
+	def encoded_length(self):
+		return len(self.prefix) + 4 * ((len(self.data) + 2) // 3)
+
+	def __bool__(self):
+		return bool(self.data)
+
+	def __str__(self):
+		return self.prefix + base64.b64encode(self.data).decode("ascii")
+
+
+def data_uri(image, media_type):
+	"""A data URI for an image, given as a Base64Image or as base64 text."""
+	prefix = f"data:{media_type};base64,"
+	if isinstance(image, Base64Image):
+		return image.with_prefix(prefix)
+	return prefix + image
+
+
+class JSONBody:
+	"""A JSON request body, with any Base64Image in the payload encoded as the body is sent.
+
+	len() is the exact size of the body, for Content-Length, and it can be iterated more than once
+	(for redirects and retries), yielding bytes.
+	"""
+
+	def __init__(self, payload):
+		images = []
+		# unique to this body, so it can't clash with anything in the payload
+		marker = uuid.uuid4().hex
+
+		def default(obj):
+			if isinstance(obj, Base64Image):
+				images.append(obj)
+				return f"{marker}{len(images) - 1}"
+			raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+		text = json.dumps(payload, default=default)
+		# between the pieces of text are the images, which replace their quoted placeholders
+		self._parts = []
+		for index, image in enumerate(images):
+			before, text = text.split(f'"{marker}{index}"', 1)
+			self._parts.append(before.encode("utf-8") + b'"')
+			self._parts.append(image)
+			text = '"' + text
+		self._parts.append(text.encode("utf-8"))
+
+	def __len__(self):
+		return sum(
+			part.encoded_length if isinstance(part, Base64Image) else len(part)
+			for part in self._parts
+		)
+
+	def __iter__(self):
+		for part in self._parts:
+			if isinstance(part, Base64Image):
+				yield from part.encoded_chunks()
+			else:
+				yield part
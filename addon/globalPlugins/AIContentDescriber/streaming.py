@@ -0,0 +1,85 @@
+# Streamed response helpers for the AI Content Describer NVDA add-on
+# Copyright (C) 2023 - 2026, Carter Temm
+# This add-on is free software, licensed under the terms of the GNU General Public License (version 2).
+# For more details see: https://www.gnu.org/licenses/gpl-2.0.html
+
+"""Parsing of streamed completions, and splitting of the text into sentences as it arrives."""
+
+import json
+import re
+
+# A sentence ends at terminal punctuation (optionally followed by closing quotes or brackets) and
+# whitespace, or at a line break. Punctuation without following whitespace, as in "3.5" or
+# "example.com", doesn't end one, and neither does the last sentence of a chunk until more arrives.
+SENTENCE_END = re.compile(r"""(?:[.!?…。！？]+["')\]”’]*\s+|\n+)""")
+
+
+def parse_line(line, stream_format):
+	"""Returns the JSON event carried by one line of a streamed response, or None if it carries none.
+
+	stream_format is "sse" for server-sent events (data: lines, ending with an optional [DONE]),
+	or "ndjson" for one JSON object per line.
+	"""
+	line = line.decode("utf-8").strip()
+	if not line:
+		return None
+	if stream_format == "sse":
+		if not line.startswith("data:"):
+			return None  # event names, comments and keep-alives
+		line = line[len("data:"):].strip()
+		if line == "[DONE]":
+			return None
+	return json.loads(line)
+
+
+class SentenceBuffer:
+	"""Collects streamed text and hands back complete sentences as soon as they end."""
+
+	def __init__(self):
+		self.text = ""
+		# how much of text has already been returned as sentences
+		self._position = 0
+
+	def feed(self, delta):
+		"""Adds a piece of text, returning the sentences it completed."""
+		self.text += delta
+		sentences = []
+		for match in SENTENCE_END.finditer(self.text, self._position):
+			sentence = self.text[self._position:match.end()].strip()
+			self._position = match.end()
+			if sentence:
+				sentences.append(sentence)
+		return sentences
+
+	def finish(self):
+		"""Returns whatever is left once the stream has ended."""
+		rest = self.text[self._position:].strip()
+		self._position = len(self.text)
+		return rest
+
+
+class SentenceSpeaker:
+	"""Speaks a streamed reply one sentence at a time, as each sentence is completed.
+
+	speak is called with the text of each sentence. With first_only, only the first sentence is
+	spoken, for when the whole reply will be presented some other way once it is complete.
+	"""
+
+	def __init__(self, speak, first_only=False):
+		self.speak = speak
+		self.first_only = first_only
+		self.buffer = SentenceBuffer()
+		self.started = False
+
+	def feed(self, delta):
+		for sentence in self.buffer.feed(delta):
+			if not (self.first_only and self.started):
+				self.speak(sentence)
+			self.started = True
+
+	def finish(self):
+		"""Speaks whatever is left of the reply once the stream has ended."""
+		rest = self.buffer.finish()
+		if rest and not (self.first_only and self.started):
+			self.speak(rest)
+		self.started = self.started or bool(rest)
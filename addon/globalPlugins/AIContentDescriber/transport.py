@@ -0,0 +1,1100 @@
+# Pooled HTTP transport for the AI Content Describer NVDA add-on
+# Copyright (C) 2023 - 2026, Carter Temm
+# This add-on is free software, licensed under the terms of the GNU General Public License (version 2).
+# For more details see: https://www.gnu.org/licenses/gpl-2.0.html
+
+"""All of the add-on's network I/O, on one background asyncio event loop.
+
+Connections are kept open between requests, so a follow-up question or computer-use step skips the
+DNS lookup and TCP/TLS handshakes paid by the first one. submit() starts a request and returns a
+concurrent.futures.Future; cancelling it aborts the request and closes its connection.
+request() and urlopen() wait for that future, for code that would rather block.
+
+Blocking work that makes requests (describing an image, a computer-use step) runs on a small
+shared pool of worker threads via run_in_background(), instead of a new thread each time.
+Aborting the Job it returns cancels the requests that work is waiting on.
+
+Failed requests are retried according to a RetryPolicy, honouring Retry-After and rate-limit
+reset headers, so every provider gets the same handling of 429s, 5xx errors and dropped connections.
+
+Requests are also paced per provider family by a RateLimiter, which queues rather than fails
+requests over the configured rate or number in flight.
+
+prewarm() opens a connection to a host ahead of the first request to it (the DNS lookup and TCP
+and TLS handshakes), and leaves it idle in the pool. A request made while that is still under way
+waits for it rather than opening a second connection.
+
+Only the standard library is used. Errors mirror urllib's: a response with an error status raises
+urllib.error.HTTPError (with the body readable from .fp), and a failure to connect raises
+urllib.error.URLError, so callers written against urllib.request.urlopen keep working.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import datetime
+import email.utils
+import io
+import ipaddress
+import os
+import random
+import re
+import socket
+import ssl
+import struct
+import sys
+import http.client
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import logHandler
+
+log = logHandler.log
+
+# Idle connections are closed after this many seconds, unless set_idle_timeout says otherwise.
+# Most servers drop them after 60 to 120.
+IDLE_TIMEOUT_SECONDS = 50
+# Idle connections kept per host; more are opened when needed, and closed when returned.
+MAX_IDLE_PER_HOST = 4
+MAX_REDIRECTS = 5
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+# Matches what urllib sent before, since some providers treat unknown clients differently.
+DEFAULT_USER_AGENT = f"Python-urllib/{sys.version_info.major}.{sys.version_info.minor}"
+DEFAULT_TIMEOUT = 10
+# Worker threads for run_in_background, for top-level jobs and for jobs started by other jobs (such
+# as each model's request in a hedged description). Kept apart, so a job waiting on the ones it
+# started never holds a thread they need.
+MAX_WORKERS = 8
+MAX_NESTED_WORKERS = 8
+READ_CHUNK_SIZE = 64 * 1024
+WRITE_CHUNK_SIZE = 64 * 1024
+# Longest status or header line accepted
+MAX_LINE_LENGTH = 64 * 1024
+# Worth retrying: timeouts, "too early", rate limiting, server errors and Anthropic's "overloaded"
+RETRYABLE_STATUSES = frozenset((408, 425, 429, 500, 502, 503, 504, 529))
+# Rate-limit headers, e.g. x-ratelimit-remaining-requests (OpenAI, xAI, Mistral and most others) or
+# anthropic-ratelimit-tokens-reset. Captures the field and the kind of limit.
+RATE_LIMIT_HEADER = re.compile(
+	r"^(?:x-ratelimit-(?P<field>limit|remaining|reset)-(?P<kind>.+)|anthropic-ratelimit-(?P<akind>.+)-(?P<afield>limit|remaining|reset))$"
+)
+# API hosts by provider family, each family being rate limited as a whole. Loopback and private
+# network hosts are "local", and anything else is "other".
+HOST_FAMILIES = {
+	"api.openai.com": "openai",
+	"api.anthropic.com": "anthropic",
+	"generativelanguage.googleapis.com": "google",
+	"api.x.ai": "xai",
+	"api.mistral.ai": "mistral",
+}
+RATE_LIMIT_FAMILIES = ("openai", "anthropic", "google", "xai", "mistral", "local", "other")
+# Used for a family until configure_limits is called: (requests per minute, requests at once)
+DEFAULT_RATE_LIMIT = (60, 4)
+# Go-style durations, as in x-ratelimit-reset-tokens: 6m0s, 1.5s, 20ms
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def _read_endpoint_override():
+	"""Returns the endpoint from AI_CONTENT_DESCRIBER_ENDPOINT if it may be used, or "".
+
+	Requests sent there carry the user's API keys, so only a server on this computer is accepted
+	unless AI_CONTENT_DESCRIBER_ALLOW_REMOTE_ENDPOINT is 1. Either way, a warning is logged.
+	"""
+	endpoint = os.environ.get("AI_CONTENT_DESCRIBER_ENDPOINT", "").rstrip("/")
+	if not endpoint:
+		return ""
+	parts = urllib.parse.urlsplit(endpoint)
+	if parts.scheme not in ("http", "https") or not parts.hostname:
+		log.warning(f"Ignoring AI_CONTENT_DESCRIBER_ENDPOINT={endpoint!r}, which is not an http or https address")
+		return ""
+	if not _is_loopback(parts.hostname) and os.environ.get("AI_CONTENT_DESCRIBER_ALLOW_REMOTE_ENDPOINT") != "1":
+		log.warning(
+			f"Ignoring AI_CONTENT_DESCRIBER_ENDPOINT={endpoint!r}, which is not on this computer. "
+			"Set AI_CONTENT_DESCRIBER_ALLOW_REMOTE_ENDPOINT=1 to send every request there, API keys included"
+		)
+		return ""
+	log.warning(f"AI_CONTENT_DESCRIBER_ENDPOINT is set: every request, API keys included, is sent to {endpoint}")
+	return endpoint
+
+
+def _is_loopback(host):
+	if host.lower() == "localhost":
+		return True
+	try:
+		return ipaddress.ip_address(host).is_loopback
+	except ValueError:
+		return False
+
+
+# For development: a scheme, host and port (such as http://127.0.0.1:8765, where
+# "other stuff/fake_provider_server.py" listens by default) that every request is sent to instead,
+# keeping its path and query. Requests are still rate limited by the family of the original host.
+ENDPOINT_OVERRIDE = _read_endpoint_override()
+
+
+class RequestCancelled(Exception):
+	"""Raised in place of a response when the request was cancelled. Its connection has been closed."""
+
+
+class RetryPolicy:
+	"""Decides whether, and after how long, a failed request is sent again.
+
+	Connection failures and responses with a status in RETRYABLE_STATUSES are retried, up to
+	max_attempts in all. The wait is whatever the server asked for (Retry-After or a rate-limit
+	reset), or else a random time between zero and an exponentially growing cap ("full jitter"),
+	so clients that failed together don't retry together. No retry is made if it would start
+	after budget seconds from the first attempt; without a budget, the request's timeout is used.
+	"""
+
+	def __init__(self, max_attempts=3, base_delay=1.0, max_delay=20.0, budget=None):
+		self.max_attempts = max_attempts
+		self.base_delay = base_delay
+		self.max_delay = max_delay
+		self.budget = budget
+
+	def is_retryable(self, error):
+		if isinstance(error, urllib.error.HTTPError):
+			return error.code in RETRYABLE_STATUSES
+		if isinstance(error, urllib.error.URLError):
+			# as opposed to a bad URL
+			return isinstance(error.reason, OSError)
+		return isinstance(error, (OSError, http.client.HTTPException, asyncio.IncompleteReadError))
+
+	def delay(self, attempt, error, elapsed, timeout):
+		"""Seconds to wait before retrying after a failed attempt (counting from 0), or None to give up."""
+		if attempt + 1 >= self.max_attempts or not self.is_retryable(error):
+			return None
+		delay = None
+		if isinstance(error, urllib.error.HTTPError) and error.headers is not None:
+			delay = server_retry_delay(error.headers)
+		if delay is None:
+			delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+		budget = self.budget if self.budget is not None else timeout
+		if budget is not None and elapsed + delay > budget:
+			return None
+		return delay
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+class RateLimiter:
+	"""Paces the requests sent to one provider family, and caps how many are in flight at once.
+
+	A token bucket refills at requests_per_minute, holding up to a tenth of a minute's worth, so
+	short bursts go straight through but a long run is spread out. Requests beyond either limit
+	wait their turn, in order, instead of failing, though never for longer than they have left.
+	The rate-limit headers of each response then tighten the pace to what the provider says is
+	left, and a reported reset or a 429's Retry-After holds everything back until then.
+
+	Used only from the event loop thread it was created on.
+	"""
+
+	def __init__(self, requests_per_minute, max_concurrent):
+		self.configure(requests_per_minute, max_concurrent)
+		self.tokens = self.capacity
+		self.updated = time.monotonic()
+		self.in_flight = 0
+		# nothing is sent before this monotonic time
+		self.paused_until = 0.0
+		# a future for each request waiting its turn, in order; the first is the one whose turn it is
+		self._queue = collections.deque()
+		self._released = asyncio.Event()
+
+	def configure(self, requests_per_minute, max_concurrent):
+		self.configured_rate = requests_per_minute / 60
+		self.rate = self.configured_rate
+		self.capacity = max(1.0, requests_per_minute / 10)
+		self.max_concurrent = max_concurrent
+
+	def _refill(self):
+		now = time.monotonic()
+		self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+		return now
+
+	async def acquire(self, timeout=None):
+		"""Waits for a request's turn. Raises socket.timeout if that takes longer than timeout seconds."""
+		deadline = None if timeout is None else time.monotonic() + timeout
+		turn = asyncio.get_running_loop().create_future()
+		self._queue.append(turn)
+		try:
+			if self._queue[0] is not turn:
+				await _until(turn, deadline)
+			while self.in_flight >= self.max_concurrent:
+				self._released.clear()
+				await _until(self._released.wait(), deadline)
+			while True:
+				now = self._refill()
+				delay = max(0.0, self.paused_until - now)
+				if self.tokens < 1:
+					delay = max(delay, (1 - self.tokens) / self.rate)
+				if delay <= 0:
+					break
+				await _until(asyncio.sleep(delay), deadline)
+			self.tokens -= 1
+			self.in_flight += 1
+		finally:
+			was_first = self._queue[0] is turn
+			self._queue.remove(turn)
+			if was_first and self._queue and not self._queue[0].done():
+				self._queue[0].set_result(None)
+
+	def release(self):
+		self.in_flight -= 1
+		self._released.set()
+
+	def observe(self, status, headers):
+		"""Adjusts to the limits reported by a response."""
+		if headers is None:
+			return
+		now = self._refill()
+		self.rate = self.configured_rate
+		for kind, limit in rate_limits(headers).items():
+			remaining, reset = limit.get("remaining"), limit.get("reset")
+			if remaining == 0 and reset is not None:
+				self.paused_until = max(self.paused_until, now + reset)
+			elif kind == "requests" and remaining is not None:
+				self.tokens = min(self.tokens, remaining)
+				if reset:
+					# spread what's left over the rest of the window
+					self.rate = max(min(self.rate, remaining / reset), self.configured_rate / 10)
+		if status == 429:
+			delay = server_retry_delay(headers)
+			if delay:
+				self.paused_until = max(self.paused_until, now + delay)
+
+
+class Response:
+	"""A fully read response. Supports the parts of urllib's response object used by the add-on."""
+
+	def __init__(self, url, status, reason, headers, body):
+		self.url = url
+		self.status = status
+		self.reason = reason
+		self.headers = headers
+		self.body = body
+
+	def read(self):
+		return self.body
+
+	def getcode(self):
+		return self.status
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		pass
+
+
+class _Connection:
+	"""An open stream pair, used only from the event loop thread."""
+
+	def __init__(self, reader, writer):
+		self.reader = reader
+		self.writer = writer
+
+	def is_usable(self):
+		return not self.reader.at_eof() and not self.writer.is_closing()
+
+	def close(self):
+		# abort rather than close, so nothing waits on a TLS goodbye the other end may never send
+		self.writer.transport.abort()
+
+	def reset(self):
+		"""Closes a connection mid-request, discarding anything the OS still has queued to send,
+		so a cancelled upload stops at once rather than draining to the server."""
+		sock = self.writer.get_extra_info("socket")
+		if sock is not None:
+			try:
+				sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+			except OSError:
+				pass
+		self.close()
+
+
+class ConnectionPool:
+	"""Persistent connections, keyed by scheme, host, port and proxy.
+
+	Every method runs on the event loop thread, so no locking is needed. A connection is checked
+	out for the duration of a request, and connections idle for longer than idle_timeout are closed.
+	"""
+
+	def __init__(self, idle_timeout=IDLE_TIMEOUT_SECONDS):
+		self.idle_timeout = idle_timeout
+		# key: [(connection, monotonic time it was returned)], most recently used last
+		self._idle = {}
+		self._sweep_handle = None
+		# key: task opening a connection for prewarm, which puts it in _idle when done
+		self._warming = {}
+		self._ssl_context = ssl.create_default_context()
+		# family: (requests per minute, requests at once)
+		self.limits = {}
+		# family: RateLimiter, created on the event loop as needed
+		self._limiters = {}
+
+	def configure_limits(self, limits):
+		self.limits = dict(limits)
+		for family, limiter in self._limiters.items():
+			limiter.configure(*self.limits.get(family, DEFAULT_RATE_LIMIT))
+
+	def _limiter_for(self, url):
+		family = host_family(urllib.parse.urlsplit(url).hostname or "")
+		limiter = self._limiters.get(family)
+		if limiter is None:
+			limiter = self._limiters[family] = RateLimiter(*self.limits.get(family, DEFAULT_RATE_LIMIT))
+		return limiter
+
+	async def _new_connection(self, key, timeout):
+		scheme, host, port, proxy = key
+		try:
+			if proxy is None:
+				return await self._connect(host, port, scheme == "https", timeout)
+			proxy_parts = urllib.parse.urlsplit(proxy)
+			proxy_port = proxy_parts.port or (443 if proxy_parts.scheme == "https" else 80)
+			if scheme == "https":
+				# a CONNECT tunnel through the proxy, with TLS to the real host inside it
+				sock = await asyncio.get_running_loop().run_in_executor(
+					None, _open_tunnel, proxy_parts, proxy_port, host, port, timeout
+				)
+				reader, writer = await _wait(
+					asyncio.open_connection(
+						sock=sock, ssl=self._ssl_context, server_hostname=host, limit=MAX_LINE_LENGTH
+					),
+					timeout,
+				)
+				return _Connection(reader, writer)
+			# plain HTTP is sent to the proxy with the full URL as the path
+			return await self._connect(proxy_parts.hostname, proxy_port, False, timeout)
+		except OSError as e:
+			# nothing was sent (DNS failure, refused, unreachable, TLS handshake), which urllib reports as URLError
+			raise urllib.error.URLError(e) from e
+
+	async def _connect(self, host, port, use_tls, timeout):
+		reader, writer = await _wait(
+			asyncio.open_connection(
+				host,
+				port,
+				ssl=self._ssl_context if use_tls else None,
+				limit=MAX_LINE_LENGTH,
+			),
+			timeout,
+		)
+		return _Connection(reader, writer)
+
+	async def _acquire(self, key, timeout):
+		"""Returns (connection, reused)."""
+		warming = self._warming.get(key)
+		if warming is not None and not self._has_idle(key):
+			# sooner than starting over; if it fails, a connection is opened below as usual
+			try:
+				await _wait(asyncio.shield(warming), timeout)
+			except Exception:
+				pass
+		idle = self._idle.get(key)
+		now = time.monotonic()
+		while idle:
+			conn, returned = idle.pop()
+			if now - returned < self.idle_timeout and conn.is_usable():
+				return conn, True
+			conn.close()
+		return await self._new_connection(key, timeout), False
+
+	def _has_idle(self, key):
+		now = time.monotonic()
+		return any(now - returned < self.idle_timeout and conn.is_usable() for conn, returned in self._idle.get(key, ()))
+
+	async def prewarm(self, url, timeout):
+		"""Opens a connection to url's host and leaves it idle, unless one is idle or being opened already."""
+		key = _pool_key(urllib.parse.urlsplit(url))
+		if key in self._warming or self._has_idle(key):
+			return
+		self._warming[key] = asyncio.ensure_future(self._warm(key, timeout))
+		await asyncio.shield(self._warming[key])
+
+	async def _warm(self, key, timeout):
+		try:
+			conn = await self._new_connection(key, timeout)
+		finally:
+			del self._warming[key]
+		self._release(key, conn)
+
+	def _release(self, key, conn):
+		idle = self._idle.setdefault(key, [])
+		idle.append((conn, time.monotonic()))
+		while len(idle) > MAX_IDLE_PER_HOST:
+			idle.pop(0)[0].close()
+		if self._sweep_handle is None:
+			self._sweep_handle = asyncio.get_running_loop().call_later(self.idle_timeout, self._sweep)
+
+	def _sweep(self):
+		"""Closes connections that have been idle too long, rescheduling itself while any remain."""
+		self._sweep_handle = None
+		cutoff = time.monotonic() - self.idle_timeout
+		for key in list(self._idle):
+			idle = self._idle[key]
+			for conn, returned in [item for item in idle if item[1] <= cutoff]:
+				conn.close()
+			idle[:] = [item for item in idle if item[1] > cutoff]
+			if not idle:
+				del self._idle[key]
+		if self._idle:
+			self._sweep_handle = asyncio.get_running_loop().call_later(self.idle_timeout, self._sweep)
+
+	def close(self):
+		"""Closes every idle connection, and stops any being prewarmed. Connections in use are closed when their requests finish."""
+		if self._sweep_handle is not None:
+			self._sweep_handle.cancel()
+			self._sweep_handle = None
+		for task in list(self._warming.values()):
+			task.cancel()
+		idle, self._idle = self._idle, {}
+		for connections in idle.values():
+			for conn, returned in connections:
+				conn.close()
+
+	async def fetch(self, method, url, data=None, headers=None, timeout=DEFAULT_TIMEOUT, on_line=None, retry=None):
+		"""Sends a request and returns a Response, following redirects like urllib.
+
+		With on_line, each line of a successful response body is passed to it as soon as it arrives
+		(for streamed completions) and the Response's body is left empty. on_line runs on the event
+		loop thread, so it must be quick; anything it raises aborts the request.
+		retry is a RetryPolicy, or None to make a single attempt. A streamed response is never
+		retried once any of it has been passed on.
+		"""
+		limiter = self._limiter_for(url)
+		url = _override_endpoint(url)
+		started = time.monotonic()
+		if retry is None:
+			return await self._limited_fetch(limiter, timeout, method, url, data, headers, timeout, on_line)
+		# the longest a request may wait for its turn, across all of its attempts
+		budget = retry.budget if retry.budget is not None else timeout
+		streamed = False
+
+		def forward(line):
+			nonlocal streamed
+			streamed = True
+			on_line(line)
+
+		for attempt in range(retry.max_attempts):
+			try:
+				remaining = None if budget is None else max(0.0, started + budget - time.monotonic())
+				return await self._limited_fetch(limiter, remaining, method, url, data, headers, timeout, on_line and forward)
+			except Exception as e:
+				delay = None if streamed else retry.delay(attempt, e, time.monotonic() - started, timeout)
+				if delay is None:
+					raise
+				log.warning(f"Request to {urllib.parse.urlsplit(url).hostname} failed ({e}), retrying in {delay:.1f} seconds")
+				await asyncio.sleep(delay)
+
+	async def _limited_fetch(self, limiter, wait_timeout, *args):
+		"""Makes one attempt at a request once its provider's rate limiter lets it through, within wait_timeout seconds."""
+		await limiter.acquire(wait_timeout)
+		try:
+			response = await self._fetch_once(*args)
+		except urllib.error.HTTPError as e:
+			limiter.observe(e.code, e.headers)
+			raise
+		finally:
+			limiter.release()
+		limiter.observe(response.status, response.headers)
+		return response
+
+	async def _fetch_once(self, method, url, data, headers, timeout, on_line):
+		headers = dict(headers or {})
+		for redirect in range(MAX_REDIRECTS + 1):
+			key, conn, version, status, reason, response_headers = await self._open(method, url, data, headers, timeout)
+			try:
+				body = await self._read_body(
+					conn, method, status, response_headers, timeout, on_line if status < 300 else None
+				)
+			except BaseException:
+				# including cancellation, which lands here with the connection mid-response
+				conn.reset()
+				raise
+			if _will_close(version, method, status, response_headers):
+				conn.close()
+			else:
+				self._release(key, conn)
+			response = Response(url, status, reason, response_headers, body)
+			if status not in REDIRECT_CODES or "location" not in response_headers:
+				break
+			url = urllib.parse.urljoin(url, response_headers["location"])
+			if status in (301, 302, 303) and method not in ("GET", "HEAD"):
+				# like browsers and urllib, repeat the request as a GET without its body
+				method, data = "GET", None
+				headers = {k: v for k, v in headers.items() if k.lower() not in ("content-type", "content-length")}
+		if response.status >= 400 or response.status in REDIRECT_CODES:
+			raise urllib.error.HTTPError(
+				response.url, response.status, response.reason, response.headers, io.BytesIO(response.body)
+			)
+		return response
+
+	async def _open(self, method, url, data, headers, timeout):
+		"""Sends a request on a pooled connection, returning (pool key, connection, version, status, reason, headers) once the headers arrive."""
+		parts = urllib.parse.urlsplit(url)
+		key = _pool_key(parts)
+		scheme, host, port, proxy = key
+		path = parts.path or "/"
+		if parts.query:
+			path += "?" + parts.query
+		if proxy is not None and scheme == "http":
+			path = url
+			proxy_parts = urllib.parse.urlsplit(proxy)
+			if proxy_parts.username:
+				headers.setdefault("Proxy-Authorization", _basic_auth(proxy_parts))
+		head = _format_head(method, path, _with_defaults(headers, data, parts), data, parts)
+		conn, reused = await self._acquire(key, timeout)
+		while True:
+			try:
+				conn.writer.write(head)
+				await _send_body(conn.writer, data, timeout)
+				version, status, reason, response_headers = await self._read_head(conn, timeout)
+				return key, conn, version, status, reason, response_headers
+			except (ConnectionError, ssl.SSLEOFError) as e:
+				conn.close()
+				if reused:
+					# an idle connection the server dropped before or as we sent on it
+					log.debug(f"Reused connection to {host} was closed, reconnecting: {e}")
+					conn, reused = await self._new_connection(key, timeout), False
+					continue
+				raise
+			except BaseException:
+				# including cancellation, which may land part way through the upload
+				conn.reset()
+				raise
+
+	async def _read_head(self, conn, timeout):
+		"""Reads a status line and headers, skipping interim 1xx responses. Returns (version, status, reason, headers)."""
+		while True:
+			line = await _wait(conn.reader.readline(), timeout)
+			if not line:
+				raise http.client.RemoteDisconnected("Remote end closed connection without response")
+			try:
+				version, status, reason = (line.decode("latin-1").rstrip("\r\n").split(None, 2) + [""])[:3]
+				status = int(status)
+			except ValueError:
+				raise http.client.BadStatusLine(repr(line)) from None
+			block = []
+			while True:
+				line = await _wait(conn.reader.readline(), timeout)
+				if line in (b"\r\n", b"\n", b""):
+					break
+				block.append(line)
+			headers = http.client.parse_headers(io.BytesIO(b"".join(block) + b"\r\n"))
+			if 100 <= status < 200:
+				continue
+			return version, status, reason, headers
+
+	async def _read_body(self, conn, method, status, headers, timeout, on_line=None):
+		"""Reads the body, returning it, or passing it to on_line a line at a time and returning b""."""
+		pieces = []
+		pending = b""
+		async for chunk in _iter_body(conn.reader, method, status, headers, timeout):
+			if on_line is None:
+				pieces.append(chunk)
+				continue
+			lines = (pending + chunk).split(b"\n")
+			pending = lines.pop()
+			for line in lines:
+				on_line(line + b"\n")
+		if pending:
+			on_line(pending)
+		return b"".join(pieces)
+
+
+async def _send_body(writer, data, timeout):
+	"""Writes a request body a piece at a time, waiting for each to be taken up by the socket.
+
+	data is bytes, or an object with a len() that yields bytes when iterated (a
+	request_body.JSONBody, which produces its pieces as they're needed). A large upload (a
+	screenshot, say) is never buffered twice, and if the request is cancelled part way, the rest
+	of it is never sent.
+	"""
+	if data is None or isinstance(data, (bytes, bytearray, memoryview)):
+		view = memoryview(data or b"")
+		chunks = (view[offset:offset + WRITE_CHUNK_SIZE] for offset in range(0, len(view), WRITE_CHUNK_SIZE))
+	else:
+		chunks = iter(data)
+	for chunk in chunks:
+		writer.write(chunk)
+		await _wait(writer.drain(), timeout)
+	await _wait(writer.drain(), timeout)
+
+
+async def _iter_body(reader, method, status, headers, timeout):
+	"""Yields a response body in pieces as they arrive, for Content-Length, chunked and read-until-close bodies."""
+	if method == "HEAD" or status in (204, 304):
+		return
+	if "chunked" in headers.get("transfer-encoding", "").lower():
+		while True:
+			size_line = await _wait(reader.readline(), timeout)
+			try:
+				size = int(size_line.split(b";", 1)[0].strip(), 16)
+			except ValueError:
+				raise http.client.IncompleteRead(b"") from None
+			if size == 0:
+				break
+			chunk = await _wait(reader.readexactly(size + 2), timeout)
+			yield chunk[:-2]
+		# trailers, which nothing here uses
+		while await _wait(reader.readline(), timeout) not in (b"\r\n", b"\n", b""):
+			pass
+		return
+	length = headers.get("content-length")
+	if length is not None:
+		remaining = int(length)
+		while remaining > 0:
+			chunk = await _wait(reader.read(min(remaining, READ_CHUNK_SIZE)), timeout)
+			if not chunk:
+				raise http.client.IncompleteRead(b"", remaining)
+			remaining -= len(chunk)
+			yield chunk
+		return
+	while True:
+		chunk = await _wait(reader.read(READ_CHUNK_SIZE), timeout)
+		if not chunk:
+			return
+		yield chunk
+
+
+async def _wait(awaitable, timeout):
+	"""Waits with a timeout, raising socket.timeout (as blocking sockets do) when it runs out."""
+	try:
+		return await asyncio.wait_for(awaitable, timeout)
+	except asyncio.TimeoutError:
+		raise socket.timeout("timed out") from None
+
+
+async def _until(awaitable, deadline):
+	"""Waits until a monotonic deadline (or forever, for None), raising socket.timeout as _wait does."""
+	if deadline is None:
+		return await awaitable
+	remaining = deadline - time.monotonic()
+	if remaining <= 0:
+		if asyncio.iscoroutine(awaitable):
+			awaitable.close()
+		raise socket.timeout("timed out")
+	return await _wait(awaitable, remaining)
+
+
+def _open_tunnel(proxy_parts, proxy_port, host, port, timeout):
+	"""Opens a CONNECT tunnel through a proxy, returning the connected socket. Blocking, so run in an executor."""
+	tunnel_headers = {}
+	if proxy_parts.username:
+		tunnel_headers["Proxy-Authorization"] = _basic_auth(proxy_parts)
+	conn = http.client.HTTPConnection(proxy_parts.hostname, proxy_port, timeout=timeout)
+	conn.set_tunnel(host, port, headers=tunnel_headers)
+	try:
+		conn.connect()
+	except BaseException:
+		conn.close()
+		raise
+	# detach the socket, so it outlives conn
+	sock, conn.sock = conn.sock, None
+	return sock
+
+
+def _will_close(version, method, status, headers):
+	"""Whether the connection can't be reused after this response."""
+	connection = headers.get("connection", "").lower()
+	if "close" in connection:
+		return True
+	if version == "HTTP/1.0" and "keep-alive" not in connection:
+		return True
+	# a body without a length or chunking runs until the server closes the connection
+	has_body = method != "HEAD" and status not in (204, 304)
+	return has_body and "content-length" not in headers and "chunked" not in headers.get("transfer-encoding", "").lower()
+
+
+def _format_head(method, path, headers, data, parts):
+	"""The request line and headers, including those http.client would have added."""
+	names = {name.lower() for name in headers}
+	head = [f"{method} {path} HTTP/1.1"]
+	if "host" not in names:
+		host = parts.hostname
+		if ":" in host:
+			host = f"[{host}]"
+		if parts.port:
+			host += f":{parts.port}"
+		head.append(f"Host: {host}")
+	if "accept-encoding" not in names:
+		head.append("Accept-Encoding: identity")
+	if "content-length" not in names and (data is not None or method in ("POST", "PUT", "PATCH")):
+		head.append(f"Content-Length: {len(data) if data is not None else 0}")
+	head += [f"{name}: {value}" for name, value in headers.items()]
+	return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1")
+
+
+def host_family(host):
+	"""The provider family a host belongs to, for rate limiting."""
+	host = host.lower()
+	if host in HOST_FAMILIES:
+		return HOST_FAMILIES[host]
+	if host == "localhost" or host.endswith((".local", ".lan")):
+		return "local"
+	try:
+		address = ipaddress.ip_address(host)
+	except ValueError:
+		return "other"
+	return "local" if address.is_loopback or address.is_private or address.is_link_local else "other"
+
+
+def _parse_reset(value):
+	"""Seconds until a rate-limit reset, given as seconds, a Unix time, an ISO 8601 time or a duration like 1m30s."""
+	value = value.strip()
+	try:
+		number = float(value)
+	except ValueError:
+		pass
+	else:
+		return max(0.0, number - time.time()) if number > 1e9 else number
+	if "T" in value:
+		try:
+			reset = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+		except ValueError:
+			return None
+		return max(0.0, (reset - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+	parts = DURATION_PART.findall(value)
+	if not parts or "".join(number + unit for number, unit in parts) != value:
+		return None
+	scale = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+	return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+def rate_limits(headers):
+	"""The rate limits reported by a response, as {kind: {"limit": n, "remaining": n, "reset": seconds}}.
+
+	kind is e.g. "requests" or "tokens", and any of the three values may be missing.
+	"""
+	limits = {}
+	for name, value in headers.items():
+		match = RATE_LIMIT_HEADER.match(name.lower())
+		if not match:
+			continue
+		field = match.group("field") or match.group("afield")
+		kind = match.group("kind") or match.group("akind")
+		if field == "reset":
+			parsed = _parse_reset(value)
+		else:
+			try:
+				parsed = int(float(value))
+			except ValueError:
+				parsed = None
+		if parsed is not None:
+			limits.setdefault(kind, {})[field] = parsed
+	return limits
+
+
+def server_retry_delay(headers):
+	"""Seconds the server asked us to wait before retrying, or None if it didn't say.
+
+	Checks retry-after-ms, Retry-After (seconds or an HTTP date), then the reset times of any
+	rate limit that has run out.
+	"""
+	value = headers.get("retry-after-ms")
+	if value:
+		try:
+			return max(0.0, float(value) / 1000)
+		except ValueError:
+			pass
+	value = headers.get("retry-after")
+	if value:
+		try:
+			return max(0.0, float(value))
+		except ValueError:
+			try:
+				retry_at = email.utils.parsedate_to_datetime(value)
+				return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+			except (TypeError, ValueError):
+				pass
+	resets = [
+		limit["reset"]
+		for limit in rate_limits(headers).values()
+		if limit.get("remaining") == 0 and "reset" in limit
+	]
+	return max(resets) if resets else None
+
+
+def _pool_key(parts):
+	"""The key pooled connections for a URL (split by urlsplit) are kept under: (scheme, host, port, proxy)."""
+	scheme = parts.scheme.lower()
+	if scheme not in ("http", "https"):
+		raise urllib.error.URLError(f"unsupported URL scheme {scheme!r}")
+	port = parts.port or (443 if scheme == "https" else 80)
+	return scheme, parts.hostname, port, _proxy_for(scheme, parts.hostname)
+
+
+def _override_endpoint(url):
+	"""Returns url with its scheme, host and port replaced by ENDPOINT_OVERRIDE, if that is set."""
+	if not ENDPOINT_OVERRIDE:
+		return url
+	override = urllib.parse.urlsplit(ENDPOINT_OVERRIDE)
+	parts = urllib.parse.urlsplit(url)
+	return urllib.parse.urlunsplit((override.scheme, override.netloc, parts.path, parts.query, parts.fragment))
+
+
+def _basic_auth(proxy_parts):
+	import base64
+
+	credentials = f"{urllib.parse.unquote(proxy_parts.username)}:{urllib.parse.unquote(proxy_parts.password or '')}"
+	return "Basic " + base64.b64encode(credentials.encode("utf-8")).decode("ascii")
+
+
+def _proxy_for(scheme, host):
+	"""Returns the proxy URL configured for a scheme (environment or Windows settings), or None."""
+	proxy = urllib.request.getproxies().get(scheme)
+	if not proxy or urllib.request.proxy_bypass(host):
+		return None
+	if "://" not in proxy:
+		proxy = "http://" + proxy
+	return proxy
+
+
+def _with_defaults(headers, data, parts):
+	"""Fills in the headers urllib would have added."""
+	names = {name.lower() for name in headers}
+	headers = dict(headers)
+	if "user-agent" not in names:
+		headers["User-Agent"] = DEFAULT_USER_AGENT
+	if data is not None and "content-type" not in names:
+		headers["Content-Type"] = "application/x-www-form-urlencoded"
+	if parts.username and "authorization" not in names:
+		headers["Authorization"] = _basic_auth(parts)
+	return headers
+
+
+class Job(concurrent.futures.Future):
+	"""A future for work started with run_in_background.
+
+	abort() cancels the work if it hasn't started. If it has, every request it is waiting on (or
+	makes later) is cancelled, so it finishes promptly with RequestCancelled instead of holding a
+	worker thread until its sockets time out.
+	"""
+
+	def __init__(self):
+		super().__init__()
+		self.aborted = False
+		# things to cancel on abort: request futures and the jobs this one started
+		self._children = set()
+		self._children_lock = threading.Lock()
+
+	def abort(self):
+		with self._children_lock:
+			self.aborted = True
+			children, self._children = self._children, set()
+		self.cancel()
+		for child in children:
+			if isinstance(child, Job):
+				child.abort()
+			else:
+				child.cancel()
+
+	def _adopt(self, child):
+		with self._children_lock:
+			adopted = not self.aborted
+			if adopted:
+				self._children.add(child)
+		if not adopted:
+			child.abort() if isinstance(child, Job) else child.cancel()
+			return
+		child.add_done_callback(self._disown)
+
+	def _disown(self, child):
+		with self._children_lock:
+			self._children.discard(child)
+
+
+_loop = None
+_loop_thread = None
+_executor = None
+_nested_executor = None
+_lifecycle_lock = threading.Lock()
+_pool = ConnectionPool()
+# the Job being run by each worker thread
+_local = threading.local()
+# Jobs not yet finished, aborted by close()
+_jobs = set()
+# jobs finish, and so leave _jobs, on any thread
+_jobs_lock = threading.Lock()
+
+
+def _get_loop():
+	global _loop, _loop_thread
+	with _lifecycle_lock:
+		if _loop is None:
+			_loop = asyncio.new_event_loop()
+			_loop_thread = threading.Thread(target=_loop.run_forever, name="AIContentDescriber transport", daemon=True)
+			_loop_thread.start()
+		return _loop
+
+
+def _get_executor(nested=False):
+	global _executor, _nested_executor
+	with _lifecycle_lock:
+		if nested:
+			if _nested_executor is None:
+				_nested_executor = concurrent.futures.ThreadPoolExecutor(
+					MAX_NESTED_WORKERS, thread_name_prefix="AIContentDescriber nested"
+				)
+			return _nested_executor
+		if _executor is None:
+			_executor = concurrent.futures.ThreadPoolExecutor(MAX_WORKERS, thread_name_prefix="AIContentDescriber")
+		return _executor
+
+
+def current_job():
+	"""The Job running on this thread, or None outside of run_in_background."""
+	return getattr(_local, "job", None)
+
+
+def _forget_job(job):
+	with _jobs_lock:
+		_jobs.discard(job)
+
+
+def run_in_background(func, *args, **kwargs):
+	"""Calls func(*args, **kwargs) on a shared worker thread, returning its Job.
+
+	Requests func makes belong to the Job, so aborting the Job aborts them. A Job started from
+	within another belongs to it in the same way, and runs on a separate set of threads, so the
+	job that started it can wait for it. Nested jobs should not wait on jobs of their own.
+	"""
+	job = Job()
+	parent = current_job()
+	with _jobs_lock:
+		_jobs.add(job)
+	job.add_done_callback(_forget_job)
+
+	def run():
+		if not job.set_running_or_notify_cancel():
+			return
+		_local.job = job
+		try:
+			result = func(*args, **kwargs)
+		except BaseException as e:
+			if not isinstance(e, RequestCancelled):
+				# logged as an uncaught exception on a thread of its own would be
+				log.error(f"Background task {func.__qualname__} failed", exc_info=True)
+			job.set_exception(e)
+		else:
+			job.set_result(result)
+		finally:
+			_local.job = None
+
+	if parent is not None:
+		parent._adopt(job)
+	_get_executor(nested=parent is not None).submit(run)
+	return job
+
+
+def submit(url, data=None, headers=None, method=None, timeout=DEFAULT_TIMEOUT, on_line=None, retry=DEFAULT_RETRY_POLICY):
+	"""Starts a request on the event loop, returning a concurrent.futures.Future for its Response.
+
+	Cancelling the future aborts the request (including any wait to retry it) and closes its
+	connection. on_line and retry are described under ConnectionPool.fetch.
+	"""
+	job = current_job()
+	if job is not None and job.aborted:
+		raise RequestCancelled()
+	if method is None:
+		method = "POST" if data is not None else "GET"
+	future = asyncio.run_coroutine_threadsafe(
+		_pool.fetch(method, url, data=data, headers=headers, timeout=timeout, on_line=on_line, retry=retry), _get_loop()
+	)
+	if job is not None:
+		job._adopt(future)
+	return future
+
+
+def request(url, data=None, headers=None, method=None, timeout=DEFAULT_TIMEOUT, on_line=None, retry=DEFAULT_RETRY_POLICY):
+	"""Sends a request and waits for its Response. Raises RequestCancelled if it was cancelled."""
+	future = submit(url, data=data, headers=headers, method=method, timeout=timeout, on_line=on_line, retry=retry)
+	try:
+		return future.result()
+	except concurrent.futures.CancelledError:
+		raise RequestCancelled() from None
+
+
+def urlopen(url, data=None, timeout=DEFAULT_TIMEOUT, retry=DEFAULT_RETRY_POLICY):
+	"""A pooled stand-in for urllib.request.urlopen, accepting a URL or a urllib.request.Request."""
+	if isinstance(url, urllib.request.Request):
+		return request(
+			url.full_url,
+			data=url.data if data is None else data,
+			headers=dict(url.header_items()),
+			method=url.get_method(),
+			timeout=timeout,
+			retry=retry,
+		)
+	return request(url, data=data, timeout=timeout, retry=retry)
+
+
+def configure_limits(limits):
+	"""Sets the rate limits, as {family: (requests per minute, requests at once)} for families in RATE_LIMIT_FAMILIES."""
+	with _lifecycle_lock:
+		loop = _loop
+	if loop is None:
+		_pool.configure_limits(limits)
+	else:
+		loop.call_soon_threadsafe(_pool.configure_limits, limits)
+
+
+def prewarm(url, timeout=DEFAULT_TIMEOUT):
+	"""Starts opening a connection to url's host, for a request expected soon. Returns at once.
+
+	The connection waits in the pool like any other idle one, and is closed if it goes unused for
+	the idle timeout. Failures are only logged, since the request itself will report them.
+	"""
+
+	def done(future):
+		if not future.cancelled() and future.exception() is not None:
+			log.debug(f"Couldn't prewarm a connection to {urllib.parse.urlsplit(url).hostname}: {future.exception()}")
+
+	future = asyncio.run_coroutine_threadsafe(_pool.prewarm(_override_endpoint(url), timeout), _get_loop())
+	future.add_done_callback(done)
+	return future
+
+
+def set_idle_timeout(seconds):
+	"""Sets how long idle connections (including prewarmed ones) are kept open."""
+	with _lifecycle_lock:
+		loop = _loop
+	if loop is None:
+		_pool.idle_timeout = seconds
+	else:
+		loop.call_soon_threadsafe(setattr, _pool, "idle_timeout", seconds)
+
+
+def close_idle_connections():
+	"""Closes idle connections, so the next requests connect afresh (e.g. after the settings change)."""
+	with _lifecycle_lock:
+		loop = _loop
+	if loop is not None:
+		loop.call_soon_threadsafe(_pool.close)
+
+
+def close():
+	"""Aborts unfinished work, closes idle connections and stops the event loop. Called when the add-on is unloaded."""
+	global _loop, _loop_thread, _executor, _nested_executor, _pool
+	with _jobs_lock:
+		jobs = list(_jobs)
+	for job in jobs:
+		job.abort()
+	with _lifecycle_lock:
+		loop, thread, pool = _loop, _loop_thread, _pool
+		executors = (_executor, _nested_executor)
+		_loop = _loop_thread = _executor = _nested_executor = None
+		# the rate limiters belong to the loop being stopped, so the next one starts with a fresh pool
+		_pool = ConnectionPool(pool.idle_timeout)
+		_pool.configure_limits(pool.limits)
+	for executor in executors:
+		if executor is not None:
+			# jobs that hadn't started were cancelled above, and the rest are on their way out
+			executor.shutdown(wait=False)
+	if loop is not None:
+		loop.call_soon_threadsafe(pool.close)
+		loop.call_soon_threadsafe(loop.stop)
+		thread.join(timeout=2)
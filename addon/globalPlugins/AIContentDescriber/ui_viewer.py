@@ -6,9 +6,6 @@
 # For more details see: https://www.gnu.org/licenses/gpl-2.0.html
 
 
-import os
-import tempfile
-import threading
 import logging
 log = logging.getLogger(__name__)
 
@@ -21,6 +18,9 @@ except addonHandler.AddonError:
 import wx
 import ui
 import tones
+import config_handler as ch
+import image_processing
+import transport
 import dependency_checker
 dependency_checker.expand_path()
 from PIL import ImageGrab
@@ -71,18 +71,15 @@ PROMPT = """You are given a screenshot of a Windows desktop or application. Reco
 9. Include all hint text, tooltips, descriptions, and supplementary text visible near controls."""
 
 
-def _process(service, file):
+def _process(service, image):
 	tones.beep(300, 200)
 	# Translators: message spoken when fetching a UI description
 	wx.CallAfter(ui.message, _("Retrieving UI description using {name}...").format(name=service.name))
-	try:
-		result = service.process(file, prompt=PROMPT, max_tokens=CC_MAX_TOKENS, cache_descriptions=False)
-		if result:
-			# Translators: title of the browseable message showing reconstructed UI controls
-			wx.CallAfter(ui.browseableMessage, result, _("UI Controls"), True, sanitizeHtmlFunc=lambda html:html)
-	finally:
-		log.debug("Cleaning up image: " + file)
-		os.unlink(file)
+	# the prompt and token limit are part of the cache key, so this never returns a plain description
+	result = service.process(image, prompt=PROMPT, max_tokens=CC_MAX_TOKENS, cache_descriptions=ch.config[service.name]["cache_descriptions"])
+	if result:
+		# Translators: title of the browseable message showing reconstructed UI controls
+		wx.CallAfter(ui.browseableMessage, result, _("UI Controls"), True, sanitizeHtmlFunc=lambda html:html)
 
 
 def describe_ui(plugin, service):
@@ -99,6 +96,4 @@ def describe_ui(plugin, service):
 		# Translators: message spoken when capturing the screen fails
 		ui.message(_("Could not get window content"))
 		return
-	file = tempfile.mktemp(suffix=".png")
-	snap.save(file)
-	threading.Thread(target=_process, args=(service, file)).start()
+	transport.run_in_background(_process, service, image_processing.ImageAsset.from_image(snap))
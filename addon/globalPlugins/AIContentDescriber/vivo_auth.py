@@ -14,6 +14,8 @@ import urllib.parse
 import urllib.request
 import urllib.error
 
+import transport
+
 __all__ = ['gen_sign_headers']
 
 NVDACN_API_URL = 'https://nvdacn.com/api/'
@@ -44,31 +46,18 @@ def gen_signature(nvdacn_user, nvdacn_pass, signing_string_bytes):
 		'action': 'signature'
 	}
 	url = f"{NVDACN_API_URL}?{urllib.parse.urlencode(api_params)}"
-	last_exception = None
-	# Retry up to 3 times for transient network issues.
-	for attempt in range(3):
-		try:
-			req = urllib.request.Request(url, data=signing_string_bytes, method='POST')
-			with urllib.request.urlopen(req, timeout=10) as response:
-				response_body = response.read()
-				result = json.loads(response_body)
-			if result.get('code') == 200 and 'data' in result:
-				return result['data']  # Success
-			else:
-				# Business logic errors (e.g., invalid credentials) should not be retried.
-				error_message = result.get('data', 'Unknown API error')
-				raise ValueError(f"NVDACN API Error: {error_message} (Code: {result.get('code')})")
-		except (ConnectionError, urllib.error.URLError) as e:
-			# Catch retryable network errors, including handshake timeouts.
-			last_exception = e
-			# Wait before the next attempt.
-			time.sleep(attempt + 1)
-			continue
-		except (ValueError, json.JSONDecodeError, KeyError, TypeError) as e:
-			# Non-retryable errors.
-			raise e
-	# If all attempts fail, raise the last captured network exception.
-	raise ConnectionError("NVDACN API connection failed after 3 attempts") from last_exception
+	req = urllib.request.Request(url, data=signing_string_bytes, method='POST')
+	try:
+		# Transient network issues are retried by the transport.
+		with transport.urlopen(req, timeout=10) as response:
+			result = json.loads(response.read())
+	except (ConnectionError, urllib.error.URLError) as e:
+		raise ConnectionError("NVDACN API connection failed") from e
+	if result.get('code') == 200 and 'data' in result:
+		return result['data']  # Success
+	# Business logic errors (e.g., invalid credentials) are reported as they are.
+	error_message = result.get('data', 'Unknown API error')
+	raise ValueError(f"NVDACN API Error: {error_message} (Code: {result.get('code')})")
 
 def gen_sign_headers(nvdacn_user, nvdacn_pass, method, uri, query):
 	"""Generates the complete set of authentication headers for the VIVO API."""
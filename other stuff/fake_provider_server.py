@@ -0,0 +1,478 @@
+# A local stand-in for the AI providers, for working on the add-on without expending quota
+# Copyright (C) 2023 - 2026, Carter Temm
+# This add-on is free software, licensed under the terms of the GNU General Public License (version 2).
+# For more details see: https://www.gnu.org/licenses/gpl-2.0.html
+
+"""Emulates the endpoints the add-on talks to, with configurable latency, throughput and errors.
+
+Run it with a normal Python 3 (it needs nothing outside the standard library):
+
+	python "other stuff/fake_provider_server.py" --port 8765 --latency 1.5 --tokens-per-second 30
+
+then start NVDA with the AI_CONTENT_DESCRIBER_ENDPOINT environment variable set to
+http://127.0.0.1:8765, which sends every request the add-on makes here instead, keeping its path.
+Requests are told apart by path, the same way the real services do:
+
+- /v1/chat/completions and /openai: OpenAI-compatible chat (GPT, xAI, Mistral, Moonshot, LiteLLM, Pollinations)
+- /v1/responses: the OpenAI Responses API, as used for computer use
+- /v1/messages: Anthropic messages, including computer use
+- /v1beta/models/<model>:generateContent and :streamGenerateContent: Google Gemini
+- /api/chat and /api/tags: Ollama
+- /completion: llama.cpp
+- /describe: Seer
+- /v1/models: the model list of LiteLLM and other OpenAI-compatible servers
+- /stats: what the server has seen so far, as JSON
+
+Replies are streamed whenever the request asks for it (stream: true, or Gemini's stream URL).
+"""
+
+import argparse
+import collections
+import http.server
+import json
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+
+DEFAULT_REPLY = (
+	"This is a description from the fake {provider} server. "
+	"The request carried {images} image(s) in {kilobytes} KB. "
+	"Nothing in it was actually looked at, but it reads much like a real description would, "
+	"with a few sentences to speak one at a time."
+)
+# Ollama streams by default; everything else only when asked
+STREAMS_BY_DEFAULT = {"ollama"}
+GEMINI_PATH = re.compile(r"^/v1beta/models/(?P<model>[^/:]+):(?P<method>generateContent|streamGenerateContent)$")
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class Stats:
+	"""Counts of what the server has handled, shared between request threads."""
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.requests = collections.Counter()
+		self.errors = collections.Counter()
+		self.bytes_received = 0
+		self.images = 0
+		self.streamed = 0
+
+	def record(self, provider, size, images, streamed):
+		with self.lock:
+			self.requests[provider] += 1
+			self.bytes_received += size
+			self.images += images
+			self.streamed += streamed
+
+	def record_error(self, status):
+		with self.lock:
+			self.errors[str(status)] += 1
+
+	def as_dict(self):
+		with self.lock:
+			return {
+				"requests": dict(self.requests),
+				"errors": dict(self.errors),
+				"bytes_received": self.bytes_received,
+				"images": self.images,
+				"streamed": self.streamed,
+			}
+
+
+class RateWindow:
+	"""A sliding one-minute window of requests, for emulating rate limits."""
+
+	def __init__(self, per_minute):
+		self.per_minute = per_minute
+		self.lock = threading.Lock()
+		self.times = collections.deque()
+
+	def admit(self):
+		"""Returns (admitted, remaining, seconds until a slot frees up)."""
+		now = time.monotonic()
+		with self.lock:
+			while self.times and now - self.times[0] >= 60:
+				self.times.popleft()
+			if len(self.times) >= self.per_minute:
+				return False, 0, 60 - (now - self.times[0])
+			self.times.append(now)
+			reset = 60 - (now - self.times[0])
+			return True, self.per_minute - len(self.times), reset
+
+
+def count_images(value):
+	"""Counts the images in a parsed request body, in any provider's format."""
+	if isinstance(value, dict):
+		count = 0
+		for key, item in value.items():
+			if key in ("images", "image_data") and isinstance(item, list):
+				count += len(item)
+			elif key in ("inline_data", "image_b64"):
+				count += 1
+			elif key == "type" and item in ("image", "input_image", "computer_screenshot"):
+				count += 1
+			elif key == "image_url" and isinstance(value.get("type"), str) and value["type"] == "image_url":
+				count += 1
+			else:
+				count += count_images(item)
+		return count
+	if isinstance(value, list):
+		return sum(count_images(item) for item in value)
+	return 0
+
+
+def words_of(text):
+	"""Splits text into the pieces a stream sends, keeping the spaces so they join back up."""
+	return re.findall(r"\S+\s*", text)
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+	server_version = "FakeProvider/1.0"
+
+	@property
+	def options(self):
+		return self.server.options
+
+	def log_message(self, format, *args):
+		if not self.options.quiet:
+			sys.stderr.write(f"{self.address_string()} - {format % args}\n")
+
+	# routing
+
+	def route(self):
+		"""Returns the name of the provider a request is for, or None."""
+		path = urllib.parse.urlsplit(self.path).path
+		if path in ("/v1/chat/completions", "/openai"):
+			return "openai"
+		if path == "/v1/responses":
+			return "responses"
+		if path == "/v1/messages":
+			return "anthropic"
+		if GEMINI_PATH.match(path):
+			return "google"
+		if path == "/api/chat":
+			return "ollama"
+		if path == "/completion":
+			return "llamacpp"
+		if path == "/describe":
+			return "seer"
+		return None
+
+	def do_GET(self):
+		self.extra_headers = {}
+		path = urllib.parse.urlsplit(self.path).path
+		if path == "/stats":
+			self.send_json(200, self.server.stats.as_dict())
+		elif path == "/api/tags":
+			self.send_json(200, {"models": [{"model": name, "name": name} for name in self.options.models]})
+		elif path == "/v1/models":
+			self.send_json(200, {"object": "list", "data": [{"id": name, "object": "model"} for name in self.options.models]})
+		else:
+			self.send_json(404, {"error": {"message": f"No such endpoint: {path}"}})
+
+	def do_POST(self):
+		self.extra_headers = {}
+		provider = self.route()
+		body = self.read_body()
+		if provider is None:
+			self.send_json(404, {"error": {"message": f"No such endpoint: {self.path}"}})
+			return
+		try:
+			payload = json.loads(body or b"{}")
+		except ValueError as e:
+			self.send_error_reply(provider, 400, f"Request body is not JSON: {e}")
+			return
+		stream = self.wants_stream(provider, payload)
+		images = count_images(payload)
+		self.server.stats.record(provider, len(body), images, stream)
+		self.wait(self.options.latency, self.options.jitter)
+		if self.maybe_fail(provider):
+			return
+		text = self.options.reply.format(
+			provider=provider,
+			images=images,
+			kilobytes=round(len(body) / 1024, 1),
+		)
+		if provider == "responses":
+			self.send_json(200, self.responses_reply(payload, text))
+		elif provider == "anthropic" and payload.get("tools"):
+			self.send_json(200, self.anthropic_computer_reply(payload, text))
+		elif stream:
+			self.stream_reply(provider, text)
+		else:
+			self.wait(len(words_of(text)) / self.options.tokens_per_second)
+			self.send_json(200, self.complete_reply(provider, payload, text))
+
+	def read_body(self):
+		"""Reads the request body, no faster than --upload-kbps allows."""
+		length = int(self.headers.get("Content-Length") or 0)
+		chunks = []
+		started = time.monotonic()
+		received = 0
+		while received < length:
+			chunk = self.rfile.read(min(READ_CHUNK_SIZE, length - received))
+			if not chunk:
+				break
+			chunks.append(chunk)
+			received += len(chunk)
+			if self.options.upload_kbps:
+				ahead = received / (self.options.upload_kbps * 1024) - (time.monotonic() - started)
+				if ahead > 0:
+					time.sleep(ahead)
+		return b"".join(chunks)
+
+	def wants_stream(self, provider, payload):
+		if provider == "google":
+			return urllib.parse.urlsplit(self.path).path.endswith(":streamGenerateContent")
+		if provider in ("responses", "seer"):
+			return False
+		return bool(payload.get("stream", provider in STREAMS_BY_DEFAULT))
+
+	def wait(self, seconds, jitter=0):
+		if jitter:
+			seconds = random.gauss(seconds, jitter)
+		if seconds > 0:
+			time.sleep(seconds)
+
+	# errors and rate limits
+
+	def rate_limit_headers(self, provider, remaining, reset):
+		limit = self.options.rate_limit
+		if provider == "anthropic":
+			reset_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + reset))
+			return {
+				"anthropic-ratelimit-requests-limit": str(limit),
+				"anthropic-ratelimit-requests-remaining": str(remaining),
+				"anthropic-ratelimit-requests-reset": reset_at,
+			}
+		return {
+			"x-ratelimit-limit-requests": str(limit),
+			"x-ratelimit-remaining-requests": str(remaining),
+			"x-ratelimit-reset-requests": f"{reset:.1f}s",
+		}
+
+	def maybe_fail(self, provider):
+		"""Sends an error reply if the rate limit or --error-rate says to, returning whether it did."""
+		if self.server.rate_window is not None:
+			admitted, remaining, reset = self.server.rate_window.admit()
+			self.extra_headers = self.rate_limit_headers(provider, remaining, reset)
+			if not admitted:
+				self.extra_headers["Retry-After"] = str(max(1, round(reset)))
+				self.send_error_reply(provider, 429, "Rate limit exceeded")
+				return True
+		if random.random() < self.options.error_rate:
+			status = random.choice(self.options.error_statuses)
+			if status in (429, 503) and self.options.retry_after is not None:
+				self.extra_headers["Retry-After"] = str(self.options.retry_after)
+			self.send_error_reply(provider, status, "Simulated failure")
+			return True
+		return False
+
+	def send_error_reply(self, provider, status, message):
+		self.server.stats.record_error(status)
+		if provider == "anthropic":
+			body = {"type": "error", "error": {"type": "api_error", "message": message}}
+		elif provider == "ollama":
+			body = {"error": message}
+		elif provider == "seer":
+			body = {"detail": message}
+		else:
+			body = {"error": {"message": message, "type": "server_error", "code": status}}
+		self.send_json(status, body)
+
+	# replies
+
+	def complete_reply(self, provider, payload, text):
+		if provider == "openai":
+			return {
+				"id": f"chatcmpl-{uuid.uuid4().hex}",
+				"object": "chat.completion",
+				"created": int(time.time()),
+				"model": payload.get("model", "fake"),
+				"choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+			}
+		if provider == "anthropic":
+			return {
+				"id": f"msg_{uuid.uuid4().hex}",
+				"type": "message",
+				"role": "assistant",
+				"model": payload.get("model", "fake"),
+				"content": [{"type": "text", "text": text}],
+				"stop_reason": "end_turn",
+			}
+		if provider == "google":
+			return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}]}
+		if provider == "ollama":
+			return {"model": payload.get("model", "fake"), "message": {"role": "assistant", "content": text}, "done": True}
+		if provider == "llamacpp":
+			return {"content": text, "stop": True}
+		return {"description": text}
+
+	def stream_events(self, provider, text):
+		"""Yields the lines of a streamed reply, one word of text per event."""
+		if provider == "anthropic":
+			yield "event: message_start\ndata: " + json.dumps({"type": "message_start", "message": {"role": "assistant", "content": []}})
+			yield "event: content_block_start\ndata: " + json.dumps({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+		for word in words_of(text):
+			if provider == "openai":
+				event = {"choices": [{"index": 0, "delta": {"content": word}}]}
+			elif provider == "anthropic":
+				event = {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": word}}
+			elif provider == "google":
+				event = {"candidates": [{"content": {"role": "model", "parts": [{"text": word}]}}]}
+			elif provider == "ollama":
+				event = {"message": {"role": "assistant", "content": word}, "done": False}
+			else:
+				event = {"content": word, "stop": False}
+			yield json.dumps(event) if provider == "ollama" else "data: " + json.dumps(event)
+		if provider == "openai":
+			yield "data: [DONE]"
+		elif provider == "anthropic":
+			yield "event: message_stop\ndata: " + json.dumps({"type": "message_stop"})
+		elif provider == "ollama":
+			yield json.dumps({"message": {"role": "assistant", "content": ""}, "done": True})
+
+	def stream_reply(self, provider, text):
+		content_type = "application/x-ndjson" if provider == "ollama" else "text/event-stream"
+		self.send_response(200)
+		self.send_header("Content-Type", content_type)
+		self.send_header("Transfer-Encoding", "chunked")
+		for name, value in self.extra_headers.items():
+			self.send_header(name, value)
+		self.end_headers()
+		separator = "\n" if provider == "ollama" else "\n\n"
+		try:
+			for event in self.stream_events(provider, text):
+				self.write_chunk((event + separator).encode("utf-8"))
+				self.wait(1 / self.options.tokens_per_second)
+			self.write_chunk(b"")
+		except (BrokenPipeError, ConnectionResetError):
+			self.close_connection = True
+
+	def write_chunk(self, data):
+		self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+		self.wfile.flush()
+
+	def responses_reply(self, payload, text):
+		"""A Responses API reply: a screenshot action for each of the first --computer-steps turns, then text."""
+		step = self.server.advance_computer_session(payload.get("previous_response_id"))
+		output = []
+		if step <= self.options.computer_steps:
+			output.append({
+				"type": "computer_call",
+				"id": f"cu_{uuid.uuid4().hex}",
+				"call_id": f"call_{uuid.uuid4().hex}",
+				"actions": [{"type": "screenshot"}],
+				"pending_safety_checks": [],
+				"status": "completed",
+			})
+		else:
+			output.append({
+				"type": "message",
+				"role": "assistant",
+				"content": [{"type": "output_text", "text": text}],
+			})
+		response_id = self.server.register_computer_session(step)
+		return {"id": response_id, "object": "response", "output": output, "stop_reason": "completed"}
+
+	def anthropic_computer_reply(self, payload, text):
+		"""An Anthropic computer use reply, counting turns by the tool results sent back so far."""
+		step = 1 + sum(
+			1
+			for message in payload.get("messages", [])
+			if isinstance(message.get("content"), list)
+			for block in message["content"]
+			if isinstance(block, dict) and block.get("type") == "tool_result"
+		)
+		if step <= self.options.computer_steps:
+			content = [{"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex}", "name": "computer", "input": {"action": "screenshot"}}]
+			stop_reason = "tool_use"
+		else:
+			content = [{"type": "text", "text": text}]
+			stop_reason = "end_turn"
+		return {"id": f"msg_{uuid.uuid4().hex}", "type": "message", "role": "assistant", "content": content, "stop_reason": stop_reason}
+
+	def send_json(self, status, body):
+		data = json.dumps(body).encode("utf-8")
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(data)))
+		for name, value in self.extra_headers.items():
+			self.send_header(name, value)
+		self.end_headers()
+		try:
+			self.wfile.write(data)
+		except (BrokenPipeError, ConnectionResetError):
+			self.close_connection = True
+
+
+class FakeProviderServer(http.server.ThreadingHTTPServer):
+	daemon_threads = True
+
+	def __init__(self, address, options):
+		super().__init__(address, Handler)
+		self.options = options
+		self.stats = Stats()
+		self.rate_window = RateWindow(options.rate_limit) if options.rate_limit else None
+		# Responses API ids, mapped to the turn of the computer use session they ended
+		self._computer_steps = {}
+		self._computer_lock = threading.Lock()
+
+	def advance_computer_session(self, previous_response_id):
+		with self._computer_lock:
+			return self._computer_steps.get(previous_response_id, 0) + 1
+
+	def register_computer_session(self, step):
+		response_id = f"resp_{uuid.uuid4().hex}"
+		with self._computer_lock:
+			self._computer_steps[response_id] = step
+		return response_id
+
+
+def parse_args(argv=None):
+	parser = argparse.ArgumentParser(description="A local stand-in for the AI providers used by AI Content Describer.")
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=8765)
+	parser.add_argument("--latency", type=float, default=0.5, help="seconds before a reply starts (default %(default)s)")
+	parser.add_argument("--jitter", type=float, default=0.0, help="standard deviation of the latency, in seconds")
+	parser.add_argument("--tokens-per-second", type=float, default=50.0, help="speed at which reply text is generated and streamed")
+	parser.add_argument("--upload-kbps", type=float, default=0.0, help="cap on how fast request bodies are read, in KB/s (0 for no cap)")
+	parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail, from 0 to 1")
+	parser.add_argument("--error-statuses", default="429,500,503", help="comma-separated statuses failures are chosen from")
+	parser.add_argument("--retry-after", type=int, default=None, help="Retry-After seconds sent with simulated 429 and 503 failures")
+	parser.add_argument("--rate-limit", type=int, default=0, help="requests per minute before replying 429 (0 for no limit)")
+	parser.add_argument("--computer-steps", type=int, default=2, help="screenshot actions a computer use session gets before it completes")
+	parser.add_argument("--models", default="fake-vision-model", help="comma-separated model names for /api/tags and /v1/models")
+	parser.add_argument("--reply", default=DEFAULT_REPLY, help="reply text; {provider}, {images} and {kilobytes} are filled in")
+	parser.add_argument("--seed", type=int, default=None, help="seed for the random latency and failures")
+	parser.add_argument("--quiet", action="store_true", help="don't log each request")
+	options = parser.parse_args(argv)
+	if options.tokens_per_second <= 0:
+		parser.error("--tokens-per-second must be positive")
+	options.error_statuses = [int(status) for status in options.error_statuses.split(",") if status.strip()]
+	options.models = [name.strip() for name in options.models.split(",") if name.strip()]
+	return options
+
+
+def main(argv=None):
+	options = parse_args(argv)
+	if options.seed is not None:
+		random.seed(options.seed)
+	server = FakeProviderServer((options.host, options.port), options)
+	print(f"Fake provider server listening on http://{options.host}:{server.server_address[1]}")
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		print(json.dumps(server.stats.as_dict(), indent="\t"))
+
+
+if __name__ == "__main__":
+	main()
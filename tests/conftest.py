@@ -0,0 +1,75 @@
+# Test setup for the AI Content Describer NVDA add-on
+# Copyright (C) 2023 - 2026, Carter Temm
+# This add-on is free software, licensed under the terms of the GNU General Public License (version 2).
+# For more details see: https://www.gnu.org/licenses/gpl-2.0.html
+
+"""Lets the add-on's modules be imported outside of NVDA, for testing the parts that don't need it.
+
+The NVDA modules they import are replaced with minimal stand-ins, and the add-on's directory is
+put on the path, as NVDA does when it loads the global plugin.
+"""
+
+import builtins
+import collections
+import logging
+import os
+import sys
+import tempfile
+import types
+from unittest import mock
+
+import pytest
+
+ADDON_DIR = os.path.abspath(
+	os.path.join(os.path.dirname(__file__), "..", "addon", "globalPlugins", "AIContentDescriber")
+)
+
+
+class _NVDALogger(logging.Logger):
+	def debugWarning(self, msg, *args, **kwargs):
+		self.debug(msg, *args, **kwargs)
+
+
+def _stand_in(name, **attributes):
+	if name in sys.modules:
+		return
+	module = types.ModuleType(name)
+	module.__dict__.update(attributes)
+	sys.modules[name] = module
+
+
+_stand_in("logHandler", log=_NVDALogger("nvda"))
+_stand_in(
+	"globalVars",
+	appArgs=types.SimpleNamespace(configPath=tempfile.mkdtemp(prefix="AIContentDescriber-tests-"), secure=False),
+)
+_stand_in("dependency_checker", expand_path=lambda: None)
+# the real one loads NVDA's configuration; tests put whatever settings they need in config
+_stand_in("config_handler", config={"global": {}})
+# used by the add-on only when it talks to NVDA or the user, which no test does
+for name in ("addonHandler", "api", "screenBitmap", "synthDriverHandler", "tones", "ui", "winUser", "wx"):
+	sys.modules.setdefault(name, mock.MagicMock(name=name))
+if not hasattr(builtins, "_"):
+	builtins._ = lambda text: text
+sys.path.insert(0, ADDON_DIR)
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+	"""The add-on's settings, as a dict of sections, with descriptions cached in a fresh directory."""
+	import cache
+	import config_handler
+	import globalVars
+
+	monkeypatch.setattr(globalVars.appArgs, "configPath", str(tmp_path))
+	settings = collections.defaultdict(dict)
+	settings["global"].update(
+		cache_backend="json",
+		shared_cache_paths=[],
+		near_duplicate_matching=False,
+		near_duplicate_distance=4,
+	)
+	monkeypatch.setattr(config_handler, "config", settings)
+	cache.reset()
+	yield settings
+	cache.reset()
@@ -0,0 +1,140 @@
+import time
+
+import pytest
+
+import cache
+from PIL import Image, ImageDraw, ImageFont
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def backend(request, config):
+	config["global"]["cache_backend"] = request.param
+	cache.reset()
+	return request.param
+
+
+def _entry(description, age_days=0, last_used_days=None):
+	entry = cache.make_entry(description)
+	entry["created"] -= age_days * 86400
+	entry["last_used"] = time.time() - (age_days if last_used_days is None else last_used_days) * 86400
+	return entry
+
+
+def test_limits_are_off_unless_configured(config):
+	assert cache.limits_for("Some model") == cache.NO_LIMITS
+
+
+def test_age_is_measured_from_last_use(backend):
+	limits = cache.CacheLimits(0, 0, 30 * 86400)
+	cache.store("Model", "old but in use", _entry("kept", age_days=100, last_used_days=1))
+	cache.store("Model", "old and unused", _entry("dropped", age_days=100))
+	cache.evict("Model", limits)
+	assert cache.get_store().get("Model", "", "old but in use")["description"] == "kept"
+	assert cache.get_store().get("Model", "", "old and unused") is None
+
+
+def test_storing_evicts_in_batches(backend):
+	limits = cache.CacheLimits(10, 0, 0)
+	for i in range(11):
+		cache.store("Model", f"image {i}", _entry(f"description {i}"), limits=limits)
+	# within the headroom, so nothing is evicted yet
+	assert cache.get_store().count("Model") == 11
+	cache.store("Model", "image 11", _entry("description 11"), limits=limits)
+	# past it, so the cache is brought back down to its limit, keeping the most recently used
+	assert cache.get_store().count("Model") == 10
+	assert cache.get_store().get("Model", "", "image 0") is None
+	assert cache.get_store().get("Model", "", "image 11") is not None
+
+
+def test_size_and_age_limits_are_applied_periodically(backend):
+	limits = cache.CacheLimits(0, 0, 30 * 86400)
+	for i in range(cache.EVICTION_INTERVAL - 1):
+		cache.store("Model", f"image {i}", _entry(f"description {i}", age_days=100), limits=limits)
+	assert cache.get_store().count("Model") == cache.EVICTION_INTERVAL - 1
+	cache.store("Model", "new", _entry("new"), limits=limits)
+	assert cache.get_store().count("Model") == 1
+
+
+def _screen(text="Hello 2", shape_x=150, background=(255, 255, 255), foreground=(0, 0, 0), size=(200, 30), resample=Image.BOX):
+	"""A capture of a control with some text and a square, like the ones near-duplicate matching sees.
+
+	It's drawn at twice the size and scaled down with resample, which antialiases it in its own way.
+	"""
+	img = Image.new("RGB", (size[0] * 2, size[1] * 2), background)
+	draw = ImageDraw.Draw(img)
+	draw.text((10, 14), text, fill=foreground, font=ImageFont.load_default(size=28))
+	draw.rectangle((shape_x * 2, 10, shape_x * 2 + 40, 50), outline=foreground, width=2)
+	return img.resize(size, resample)
+
+
+def _similar_to(original, candidate, max_distance=4):
+	fingerprint = cache.fingerprint_decoded(original, similarity=True)
+	cache.store("Model", fingerprint.digest, cache.make_entry("the original", fingerprint), "prompt")
+	entry = cache.lookup_similar("Model", cache.fingerprint_decoded(candidate, similarity=True), max_distance, "prompt")
+	return entry is not None and entry["description"] == "the original"
+
+
+def test_similarity_hashes_are_only_computed_on_request():
+	fingerprint = cache.fingerprint_decoded(_screen())
+	assert (fingerprint.phash, fingerprint.edge_map) == (None, None)
+	assert cache.lookup_similar("Model", fingerprint, 64) is None
+
+
+def test_recoloured_image_is_a_near_duplicate(backend):
+	assert _similar_to(_screen(), _screen(background=(230, 240, 255), foreground=(0, 0, 90)))
+
+
+@pytest.mark.parametrize(
+	"antialiased",
+	[
+		lambda: _screen(resample=Image.LANCZOS),
+		lambda: _screen(resample=Image.BILINEAR),
+		lambda: _screen().point(lambda value: round(255 * (value / 255) ** 0.7)),
+		lambda: _screen().point(lambda value: round(255 * (value / 255) ** 1.4)),
+	],
+)
+def test_differently_antialiased_image_is_a_near_duplicate(backend, antialiased):
+	assert _similar_to(_screen(), antialiased())
+
+
+@pytest.mark.parametrize(
+	"changes",
+	[
+		{"text": "Hello 4"},
+		{"text": "Hello 3"},
+		{"text": "Hello 1"},
+		{"text": "Howdy 2"},
+		{"shape_x": 151},
+		{"shape_x": 160},
+		{"size": (201, 30)},
+	],
+)
+def test_changed_content_is_not_a_near_duplicate(backend, changes):
+	# even with a distance that would let the perceptual hash alone match them
+	assert not _similar_to(_screen(), _screen(**changes), max_distance=64)
+
+
+def test_entries_without_edges_are_never_near_duplicates(backend):
+	fingerprint = cache.fingerprint_decoded(_screen(), similarity=True)
+	cache.store("Model", fingerprint.digest, cache.make_entry("old", fingerprint._replace(edge_map=None)))
+	assert cache.lookup_similar("Model", fingerprint, 64) is None
+
+
+def test_bk_tree_finds_everything_within_the_distance():
+	import random
+
+	rng = random.Random(4)
+	values = [rng.getrandbits(64) for i in range(300)]
+	tree = cache.BKTree()
+	for i, value in enumerate(values):
+		tree.add(value, i)
+	query = values[0] ^ 0b1011
+	for max_distance in (0, 3, 8, 30):
+		expected = sorted(
+			(cache.hamming_distance(query, value), i)
+			for i, value in enumerate(values)
+			if cache.hamming_distance(query, value) <= max_distance
+		)
+		found = tree.search(query, max_distance)
+		assert sorted(found) == expected
+		assert [distance for distance, key in found] == sorted(distance for distance, key in found)
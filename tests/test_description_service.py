@@ -0,0 +1,183 @@
+import threading
+
+import pytest
+
+import description_service
+
+
+def _run_leader(key, func, background=False):
+	"""Starts single_flight(key, func) on another thread, returning the thread and a list for its outcome."""
+	outcome = []
+
+	def run():
+		try:
+			if background:
+				with description_service.background_request():
+					outcome.append(description_service.single_flight(key, func))
+			else:
+				outcome.append(description_service.single_flight(key, func))
+		except Exception as e:
+			outcome.append(e)
+
+	thread = threading.Thread(target=run)
+	thread.start()
+	return thread, outcome
+
+
+def _blocking(result=None, error=None):
+	"""A func that waits to be released, then returns result or raises error; and its release event."""
+	started = threading.Event()
+	release = threading.Event()
+
+	def func():
+		started.set()
+		release.wait(5)
+		if error is not None:
+			raise error
+		return result
+
+	return func, started, release
+
+
+def _join_as_follower(key, func, leader_started, release):
+	"""Calls single_flight once the leader is running, releasing the leader once this call is waiting."""
+	leader_started.wait(5)
+	threading.Timer(0.1, release.set).start()
+	return description_service.single_flight(key, func)
+
+
+def test_followers_share_the_result():
+	func, started, release = _blocking(result="a button")
+	thread, outcome = _run_leader("shared", func)
+	calls = []
+	result = _join_as_follower("shared", lambda: calls.append(1), started, release)
+	thread.join()
+	assert result == outcome[0] == "a button"
+	assert not calls
+
+
+def test_followers_share_a_foreground_failure():
+	func, started, release = _blocking(error=IOError("overloaded"))
+	thread, outcome = _run_leader("failed", func)
+	with pytest.raises(IOError):
+		_join_as_follower("failed", lambda: "never called", started, release)
+	thread.join()
+
+
+@pytest.mark.parametrize("error, result", [(IOError("overloaded"), None), (None, "")])
+def test_foreground_request_retries_after_a_failed_background_one(error, result):
+	func, started, release = _blocking(result=result, error=error)
+	thread, outcome = _run_leader("prefetched", func, background=True)
+	assert _join_as_follower("prefetched", lambda: "a picture of a cat", started, release) == "a picture of a cat"
+	thread.join()
+	if error is None:
+		assert outcome == [result]
+	else:
+		assert isinstance(outcome[0], IOError)
+
+
+def test_background_follower_shares_a_failed_background_request():
+	func, started, release = _blocking(error=IOError("overloaded"))
+	thread, outcome = _run_leader("both background", func, background=True)
+	with description_service.background_request():
+		with pytest.raises(IOError):
+			_join_as_follower("both background", lambda: "never called", started, release)
+	thread.join()
+
+
+class _FakeService:
+	name = "Fake"
+	prompt = "Describe this image"
+	max_tokens = 100
+
+	def __init__(self):
+		self.calls = 0
+
+	@description_service.cached_description
+	def process(self, image_path, **kw):
+		self.calls += 1
+		return "a fresh description"
+
+	def start_conversation(self, *args):
+		pass
+
+
+@pytest.fixture
+def image():
+	Image = pytest.importorskip("PIL.Image")
+	import image_processing
+
+	return image_processing.ImageAsset.from_image(Image.new("RGB", (40, 30), (200, 10, 10)))
+
+
+@pytest.mark.parametrize(
+	"kw, expected",
+	[
+		({}, "an older description"),
+		({"max_tokens": 100}, "an older description"),
+		({"prompt": "Read the text in this image"}, "a fresh description"),
+		({"max_tokens": 500}, "a fresh description"),
+	],
+)
+@pytest.mark.parametrize("cache_name", ["Fake", "images"])
+def test_entries_from_before_prompt_keys_are_only_used_for_plain_descriptions(config, image, cache_name, kw, expected):
+	import cache
+
+	# stored without a prompt digest, as every entry was before prompts were part of the key
+	cache.store(cache_name, image.fingerprint.digest, cache.make_entry("an older description", image.fingerprint))
+	service = _FakeService()
+	assert service.process(image, **kw) == expected
+	assert service.calls == (expected == "a fresh description")
+
+
+def test_ui_description_never_returns_a_plain_one(config, image):
+	import cache
+	import ui_viewer
+
+	cache.store("images", image.fingerprint.digest, cache.make_entry("plain legacy description", image.fingerprint))
+	service = _FakeService()
+	result = service.process(image, prompt=ui_viewer.PROMPT, max_tokens=ui_viewer.CC_MAX_TOKENS)
+	assert result == "a fresh description"
+
+
+def test_answers_to_different_prompts_are_kept_apart(config, image):
+	service = _FakeService()
+	assert service.process(image, prompt="first") == "a fresh description"
+	assert service.process(image, prompt="second") == "a fresh description"
+	assert service.process(image, prompt="first") == "a fresh description"
+	assert service.calls == 2
+
+
+@pytest.mark.parametrize("near_duplicate_matching", [False, True])
+def test_similarity_hashes_are_only_computed_for_near_duplicate_matching(config, image, near_duplicate_matching):
+	config["global"]["near_duplicate_matching"] = near_duplicate_matching
+	_FakeService().process(image)
+	assert ("similarity_fingerprint" in image._memo) == near_duplicate_matching
+
+
+@pytest.fixture
+def ui():
+	import ui
+
+	ui.message.reset_mock()
+	return ui
+
+
+@pytest.mark.parametrize(
+	"service, response",
+	[
+		("Anthropic", {"type": "error", "error": {"message": "overloaded"}}),
+		("GoogleGemini", {"candidates": []}),
+		("Ollama", {"done": True}),
+		("LiteLLMProxy", {"choices": []}),
+		("LlamaCPP", {}),
+	],
+)
+def test_malformed_replies_are_spoken_only_in_the_foreground(ui, service, response):
+	extract = getattr(description_service, service)._extract_conversation_response
+	assert extract(None, response) == ""
+	assert ui.message.call_count == 1
+	with description_service.background_request():
+		with pytest.raises(IOError):
+			extract(None, response)
+	assert ui.message.call_count == 1
@@ -0,0 +1,175 @@
+import io
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+ImageChops = pytest.importorskip("PIL.ImageChops")
+ImageDraw = pytest.importorskip("PIL.ImageDraw")
+ImageFont = pytest.importorskip("PIL.ImageFont")
+
+import image_processing
+
+
+def _bordered(size=(400, 300), content=(120, 100, 220, 160)):
+	img = Image.new("RGB", size, (240, 240, 240))
+	ImageDraw.Draw(img).rectangle(content, fill=(20, 40, 200))
+	return img
+
+
+def test_content_box_contains_the_content_with_a_margin():
+	left, top, right, bottom = image_processing.find_content_box(_bordered())
+	assert (left, top) <= (120, 100) and (right, bottom) >= (221, 161)
+	margin = image_processing.TRIM_MARGIN + 1
+	assert left >= 120 - margin and top >= 100 - margin
+	assert right <= 221 + margin and bottom <= 161 + margin
+
+
+def test_large_captures_are_searched_at_a_smaller_size():
+	# a line of text one pixel high must survive the averaging
+	img = Image.new("RGB", (2000, 1500), (255, 255, 255))
+	ImageDraw.Draw(img).line((900, 700, 1100, 700), fill=(0, 0, 0))
+	left, top, right, bottom = image_processing.find_content_box(img)
+	assert left <= 900 and top <= 700 and right >= 1101 and bottom >= 701
+	assert (right - left) * (bottom - top) < 2000 * 1500 / 10
+
+
+@pytest.mark.parametrize(
+	"img",
+	[
+		Image.new("RGB", (200, 100), (255, 255, 255)),
+		# barely any border, so not worth trimming
+		_bordered((200, 100), (1, 1, 198, 98)),
+	],
+)
+def test_nothing_to_trim(img):
+	assert image_processing.find_content_box(img) is None
+
+
+def test_captures_are_only_trimmed_when_asked():
+	img = _bordered()
+	assert image_processing.ImageAsset.from_capture(img).size == (400, 300)
+	box = image_processing.find_content_box(img)
+	trimmed = image_processing.ImageAsset.from_capture(img, trim=True)
+	assert trimmed.size == (box[2] - box[0], box[3] - box[1])
+
+
+def _ui_capture(size=(800, 600)):
+	"""A capture of a window: flat colours, a few controls and some text."""
+	img = Image.new("RGB", size, (240, 240, 240))
+	draw = ImageDraw.Draw(img)
+	for i in range(8):
+		top = 20 + i * 60
+		draw.rectangle((20, top, 300, top + 40), fill=(255, 255, 255), outline=(0, 120, 215))
+		draw.text((30, top + 12), f"Option number {i}", fill=(0, 0, 0))
+	return img
+
+
+def _saved(kind, func):
+	before = image_processing.get_stats()
+	func()
+	after = image_processing.get_stats()
+	return after[f"{kind}_bytes_saved"] - before[f"{kind}_bytes_saved"], after[f"{kind}_images"] - before[f"{kind}_images"]
+
+
+@pytest.mark.parametrize("max_long_edge", [None, 400])
+def test_bytes_saved_are_recorded_for_captures(max_long_edge):
+	asset = image_processing.ImageAsset.from_capture(_ui_capture())
+	result = []
+	saved, images = _saved("graphic", lambda: result.append(image_processing.optimize(asset, max_long_edge=max_long_edge)))
+	assert images == 1
+	assert saved > 0
+	if max_long_edge is None:
+		assert saved == len(asset.data) - len(result[0])
+
+
+def _photo(size=(1200, 900)):
+	"""Smooth gradients with grain, which is what a photo looks like to classify."""
+	gradient = Image.linear_gradient("L").resize(size)
+	grain = ImageChops.add(gradient, Image.effect_noise(size, 24), 1, -128)
+	return Image.merge("RGB", (grain, gradient.transpose(Image.FLIP_LEFT_RIGHT), gradient.rotate(90).resize(size)))
+
+
+def _text_over_gradient(size=(800, 600)):
+	img = Image.merge(
+		"RGB",
+		(Image.linear_gradient("L").resize(size), Image.linear_gradient("L").rotate(90).resize(size), Image.new("L", size, 200)),
+	)
+	draw = ImageDraw.Draw(img)
+	font = ImageFont.load_default(size=18)
+	for i in range(size[1] // 24):
+		draw.text((10, 5 + i * 23), f"The quick brown fox jumps over the lazy dog {i}", fill=(0, 0, 0), font=font)
+	return img
+
+
+@pytest.mark.parametrize(
+	"make, kind",
+	[
+		(_ui_capture, "graphic"),
+		(_text_over_gradient, "text"),
+		(_photo, "photo"),
+	],
+)
+def test_classify(make, kind):
+	assert image_processing.classify(make()) == kind
+
+
+@pytest.mark.parametrize(
+	"size, max_long_edge, max_pixels, expected",
+	[
+		((1000, 500), None, None, 1.0),
+		((1000, 500), 2000, 1_000_000, 1.0),
+		((4000, 2000), 2000, None, 0.5),
+		((2000, 4000), 1000, None, 0.25),
+		((2000, 2000), 2000, 1_000_000, 0.5),
+		((4000, 1000), 2000, 1_000_000, 0.5),
+	],
+)
+def test_calculate_scale(size, max_long_edge, max_pixels, expected):
+	assert image_processing.calculate_scale(*size, max_long_edge, max_pixels) == pytest.approx(expected)
+
+
+def test_accepted_formats():
+	assert image_processing.accepted_formats([".jpg", ".jpeg", ".png", ".tiff"]) == {"image/jpeg", "image/png"}
+
+
+@pytest.mark.parametrize("make", [_photo, _ui_capture, _text_over_gradient])
+def test_oversized_capture_fits_anthropics_limits(make):
+	from description_service import Anthropic
+
+	max_long_edge, max_pixels, max_bytes = Anthropic.image_limits(Anthropic)
+	asset = image_processing.ImageAsset.from_capture(make((3200, 2400)))
+	data = image_processing.optimize(
+		asset, max_long_edge, max_pixels, max_bytes, image_processing.accepted_formats(Anthropic.supported_formats)
+	)
+	assert len(data) <= max_bytes
+	img = Image.open(io.BytesIO(data))
+	assert max(img.size) <= max_long_edge
+	assert img.width * img.height <= max_pixels
+
+
+@pytest.mark.parametrize("max_bytes", [100_000, 20_000])
+def test_images_are_shrunk_until_they_fit_max_bytes(max_bytes):
+	asset = image_processing.ImageAsset.from_capture(_photo((1000, 750)))
+	assert len(image_processing.optimize(asset, max_bytes=max_bytes, formats={"image/jpeg", "image/png"})) <= max_bytes
+
+
+def test_photo_falls_back_to_jpeg_without_webp():
+	asset = image_processing.ImageAsset.from_capture(_photo())
+	data = image_processing.optimize(asset, formats=image_processing.accepted_formats([".png", ".jpg"]))
+	assert data[:3] == b"\xff\xd8\xff"
+
+
+def test_photo_is_sent_as_webp_where_accepted():
+	if not image_processing.features.check("webp"):
+		pytest.skip("Pillow was built without WebP")
+	asset = image_processing.ImageAsset.from_capture(_photo())
+	data = image_processing.optimize(asset, formats={"image/webp", "image/jpeg", "image/png"})
+	assert data[:4] == b"RIFF" and data[8:12] == b"WEBP"
+
+
+@pytest.mark.parametrize("make", [_ui_capture, _text_over_gradient])
+def test_graphics_and_text_stay_lossless(make):
+	asset = image_processing.ImageAsset.from_capture(make())
+	data = image_processing.optimize(asset, formats={"image/jpeg", "image/png"})
+	assert data[:8] == b"\x89PNG\r\n\x1a\n"
+	assert ImageChops.difference(Image.open(io.BytesIO(data)).convert("RGB"), make()).getbbox() is None
@@ -0,0 +1,70 @@
+import base64
+import json
+import os
+
+import pytest
+
+import request_body
+
+SIZES = [0, 1, 2, 3, 4, request_body.ENCODE_CHUNK_SIZE - 1, request_body.ENCODE_CHUNK_SIZE, request_body.ENCODE_CHUNK_SIZE * 3 + 2]
+
+
+def _payload(image):
+	return {
+		"model": "some-model",
+		"messages": [
+			{
+				"role": "user",
+				"content": [
+					{"type": "text", "text": "Décris cette image, s'il te plaît: « ☃ » \"quoted\" \\ \n"},
+					{"type": "image_url", "image_url": {"url": request_body.data_uri(image, "image/png")}},
+					{"type": "image", "source": {"data": image}},
+				],
+			}
+		],
+	}
+
+
+def _plain(payload):
+	"""The payload as it would be with each Base64Image given as its text."""
+	return json.loads(json.dumps(payload, default=str))
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_length_is_exact(size):
+	body = request_body.JSONBody(_payload(request_body.Base64Image(os.urandom(size))))
+	assert len(body) == len(b"".join(body))
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_body_round_trips(size):
+	data = os.urandom(size)
+	payload = _payload(request_body.Base64Image(data))
+	decoded = json.loads(b"".join(request_body.JSONBody(payload)))
+	assert decoded == _plain(payload)
+	content = decoded["messages"][0]["content"]
+	assert content[0]["text"] == payload["messages"][0]["content"][0]["text"]
+	assert content[1]["image_url"]["url"] == "data:image/png;base64," + base64.b64encode(data).decode("ascii")
+	assert base64.b64decode(content[2]["source"]["data"]) == data
+
+
+def test_body_can_be_iterated_more_than_once():
+	body = request_body.JSONBody(_payload(request_body.Base64Image(os.urandom(request_body.ENCODE_CHUNK_SIZE * 2 + 1))))
+	first = b"".join(body)
+	assert b"".join(body) == first
+	assert len(body) == len(first)
+
+
+def test_the_same_image_can_appear_twice():
+	image = request_body.Base64Image(b"image")
+	payload = {"images": [image, image]}
+	body = request_body.JSONBody(payload)
+	assert json.loads(b"".join(body)) == _plain(payload)
+	assert len(body) == len(b"".join(body))
+
+
+def test_image_text_outside_a_body():
+	image = request_body.Base64Image(b"\x89PNG\r\n\x1a\nrest")
+	assert image.media_type == "image/png"
+	assert str(image) == base64.b64encode(image.data).decode("ascii")
+	assert str(image.with_prefix("data:image/png;base64,")) == "data:image/png;base64," + str(image)
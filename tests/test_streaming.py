@@ -0,0 +1,47 @@
+import pytest
+
+import streaming
+
+
+@pytest.mark.parametrize(
+	"line, stream_format, expected",
+	[
+		(b'data: {"text": "Hi"}\n', "sse", {"text": "Hi"}),
+		(b"data:{\"text\": \"Hi\"}", "sse", {"text": "Hi"}),
+		(b"data: [DONE]\n", "sse", None),
+		(b"event: message_start\n", "sse", None),
+		(b": keep-alive\n", "sse", None),
+		(b"\n", "sse", None),
+		(b'{"message": {"content": "Hi"}}\n', "ndjson", {"message": {"content": "Hi"}}),
+		(b"   \n", "ndjson", None),
+	],
+)
+def test_parse_line(line, stream_format, expected):
+	assert streaming.parse_line(line, stream_format) == expected
+
+
+def test_sentences_are_returned_as_they_end():
+	buffer = streaming.SentenceBuffer()
+	assert buffer.feed("A button labelled") == []
+	assert buffer.feed(' "OK." Next to') == ['A button labelled "OK."']
+	assert buffer.feed(" it, version 3.5 of example.com") == []
+	assert buffer.feed("! Then\n\na list") == ["Next to it, version 3.5 of example.com!", "Then"]
+	assert buffer.finish() == "a list"
+	assert buffer.finish() == ""
+
+
+def test_only_the_first_sentence_is_spoken_when_asked():
+	spoken = []
+	speaker = streaming.SentenceSpeaker(spoken.append, first_only=True)
+	for delta in ("One. Tw", "o. Three"):
+		speaker.feed(delta)
+	speaker.finish()
+	assert spoken == ["One."]
+
+
+def test_the_rest_is_spoken_at_the_end():
+	spoken = []
+	speaker = streaming.SentenceSpeaker(spoken.append)
+	speaker.feed("One. Two")
+	speaker.finish()
+	assert spoken == ["One.", "Two"]
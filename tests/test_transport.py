@@ -0,0 +1,294 @@
+import asyncio
+import email.message
+import email.utils
+import http.server
+import io
+import socket
+import threading
+import time
+import urllib.error
+
+import pytest
+
+import transport
+
+
+def run(coroutine):
+	loop = asyncio.new_event_loop()
+	try:
+		return loop.run_until_complete(coroutine)
+	finally:
+		loop.close()
+
+
+class _SlowHandler(http.server.BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+	delay = 0.5
+
+	def do_GET(self):
+		time.sleep(self.delay)
+		body = b"ok"
+		self.send_response(200)
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
+
+@pytest.fixture
+def server():
+	httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _SlowHandler)
+	httpd.daemon_threads = True
+	thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+	thread.start()
+	yield f"http://127.0.0.1:{httpd.server_address[1]}/"
+	httpd.shutdown()
+	httpd.server_close()
+
+
+@pytest.fixture
+def one_at_a_time():
+	transport.configure_limits({"local": (6000, 1)})
+	yield
+	transport.close()
+	transport.configure_limits({})
+
+
+def test_limiter_wait_is_bounded_by_timeout_when_busy():
+	async def scenario():
+		limiter = transport.RateLimiter(6000, 1)
+		await limiter.acquire(1)
+		started = time.monotonic()
+		with pytest.raises(socket.timeout):
+			await limiter.acquire(0.2)
+		waited = time.monotonic() - started
+		# the timed out request left the queue, so the next one gets its turn once there is room
+		limiter.release()
+		await limiter.acquire(1)
+		return waited, len(limiter._queue)
+
+	waited, queued = run(scenario())
+	assert 0.15 <= waited < 1
+	assert queued == 0
+
+
+def test_limiter_wait_is_bounded_by_timeout_when_out_of_tokens():
+	async def scenario():
+		# a token every 10 seconds, and room for one
+		limiter = transport.RateLimiter(6, 4)
+		await limiter.acquire(1)
+		limiter.release()
+		started = time.monotonic()
+		with pytest.raises(socket.timeout):
+			await limiter.acquire(0.2)
+		return time.monotonic() - started
+
+	assert run(scenario()) < 1
+
+
+def test_limiter_keeps_order_and_hands_on_the_turn():
+	async def scenario():
+		limiter = transport.RateLimiter(6000, 1)
+		order = []
+
+		async def request(name, timeout):
+			try:
+				await limiter.acquire(timeout)
+			except socket.timeout:
+				order.append(f"{name} timed out")
+				return
+			order.append(name)
+			await asyncio.sleep(0.05)
+			limiter.release()
+
+		await asyncio.gather(request("a", 5), request("b", 0.01), request("c", 5), request("d", 5))
+		return order
+
+	assert run(scenario()) == ["a", "b timed out", "c", "d"]
+
+
+def test_contended_request_times_out_with_the_request(server, one_at_a_time):
+	first = transport.submit(server, timeout=5, retry=None)
+	time.sleep(0.1)
+	started = time.monotonic()
+	with pytest.raises(socket.timeout):
+		transport.request(server, timeout=0.2, retry=None)
+	assert time.monotonic() - started < 0.45
+	assert first.result().read() == b"ok"
+
+
+def test_contended_requests_work_after_close(server, one_at_a_time):
+	for attempt in range(2):
+		futures = [transport.submit(server, timeout=5) for i in range(3)]
+		assert [future.result().read() for future in futures] == [b"ok"] * 3
+		transport.close()
+		transport.configure_limits({"local": (6000, 1)})
+
+
+def test_jobs_waiting_on_their_own_jobs_dont_starve_them():
+	# every top-level worker is taken by a job that waits for one it started, as in a burst of hedged describes
+	release = threading.Event()
+
+	def parent():
+		release.wait(5)
+		return transport.run_in_background(lambda: "answer").result(timeout=5)
+
+	try:
+		jobs = [transport.run_in_background(parent) for i in range(transport.MAX_WORKERS)]
+		release.set()
+		assert [job.result(timeout=10) for job in jobs] == ["answer"] * transport.MAX_WORKERS
+	finally:
+		transport.close()
+
+
+@pytest.mark.parametrize(
+	"endpoint, allow_remote, expected",
+	[
+		("", None, ""),
+		("http://127.0.0.1:8765/", None, "http://127.0.0.1:8765"),
+		("http://localhost:8765", None, "http://localhost:8765"),
+		("http://[::1]:8765", None, "http://[::1]:8765"),
+		("https://proxy.example.com", None, ""),
+		("http://192.168.1.20:8765", None, ""),
+		("https://proxy.example.com", "1", "https://proxy.example.com"),
+		("127.0.0.1:8765", "1", ""),
+	],
+)
+def test_endpoint_override_is_only_accepted_for_this_computer(monkeypatch, endpoint, allow_remote, expected):
+	monkeypatch.setenv("AI_CONTENT_DESCRIBER_ENDPOINT", endpoint)
+	if allow_remote is None:
+		monkeypatch.delenv("AI_CONTENT_DESCRIBER_ALLOW_REMOTE_ENDPOINT", raising=False)
+	else:
+		monkeypatch.setenv("AI_CONTENT_DESCRIBER_ALLOW_REMOTE_ENDPOINT", allow_remote)
+	assert transport._read_endpoint_override() == expected
+
+
+def test_endpoint_override_keeps_the_path(monkeypatch):
+	monkeypatch.setattr(transport, "ENDPOINT_OVERRIDE", "http://127.0.0.1:8765")
+	assert (
+		transport._override_endpoint("https://api.openai.com/v1/chat/completions?x=1")
+		== "http://127.0.0.1:8765/v1/chat/completions?x=1"
+	)
+
+
+def test_finished_jobs_are_forgotten():
+	try:
+		jobs = [transport.run_in_background(time.sleep, 0.01) for i in range(50)]
+		for job in jobs:
+			job.result(timeout=5)
+		assert not transport._jobs.intersection(jobs)
+	finally:
+		transport.close()
+
+
+def _headers(**fields):
+	headers = email.message.Message()
+	for name, value in fields.items():
+		headers[name.replace("_", "-")] = value
+	return headers
+
+
+def _http_error(code, **fields):
+	return urllib.error.HTTPError("https://api.example.com/", code, "error", _headers(**fields), io.BytesIO())
+
+
+@pytest.mark.parametrize(
+	"value, expected",
+	[
+		("20", 20),
+		("1.5s", 1.5),
+		("6m0s", 360),
+		("1h2m3s", 3723),
+		("250ms", 0.25),
+		("soon", None),
+		("5x", None),
+	],
+)
+def test_parse_reset(value, expected):
+	assert transport._parse_reset(value) == expected
+
+
+def test_parse_reset_of_a_time():
+	assert 25 < transport._parse_reset(str(time.time() + 30)) <= 30
+	assert transport._parse_reset("2000-01-01T00:00:00Z") == 0
+
+
+@pytest.mark.parametrize(
+	"fields, expected",
+	[
+		({"retry_after_ms": "1500", "retry_after": "9"}, 1.5),
+		({"retry_after": "7"}, 7),
+		({"x_ratelimit_remaining_requests": "0", "x_ratelimit_reset_requests": "2s"}, 2),
+		({"x_ratelimit_remaining_tokens": "10", "x_ratelimit_reset_tokens": "2s"}, None),
+		({"anthropic_ratelimit_requests_remaining": "0", "anthropic_ratelimit_requests_reset": "3"}, 3),
+		({}, None),
+	],
+)
+def test_server_retry_delay(fields, expected):
+	assert transport.server_retry_delay(_headers(**fields)) == expected
+
+
+def test_server_retry_delay_of_an_http_date():
+	retry_at = email.utils.formatdate(time.time() + 30, usegmt=True)
+	assert 25 < transport.server_retry_delay(_headers(retry_after=retry_at)) <= 30
+
+
+def test_backoff_is_jittered_below_an_exponential_cap():
+	policy = transport.RetryPolicy(max_attempts=10, base_delay=1, max_delay=5)
+	for attempt, cap in enumerate((1, 2, 4, 5, 5)):
+		delays = [policy.delay(attempt, socket.timeout(), 0, None) for i in range(50)]
+		assert all(0 <= delay <= cap for delay in delays)
+		assert len(set(delays)) > 1
+
+
+def test_server_delay_is_used_when_given():
+	policy = transport.RetryPolicy()
+	assert policy.delay(0, _http_error(429, retry_after="3"), 0, None) == 3
+
+
+@pytest.mark.parametrize(
+	"error, retryable",
+	[
+		(_http_error(429), True),
+		(_http_error(503), True),
+		(_http_error(400), False),
+		(_http_error(401), False),
+		(urllib.error.URLError(ConnectionRefusedError()), True),
+		(urllib.error.URLError("unknown url type"), False),
+		(socket.timeout(), True),
+		(ValueError(), False),
+	],
+)
+def test_what_is_retried(error, retryable):
+	assert transport.RetryPolicy().is_retryable(error) == retryable
+
+
+def test_retries_stop_at_max_attempts_and_budget():
+	policy = transport.RetryPolicy(max_attempts=3, base_delay=0, budget=10)
+	assert policy.delay(1, socket.timeout(), 0, None) == 0
+	assert policy.delay(2, socket.timeout(), 0, None) is None
+	# the server asked for longer than is left of the budget
+	assert policy.delay(0, _http_error(429, retry_after="8"), 5, None) is None
+	# without a budget, the request's timeout is used
+	assert transport.RetryPolicy().delay(0, _http_error(429, retry_after="8"), 5, 10) is None
+
+
+def test_failed_jobs_are_logged_as_errors(monkeypatch):
+	logged = []
+	monkeypatch.setattr(transport.log, "error", lambda message, **kwargs: logged.append(message))
+
+	def fail():
+		raise KeyError("choices")
+
+	def cancelled():
+		raise transport.RequestCancelled()
+
+	try:
+		for func in (fail, cancelled):
+			with pytest.raises((KeyError, transport.RequestCancelled)):
+				transport.run_in_background(func).result(timeout=5)
+	finally:
+		transport.close()
+	assert len(logged) == 1 and "fail" in logged[0]